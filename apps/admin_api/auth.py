@@ -2,6 +2,7 @@ import jwt
 from django.conf import settings
 from datetime import datetime, timedelta
 from django.contrib.auth import get_user_model
+from apps.common.autenticacion import usuario_desde_token
 
 User = get_user_model()
 
@@ -19,11 +20,7 @@ def generate_jwt(user):
     return token if isinstance(token, str) else token.decode()
 
 def decode_jwt(token):
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
-        user = User.objects.get(id=payload['user_id'])
-        return user
-    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, User.DoesNotExist):
-        return None
+    # El usuario sale de la cache de autenticación; solo va a la BD si no está o expiró
+    return usuario_desde_token(token)
 
 
@@ -0,0 +1,109 @@
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from django.conf import settings
+from apps.common.models import CustomUser, Producto, Tienda, UserLog, Variante
+
+# Filas que trae cada FETCH del cursor del servidor y que se escriben por bloque
+FILAS_POR_BLOQUE = getattr(settings, 'EXPORTACION_FILAS_POR_BLOQUE', 2000)
+
+# recurso -> (modelo, columnas de values_list, campo de fecha para ?desde/?hasta)
+EXPORTACIONES = {
+    'productos': (Producto, (
+        'id', 'nombre', 'descripcion', 'precioBase', 'estado', 'tienda_id', 'tienda__nombre',
+        'fechaCreacion', 'fechaActualizacion',
+    ), 'fechaCreacion'),
+    'variantes': (Variante, (
+        'id', 'producto_id', 'producto__nombre', 'talla__nombre', 'color', 'precio', 'stock',
+    ), 'producto__fechaCreacion'),
+    'tiendas': (Tienda, (
+        'id', 'nombre', 'propietario_id', 'propietario__email', 'telefono', 'direccion', 'estado',
+        'creacion', 'actualizacion',
+    ), 'creacion'),
+    'usuarios': (CustomUser, (
+        'id', 'email', 'username', 'nombre', 'apellidos', 'celular', 'is_seller', 'is_staff',
+        'is_active', 'date_joined', 'last_login',
+    ), 'date_joined'),
+    'logs': (UserLog, (
+        'id', 'usuario_id', 'fechaHora', 'tipoAccion', 'rutaAcceso', 'origenConexion',
+        'direccionIP', 'dispositivo', 'ubicacion', 'resultado', 'detalles',
+    ), 'fechaHora'),
+}
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+# Una celda que empieza así la interpreta como fórmula la planilla que abra el CSV
+_PREFIJOS_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def consulta(recurso, desde=None, hasta=None):
+    modelo, columnas, campo_fecha = EXPORTACIONES[recurso]
+    filas = modelo._default_manager.order_by('pk')
+    if desde:
+        filas = filas.filter(**{f'{campo_fecha}__gte': desde})
+    if hasta:
+        filas = filas.filter(**{f'{campo_fecha}__lt': hasta})
+    return columnas, filas.values_list(*columnas)
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def _celda(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False, default=str)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, str) and valor.startswith(_PREFIJOS_FORMULA):
+        return "'" + valor
+    return valor
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: writerow devuelve la línea en vez de escribirla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _bloques(filas, formatear):
+    """Recorre el queryset con un cursor del servidor y entrega el texto por bloques de filas."""
+    bloque = []
+    for fila in filas.iterator(chunk_size=FILAS_POR_BLOQUE):
+        bloque.append(formatear(fila))
+        if len(bloque) >= FILAS_POR_BLOQUE:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
+
+
+def filas_csv(columnas, filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(columnas)
+    yield from _bloques(filas, lambda fila: escritor.writerow([_celda(valor) for valor in fila]))
+
+
+def filas_ndjson(columnas, filas):
+    def formatear(fila):
+        return json.dumps(
+            {columna: _valor_json(valor) for columna, valor in zip(columnas, fila)},
+            ensure_ascii=False, default=str,
+        ) + '\n'
+    yield from _bloques(filas, formatear)
+
+
+def exportar(recurso, formato, desde=None, hasta=None):
+    """Generador con el contenido del export; la memoria no depende del tamaño de la tabla."""
+    columnas, filas = consulta(recurso, desde, hasta)
+    generador = filas_csv if formato == 'csv' else filas_ndjson
+    return generador(columnas, filas)
@@ -8,6 +8,8 @@ from ..validador import admin_required
 from django.contrib.auth import authenticate
 from graphene_file_upload.scalars import Upload
 from ..scalars import Decimal
+from django.db import transaction
+from apps.common.categorias import es_descendiente
 
 # Tipos de objetos para GraphQL
 class UserType(DjangoObjectType):
@@ -29,7 +31,7 @@ class ProductoType(DjangoObjectType):
     precioBase = Decimal()
     class Meta:
         model = Producto
-        fields = "__all__"
+        exclude = ("busqueda",)
 
 class VarianteType(DjangoObjectType):
     class Meta:
@@ -297,7 +299,9 @@ class CreateCategoria(graphene.Mutation):
             except Categoria.DoesNotExist:
                 raise GraphQLError("La categoría padre no existe.")
 
-        categoria = Categoria.objects.create(nombre=nombre.strip(),icono=icono,color=color,categoriaPadre=categoria_padre)
+        # La tabla de clausura del árbol se actualiza en el post_save de Categoria
+        with transaction.atomic():
+            categoria = Categoria.objects.create(nombre=nombre.strip(),icono=icono,categoriaPadre=categoria_padre)
         return CreateCategoria(ok=True,message="Categoría creada correctamente",categoria=categoria)
 class UpdateCategoria(graphene.Mutation):
     categoria = graphene.Field(CategoriaType)
@@ -330,15 +334,19 @@ class UpdateCategoria(graphene.Mutation):
             categoria.color = color
             
         if categoria_padre_id is not None:
-            if categoria_padre_id == id:
+            if str(categoria_padre_id) == str(id):
                 raise GraphQLError("Una categoría no puede ser su propia padre.")
             try:
                 categoria_padre = Categoria.objects.get(id=categoria_padre_id)
                 categoria.categoriaPadre = categoria_padre
             except Categoria.DoesNotExist:
                 raise GraphQLError("La categoría padre no existe.")
+            if es_descendiente(categoria.pk, categoria_padre.pk):
+                raise GraphQLError("Una categoría no puede moverse dentro de una de sus subcategorías.")
             
-        categoria.save()
+        # Mover la categoría reubica su subárbol en la tabla de clausura (post_save)
+        with transaction.atomic():
+            categoria.save()
         
         return UpdateCategoria(ok=True,message="Categoria Actualizda",categoria=categoria)
 
@@ -353,7 +361,9 @@ class DeleteCategoria(graphene.Mutation):
     def mutate(self, info, id):
         try:
             categoria = Categoria.objects.get(pk=id)
-            categoria.delete()
+            # Borra en cascada las subcategorías y sus filas del árbol
+            with transaction.atomic():
+                categoria.delete()
             return DeleteCategoria(ok=True, message="Categoría eliminada correctamente")
         except Categoria.DoesNotExist:
             raise GraphQLError("Categoría no encontrada")
@@ -4,6 +4,8 @@ from apps.common.models import CustomUser, Tienda, Categoria, Producto, Variante
 from apps.common.models.log import UserLog
 from graphene_django.types import DjangoObjectType
 from ..validador import admin_required  
+from apps.common.optimizacion import optimizar_conexion
+from apps.common.paginacion import paginar
 
 # Definición de tipos GraphQL
 class UserType(DjangoObjectType):
@@ -24,7 +26,7 @@ class CategoriaType(DjangoObjectType):
 class ProductoType(DjangoObjectType):
     class Meta:
         model = Producto
-        fields = "__all__"
+        exclude = ("busqueda",)
 
 class VarianteType(DjangoObjectType):
     class Meta:
@@ -39,26 +41,77 @@ class ImagenType(DjangoObjectType):
 class LogType(DjangoObjectType):
     class Meta:
         model = UserLog
-        fields = "__all__"
+        # Sin la PK compuesta (id, fechaHora), que no tiene tipo en GraphQL
+        fields = (
+            "id", "usuario", "fechaHora", "tipoAccion", "rutaAcceso", "origenConexion",
+            "direccionIP", "dispositivo", "ubicacion", "resultado", "detalles",
+        )
     
+    id = graphene.ID(required=True)
     usuario_id = graphene.Int()
     usuario_username = graphene.String()
+    campos_requeridos = {"usuarioUsername": ["usuario__username"]}
+
+    def resolve_id(self, info):
+        # DjangoObjectType resuelve id con pk, que acá es la tupla (id, fechaHora)
+        return self.id
 
     def resolve_usuario_id(self, info):
-        return self.usuario.id if self.usuario else None
+        return self.usuario_id
 
     def resolve_usuario_username(self, info):
         return self.usuario.username if self.usuario else None
 
+# Conexiones Relay (paginación por cursor)
+class UserConnection(graphene.relay.Connection):
+    class Meta:
+        node = UserType
+
+class TiendaConnection(graphene.relay.Connection):
+    class Meta:
+        node = TiendaType
+
+class CategoriaConnection(graphene.relay.Connection):
+    class Meta:
+        node = CategoriaType
+
+class ProductoConnection(graphene.relay.Connection):
+    class Meta:
+        node = ProductoType
+
+class VarianteConnection(graphene.relay.Connection):
+    class Meta:
+        node = VarianteType
+
+class ImagenConnection(graphene.relay.Connection):
+    class Meta:
+        node = ImagenType
+
+class LogConnection(graphene.relay.Connection):
+    class Meta:
+        node = LogType
+
+
+def conexion(info, tipo, queryset, orden=('id',), **kwargs):
+    queryset = optimizar_conexion(queryset, info, orden)
+    return paginar(queryset, orden, **kwargs).conexion(tipo)
+
+
 class Query(graphene.ObjectType):
 
-    all_users = graphene.List(UserType, limit=graphene.Int(), offset=graphene.Int())
-    all_tiendas = graphene.List(TiendaType, limit=graphene.Int(), offset=graphene.Int())
-    all_categorias = graphene.List(CategoriaType, limit=graphene.Int(), offset=graphene.Int())
-    all_productos = graphene.List(ProductoType, limit=graphene.Int(), offset=graphene.Int())
-    all_variantes = graphene.List(VarianteType, limit=graphene.Int(), offset=graphene.Int())
-    all_imagenes = graphene.List(ImagenType, limit=graphene.Int(), offset=graphene.Int())
-    all_logs = graphene.List(LogType, limit=graphene.Int(), offset=graphene.Int(), tipo_accion=graphene.String(), usuario_id=graphene.ID())
+    all_users = graphene.relay.ConnectionField(UserConnection)
+    all_tiendas = graphene.relay.ConnectionField(TiendaConnection)
+    all_categorias = graphene.relay.ConnectionField(CategoriaConnection)
+    all_productos = graphene.relay.ConnectionField(ProductoConnection)
+    all_variantes = graphene.relay.ConnectionField(VarianteConnection)
+    all_imagenes = graphene.relay.ConnectionField(ImagenConnection)
+    all_logs = graphene.relay.ConnectionField(
+        LogConnection,
+        tipo_accion=graphene.String(),
+        usuario_id=graphene.ID(),
+        desde=graphene.DateTime(description="Desde esta fecha (incluida). Sin él se recorren todos los logs que siguen en la base; con él Postgres solo lee las particiones del rango"),
+        hasta=graphene.DateTime(description="Hasta esta fecha (excluida)"),
+    )
 
     # Buscar por ID
     user_by_id = graphene.Field(UserType, id=graphene.ID(required=True))
@@ -72,13 +125,8 @@ class Query(graphene.ObjectType):
 
     # Usuarios
     @admin_required
-    def resolve_all_users(self, info, limit=None, offset=None):
-        qs = CustomUser.objects.all().order_by('id')
-        if offset:
-            qs = qs[offset:]
-        if limit:
-            qs = qs[:limit]
-        return qs
+    def resolve_all_users(self, info, **kwargs):
+        return conexion(info, UserConnection, CustomUser.objects.all(), **kwargs)
 
     @admin_required
     def resolve_user_by_id(self, info, id):
@@ -89,13 +137,8 @@ class Query(graphene.ObjectType):
 
     # Tiendas
     @admin_required
-    def resolve_all_tiendas(self, info, limit=None, offset=None):
-        qs = Tienda.objects.all().order_by('id')
-        if offset:
-            qs = qs[offset:]
-        if limit:
-            qs = qs[:limit]
-        return qs
+    def resolve_all_tiendas(self, info, **kwargs):
+        return conexion(info, TiendaConnection, Tienda.objects.all(), **kwargs)
 
     @admin_required
     def resolve_tienda_by_id(self, info, id):
@@ -106,13 +149,8 @@ class Query(graphene.ObjectType):
 
     # Categorías
     @admin_required
-    def resolve_all_categorias(self, info, limit=None, offset=None):
-        qs = Categoria.objects.all().order_by('id')
-        if offset:
-            qs = qs[offset:]
-        if limit:
-            qs = qs[:limit]
-        return qs
+    def resolve_all_categorias(self, info, **kwargs):
+        return conexion(info, CategoriaConnection, Categoria.objects.all(), **kwargs)
 
     @admin_required
     def resolve_categoria_by_id(self, info, id):
@@ -123,13 +161,8 @@ class Query(graphene.ObjectType):
 
     # Productos
     @admin_required
-    def resolve_all_productos(self, info, limit=None, offset=None):
-        qs = Producto.objects.all().order_by('id')
-        if offset:
-            qs = qs[offset:]
-        if limit:
-            qs = qs[:limit]
-        return qs
+    def resolve_all_productos(self, info, **kwargs):
+        return conexion(info, ProductoConnection, Producto.objects.all(), **kwargs)
 
     @admin_required
     def resolve_producto_by_id(self, info, id):
@@ -140,13 +173,8 @@ class Query(graphene.ObjectType):
 
     # Variantes
     @admin_required
-    def resolve_all_variantes(self, info, limit=None, offset=None):
-        qs = Variante.objects.all().order_by('id')
-        if offset:
-            qs = qs[offset:]
-        if limit:
-            qs = qs[:limit]
-        return qs
+    def resolve_all_variantes(self, info, **kwargs):
+        return conexion(info, VarianteConnection, Variante.objects.all(), **kwargs)
 
     @admin_required
     def resolve_variante_by_id(self, info, id):
@@ -157,13 +185,8 @@ class Query(graphene.ObjectType):
 
     # Imágenes
     @admin_required
-    def resolve_all_imagenes(self, info, limit=None, offset=None):
-        qs = Imagen.objects.all().order_by('id')
-        if offset:
-            qs = qs[offset:]
-        if limit:
-            qs = qs[:limit]
-        return qs
+    def resolve_all_imagenes(self, info, **kwargs):
+        return conexion(info, ImagenConnection, Imagen.objects.all(), **kwargs)
 
     @admin_required
     def resolve_imagen_by_id(self, info, id):
@@ -174,21 +197,23 @@ class Query(graphene.ObjectType):
 
     # Logs
     @admin_required
-    def resolve_all_logs(self, info, limit=None, offset=None, tipo_accion=None, usuario_id=None):
-        qs = UserLog.objects.all().order_by('-fechaHora')
+    def resolve_all_logs(self, info, tipo_accion=None, usuario_id=None, desde=None, hasta=None, **kwargs):
+        if desde is not None and hasta is not None and hasta < desde:
+            raise GraphQLError("El rango de fechas es inválido.")
+        qs = UserLog.objects.all()
+        if desde is not None:
+            qs = qs.filter(fechaHora__gte=desde)
+        if hasta is not None:
+            qs = qs.filter(fechaHora__lt=hasta)
         if tipo_accion:
             qs = qs.filter(tipoAccion=tipo_accion)
         if usuario_id:
             qs = qs.filter(usuario__id=usuario_id)
-        if offset:
-            qs = qs[offset:]
-        if limit:
-            qs = qs[:limit]
-        return qs
+        return conexion(info, LogConnection, qs, ('-fechaHora', '-id'), **kwargs)
 
     @admin_required
     def resolve_log_by_id(self, info, id):
         try:
-            return UserLog.objects.get(pk=id)
+            return UserLog.objects.get(id=id)
         except UserLog.DoesNotExist:
             raise GraphQLError("Log no encontrado")
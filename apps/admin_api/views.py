@@ -1,12 +1,72 @@
+from datetime import datetime, time
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_GET
 from graphene_django.views import GraphQLView
+from apps.common.auditoria import registrar_log
+from apps.common.autenticacion import autenticar_request
+from apps.common.consultas_persistidas import ConsultasPersistidasMixin
+from . import exportaciones
 from .middleware import graphql_jwt_middleware
 from .schema import schema 
 
-class PrivateGraphQLView(GraphQLView):
+class PrivateGraphQLView(ConsultasPersistidasMixin, GraphQLView):
+    nombre_registro = 'admin'
+
+    def dispatch(self, request, *args, **kwargs):
+        autenticar_request(request)
+        return super().dispatch(request, *args, **kwargs)
+
     def get_context(self, request):
         return request
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.middleware = [graphql_jwt_middleware]
\ No newline at end of file
+        self.middleware = [graphql_jwt_middleware]
+
+
+@require_GET
+def exportar(request, recurso, formato):
+    """
+    Exporta productos, variantes, tiendas, usuarios o logs en CSV o NDJSON.
+    Las filas salen de un cursor del servidor y se envían por bloques con
+    StreamingHttpResponse: la memoria no crece con la tabla. Filtros
+    opcionales ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD (hasta excluido).
+    """
+    user = autenticar_request(request)
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+    if not (user.is_staff or user.is_superuser):
+        return JsonResponse({'error': 'Permisos insuficientes: Se requiere usuario administrador'}, status=403)
+    if recurso not in exportaciones.EXPORTACIONES or formato not in exportaciones.FORMATOS:
+        return JsonResponse({'error': 'Exportación no encontrada'}, status=404)
+
+    fechas = {}
+    for parametro in ('desde', 'hasta'):
+        valor = request.GET.get(parametro)
+        if valor:
+            fecha = parse_date(valor)
+            if fecha is None:
+                return JsonResponse({'error': f'{parametro} debe tener el formato AAAA-MM-DD'}, status=400)
+            fechas[parametro] = timezone.make_aware(datetime.combine(fecha, time.min))
+
+    registrar_log(
+        usuario=user,
+        tipoAccion="EXPORTAR",
+        rutaAcceso=request.path,
+        origenConexion="mobile" if "mobile" in request.META.get("HTTP_USER_AGENT", "").lower() else "web",
+        direccionIP=request.META.get("REMOTE_ADDR"),
+        resultado="exito",
+        detalles={"recurso": recurso, "formato": formato, **{k: request.GET[k] for k in fechas}},
+    )
+    respuesta = StreamingHttpResponse(
+        exportaciones.exportar(recurso, formato, **fechas),
+        content_type=exportaciones.FORMATOS[formato],
+    )
+    nombre = f"{recurso}-{timezone.localdate():%Y%m%d}.{formato}"
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    respuesta['Cache-Control'] = 'no-store'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import Counter
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+# Carpeta de los contenidos: blobs/ab/cd/<sha256>.<ext> (dentro de MEDIA_ROOT)
+PREFIJO = 'blobs'
+_RUTA_CONTENIDO = re.compile(rf'^{PREFIJO}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/([0-9a-f]{{64}})(\.[\w]+)?$')
+
+
+def calcular_hash(contenido):
+    """(sha256 en hex, tamaño) leyendo el archivo por bloques."""
+    sha = hashlib.sha256()
+    tamano = 0
+    for bloque in contenido.chunks():
+        sha.update(bloque)
+        tamano += len(bloque)
+    return sha.hexdigest(), tamano
+
+
+def ruta_contenido(hash, nombre):
+    extension = os.path.splitext(nombre)[1].lower()
+    return f"{PREFIJO}/{hash[:2]}/{hash[2:4]}/{hash}{extension}"
+
+
+def hash_de_ruta(nombre):
+    """Hash de una ruta direccionada por contenido, o None si es un archivo anterior al almacenamiento."""
+    coincidencia = _RUTA_CONTENIDO.match(nombre or '')
+    return coincidencia.group(1) if coincidencia else None
+
+
+class AlmacenamientoDeduplicado(FileSystemStorage):
+    """
+    Guarda cada contenido una sola vez bajo una ruta derivada de su SHA-256:
+    subir la misma foto en otra variante, tienda o perfil reutiliza el archivo
+    y suma una referencia. delete() resta una referencia y solo borra el
+    archivo cuando ya nadie lo usa.
+
+    Las rutas que no son blobs/ (archivos subidos antes) se manejan como en
+    FileSystemStorage.
+    """
+
+    def _save(self, name, content):
+        from apps.common.models.archivo import ArchivoAlmacenado
+
+        hash, tamano = calcular_hash(content)
+        with transaction.atomic():
+            archivo, creado = ArchivoAlmacenado.objects.select_for_update().get_or_create(
+                hash=hash, defaults={'ruta': ruta_contenido(hash, name), 'tamano': tamano}
+            )
+            if creado or not self.exists(archivo.ruta):
+                self._escribir(archivo.ruta, content)
+            ArchivoAlmacenado.objects.filter(pk=hash).update(referencias=F('referencias') + 1)
+        return archivo.ruta
+
+    def _escribir(self, ruta, content):
+        # Un archivo sin fila es resto de un guardado cuya transacción no se confirmó
+        if self.exists(ruta):
+            super().delete(ruta)
+        guardado = super()._save(ruta, content)
+        if guardado != ruta:
+            raise RuntimeError(f"No se pudo guardar {ruta} en su ruta de contenido.")
+
+    def delete(self, name):
+        """
+        Suelta una referencia. Borra el archivo al soltar la última, así que
+        debe llamarse fuera de transacciones o en on_commit: si la transacción
+        se revierte, la fila vuelve pero el archivo ya no.
+        """
+        from apps.common.models.archivo import ArchivoAlmacenado
+
+        hash = hash_de_ruta(name)
+        if hash is None:
+            return super().delete(name)
+        with transaction.atomic():
+            archivo = ArchivoAlmacenado.objects.select_for_update().filter(pk=hash).first()
+            if archivo is not None and archivo.referencias > 1:
+                ArchivoAlmacenado.objects.filter(pk=hash).update(referencias=F('referencias') - 1)
+                return
+            if archivo is not None:
+                archivo.delete()
+            # Con la fila bloqueada: un guardado concurrente del mismo contenido
+            # espera y vuelve a escribir el archivo
+            super().delete(archivo.ruta if archivo is not None else name)
+
+
+def liberar_al_confirmar(archivo, nombre):
+    """Suelta la referencia de `nombre` en el almacenamiento del FieldFile al confirmar la transacción."""
+    almacenamiento = archivo.storage
+
+    def liberar():
+        try:
+            almacenamiento.delete(nombre)
+        except Exception:
+            logger.warning("No se pudo liberar el archivo %s", nombre)
+
+    transaction.on_commit(liberar)
+
+
+def _rutas_en_uso():
+    from apps.common.imagenes import rutas_versiones
+    from apps.common.models import CustomUser, Imagen, Tienda
+
+    conteo = Counter()
+    for modelo, campo in ((Imagen, 'archivo'), (Tienda, 'foto_perfil'), (CustomUser, 'foto_perfil')):
+        conteo.update(modelo.objects.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True})
+                      .values_list(campo, flat=True).iterator())
+    for versiones in Imagen.objects.exclude(versiones={}).values_list('versiones', flat=True).iterator():
+        conteo.update(rutas_versiones(versiones))
+    return conteo
+
+
+def recontar_referencias(almacenamiento, antiguedad=24 * 3600):
+    """
+    Recalcula `referencias` a partir de los campos que apuntan a blobs/ y borra
+    los contenidos huérfanos y los archivos sin fila. Solo toca lo que tiene
+    más de `antiguedad` segundos, para no competir con subidas en curso.
+    Devuelve (corregidos, borrados).
+    """
+    from apps.common.models.archivo import ArchivoAlmacenado
+
+    en_uso = Counter()
+    for ruta, cantidad in _rutas_en_uso().items():
+        hash = hash_de_ruta(ruta)
+        if hash is not None:
+            en_uso[hash] += cantidad
+
+    limite = time.time() - antiguedad
+    corregidos = borrados = 0
+    for archivo in ArchivoAlmacenado.objects.order_by('hash').iterator():
+        if archivo.fecha_creacion.timestamp() > limite:
+            continue
+        referencias = en_uso.get(archivo.hash, 0)
+        if referencias:
+            if referencias != archivo.referencias:
+                corregidos += ArchivoAlmacenado.objects.filter(
+                    pk=archivo.hash, referencias=archivo.referencias
+                ).update(referencias=referencias)
+            continue
+        with transaction.atomic():
+            if ArchivoAlmacenado.objects.filter(pk=archivo.hash, referencias=archivo.referencias).delete()[0]:
+                FileSystemStorage.delete(almacenamiento, archivo.ruta)
+                borrados += 1
+
+    # Archivos escritos por guardados que después se revirtieron
+    carpeta = almacenamiento.path(PREFIJO)
+    registrados = set(ArchivoAlmacenado.objects.values_list('hash', flat=True).iterator())
+    for raiz, _, nombres in os.walk(carpeta):
+        for nombre in nombres:
+            ruta = os.path.relpath(os.path.join(raiz, nombre), almacenamiento.location).replace(os.sep, '/')
+            hash = hash_de_ruta(ruta)
+            if hash is None or hash in registrados or os.path.getmtime(os.path.join(raiz, nombre)) > limite:
+                continue
+            FileSystemStorage.delete(almacenamiento, ruta)
+            borrados += 1
+    return corregidos, borrados
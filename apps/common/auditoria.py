@@ -0,0 +1,121 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from django.conf import settings
+from django.db import close_old_connections, connection
+from apps.common.models.log import UserLog
+
+logger = logging.getLogger(__name__)
+
+ASINCRONA = getattr(settings, 'AUDITORIA_ASINCRONA', True)
+TAMANO_COLA = getattr(settings, 'AUDITORIA_TAMANO_COLA', 10000)
+TAMANO_LOTE = getattr(settings, 'AUDITORIA_TAMANO_LOTE', 200)
+INTERVALO = getattr(settings, 'AUDITORIA_INTERVALO', 1.0)
+
+
+def _serializable(detalles):
+    # Los args de una mutación pueden traer archivos u otros objetos: un solo
+    # valor no serializable haría fallar el lote entero.
+    return json.loads(json.dumps(detalles, default=str)) if detalles is not None else None
+
+
+class EscritorLogs:
+    """
+    Encola los UserLog en memoria y un hilo de fondo los inserta con bulk_create
+    en lotes. Si la cola está llena o el hilo no está disponible, el log se
+    guarda en el momento (fallback síncrono). Al terminar el proceso se vacía.
+    """
+
+    def __init__(self, tamano_cola, tamano_lote, intervalo):
+        self.cola = queue.Queue(maxsize=tamano_cola)
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self._hilo = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def registrar(self, log):
+        if not ASINCRONA or not self._iniciar():
+            self._guardar([log])
+            return
+        try:
+            self.cola.put_nowait(log)
+        except queue.Full:
+            logger.warning("Cola de auditoría llena: guardando log de forma síncrona")
+            self._guardar([log])
+
+    def _iniciar(self):
+        # Tras un fork (gunicorn --preload) el hilo del padre no existe en el hijo
+        if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+            return True
+        with self._lock:
+            if self._hilo is None or self._pid != os.getpid() or not self._hilo.is_alive():
+                try:
+                    self._hilo = threading.Thread(target=self._bucle, name='auditoria-userlog', daemon=True)
+                    self._hilo.start()
+                    self._pid = os.getpid()
+                except RuntimeError:
+                    return False
+        return True
+
+    def _siguiente_lote(self, espera):
+        lote = [self.cola.get(timeout=espera)] if espera else [self.cola.get_nowait()]
+        while len(lote) < self.tamano_lote:
+            try:
+                lote.append(self.cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _bucle(self):
+        while True:
+            try:
+                lote = self._siguiente_lote(self.intervalo)
+            except queue.Empty:
+                continue
+            self._guardar(lote)
+            # El hilo es largo: no dejar conexiones vencidas abiertas
+            close_old_connections()
+
+    def _guardar(self, lote):
+        try:
+            UserLog.objects.bulk_create(lote, batch_size=self.tamano_lote)
+        except Exception:
+            logger.exception("No se pudo guardar un lote de %s logs de auditoría", len(lote))
+            for log in lote:
+                try:
+                    log.save()
+                except Exception:
+                    logger.exception("Log de auditoría descartado: %s", log.tipoAccion)
+
+    def vaciar(self):
+        """Guarda de inmediato todo lo pendiente en la cola."""
+        while True:
+            try:
+                lote = self._siguiente_lote(None)
+            except queue.Empty:
+                break
+            self._guardar(lote)
+
+
+escritor = EscritorLogs(TAMANO_COLA, TAMANO_LOTE, INTERVALO)
+
+
+def _vaciar_al_salir():
+    try:
+        escritor.vaciar()
+    finally:
+        connection.close()
+
+
+atexit.register(_vaciar_al_salir)
+
+
+def registrar_log(usuario=None, detalles=None, **campos):
+    """Registra un UserLog sin bloquear el request con el INSERT."""
+    if usuario is not None and not usuario.is_authenticated:
+        usuario = None
+    escritor.registrar(UserLog(usuario=usuario, detalles=_serializable(detalles), **campos))
@@ -0,0 +1,116 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+
+User = get_user_model()
+
+TTL = getattr(settings, 'AUTH_CACHE_TTL', 60)
+TAMANO = getattr(settings, 'AUTH_CACHE_TAMANO', 1024)
+TTL_TOKEN_STREAM = getattr(settings, 'TIEMPO_REAL_TOKEN_SEGUNDOS', 60)
+USO_STREAM = 'stream'
+
+
+class CacheUsuarios:
+    """
+    LRU con expiración de los usuarios autenticados por token, local al proceso.
+    Se invalida al guardar o borrar un CustomUser; el TTL acota cuánto puede
+    quedar desactualizado un proceso que no vio el cambio.
+    """
+
+    def __init__(self, tamano, ttl):
+        self.tamano = tamano
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, user_id):
+        with self._lock:
+            entrada = self._datos.get(user_id)
+            if entrada is None:
+                return None
+            expira, usuario = entrada
+            if expira < time.monotonic():
+                del self._datos[user_id]
+                return None
+            self._datos.move_to_end(user_id)
+        # Cada request recibe su propia copia: los resolvers pueden modificarla
+        return copy.copy(usuario)
+
+    def guardar(self, usuario):
+        with self._lock:
+            self._datos[usuario.pk] = (time.monotonic() + self.ttl, copy.copy(usuario))
+            self._datos.move_to_end(usuario.pk)
+            while len(self._datos) > self.tamano:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, user_id):
+        with self._lock:
+            self._datos.pop(user_id, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+
+usuarios = CacheUsuarios(TAMANO, TTL)
+
+
+def generar_token_stream(usuario):
+    """
+    JWT para abrir el stream SSE: EventSource lo manda en la URL (queda en los
+    logs de acceso), así que solo sirve para eso y vence en TTL_TOKEN_STREAM.
+    """
+    ahora = datetime.now(timezone.utc)
+    payload = {
+        'user_id': usuario.id,
+        'uso': USO_STREAM,
+        'exp': ahora + timedelta(seconds=TTL_TOKEN_STREAM),
+        'iat': ahora,
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+
+def usuario_desde_token(token, uso=None):
+    """
+    Usuario activo del token, o None. Solo consulta la BD si no está en cache.
+    `uso` es el propósito del token: los de stream no valen como sesión ni al revés.
+    """
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        user_id = payload['user_id']
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, KeyError):
+        return None
+    if payload.get('uso') != uso:
+        return None
+
+    usuario = usuarios.obtener(user_id)
+    if usuario is None:
+        try:
+            usuario = User.objects.get(id=user_id)
+        except User.DoesNotExist:
+            return None
+        usuarios.guardar(usuario)
+    return usuario if usuario.is_active else None
+
+
+def token_de_request(request):
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    if auth.startswith('Bearer ') or auth.startswith('JWT '):
+        return auth.split(' ', 1)[1].strip()
+    return None
+
+
+def autenticar_request(request):
+    """Decodifica el token una sola vez por request y deja el usuario en request.user."""
+    if not getattr(request, '_jwt_autenticado', False):
+        token = token_de_request(request)
+        usuario = usuario_desde_token(token) if token else None
+        request.user = usuario if usuario is not None else AnonymousUser()
+        request._jwt_autenticado = True
+    return request.user
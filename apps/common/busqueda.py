@@ -0,0 +1,99 @@
+import base64
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Cast
+
+CONFIG = 'spanish'
+LIMITE_MAXIMO = 100
+
+
+def vector_producto(Producto):
+    """
+    Expresión del vector de búsqueda de un producto: nombre (A), categorías y
+    tienda (B) y descripción (C). Recibe el modelo para poder usarse también
+    desde migraciones con los modelos históricos.
+    """
+    ProductoCategoria = Producto.categoria.through
+    Tienda = Producto._meta.get_field('tienda').related_model
+    categorias = (
+        ProductoCategoria.objects.filter(producto_id=OuterRef('pk'))
+        .values('producto_id')
+        .annotate(nombres=StringAgg('categoria__nombre', delimiter=' '))
+        .values('nombres')
+    )
+    tienda = Tienda.objects.filter(pk=OuterRef('tienda_id')).values('nombre')
+    return (
+        SearchVector('nombre', weight='A', config=CONFIG)
+        + SearchVector(Subquery(categorias, output_field=TextField()), weight='B', config=CONFIG)
+        + SearchVector(Subquery(tienda, output_field=TextField()), weight='B', config=CONFIG)
+        + SearchVector('descripcion', weight='C', config=CONFIG)
+    )
+
+
+def actualizar_busqueda(productos):
+    """Recalcula el vector de los productos del queryset en un solo UPDATE."""
+    if connection.vendor != 'postgresql':
+        return
+    productos.update(busqueda=vector_producto(productos.model))
+
+
+def _codificar_cursor(modo, relevancia, producto_id):
+    valor = f"{modo}:{relevancia!r}:{producto_id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+
+def _decodificar_cursor(cursor):
+    try:
+        modo, relevancia, producto_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return modo, float(relevancia), int(producto_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Cursor inválido")
+
+
+def _resultados(productos, modo, texto):
+    if modo == 'fts':
+        query = SearchQuery(texto, config=CONFIG, search_type='websearch')
+        return productos.filter(busqueda=query).annotate(
+            relevancia=Cast(SearchRank(F('busqueda'), query), FloatField())
+        )
+    if modo == 'trigrama':
+        # Tolera errores de tipeo en el nombre usando el índice gin_trgm_ops
+        return productos.filter(nombre__trigram_word_similar=texto).annotate(
+            relevancia=Cast(TrigramWordSimilarity(texto, 'nombre'), FloatField())
+        )
+    # Bases de datos sin full-text (desarrollo local)
+    return productos.filter(nombre__icontains=texto).annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+
+def buscar_productos(productos, texto, limit=20, after=None):
+    """
+    Busca en `productos` y devuelve (pagina, siguiente_cursor) ordenados por
+    relevancia. Primero usa el índice full-text; si no hay coincidencias cae a
+    similitud por trigramas. El cursor guarda (modo, relevancia, id) para
+    paginar por keyset sin OFFSET.
+    """
+    texto = texto.strip()
+    limit = max(1, min(limit or 20, LIMITE_MAXIMO))
+    if not texto:
+        return [], None
+
+    if after:
+        modo, relevancia, ultimo_id = _decodificar_cursor(after)
+    elif connection.vendor != 'postgresql':
+        modo = 'texto'
+    else:
+        modo = 'fts' if _resultados(productos, 'fts', texto).exists() else 'trigrama'
+
+    qs = _resultados(productos, modo, texto)
+    if after:
+        qs = qs.filter(Q(relevancia__lt=relevancia) | Q(relevancia=relevancia, id__lt=ultimo_id))
+    pagina = list(qs.order_by('-relevancia', '-id')[:limit + 1])
+
+    siguiente = None
+    if len(pagina) > limit:
+        pagina = pagina[:limit]
+        ultimo = pagina[-1]
+        siguiente = _codificar_cursor(modo, ultimo.relevancia, ultimo.id)
+    return pagina, siguiente
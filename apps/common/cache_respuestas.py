@@ -0,0 +1,168 @@
+import hashlib
+import json
+import time
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from graphql import (GraphQLError, OperationType, TypeInfo, TypeInfoVisitor, Visitor, get_named_type,
+                     get_operation_ast, parse, print_ast, visit)
+from graphql.language import FieldNode
+
+ACTIVA = getattr(settings, 'RESPUESTAS_CACHE_ACTIVA', True)
+TTL = getattr(settings, 'RESPUESTAS_CACHE_TTL', 300)
+ALIAS = 'respuestas' if 'respuestas' in settings.CACHES else 'default'
+
+# Campos raíz que se cachean: públicos e iguales para todo visitante anónimo
+CAMPOS_PUBLICOS = {
+    'categorias', 'tiendas', 'tiendaPorId', 'productos', 'productosPorCategoria', 'productosDisponibles',
+}
+# Modelos cuyos signals invalidan; una consulta que llega a otro modelo no se cachea
+MODELOS_CATALOGO = {'common.producto', 'common.tienda', 'common.categoria', 'common.imagen', 'common.variante',
+                    'common.talla'}
+# Campos que cambian con cada reserva o ajuste de stock y precios: tienen su propia
+# versión ('<modelo>:existencias') para que un movimiento de stock no tire todo el catálogo
+EXISTENCIAS = 'existencias'
+CAMPOS_EXISTENCIAS = {
+    'common.producto': {'stockTotal', 'precioMinimo', 'precioMaximo'},
+    'common.variante': {'stock', 'precio'},
+}
+# Dependencias que no se ven en los campos pedidos (filtros y orden sobre otros datos)
+DEPENDENCIAS_CAMPO = {
+    'productosPorCategoria': {'common.categoria'},
+    'productosDisponibles': {f'common.producto:{EXISTENCIAS}'},
+}
+
+
+def _etiqueta(modelo):
+    return modelo if isinstance(modelo, str) else modelo._meta.label_lower
+
+
+def _clave_version(etiqueta):
+    return f"respuestas:version:{etiqueta}"
+
+
+def _modelo(tipo):
+    meta = getattr(getattr(get_named_type(tipo), 'graphene_type', None), '_meta', None)
+    modelo = getattr(meta, 'model', None)
+    return modelo._meta.label_lower if modelo is not None else None
+
+
+class _Recolector(Visitor):
+    """Junta los modelos Django de todos los tipos que alcanza la selección y sus campos de stock."""
+
+    def __init__(self, tipo_info):
+        super().__init__()
+        self.tipo_info = tipo_info
+        self.modelos = set()
+
+    def enter_field(self, nodo, *args):
+        modelo = _modelo(self.tipo_info.get_type())
+        if modelo is not None:
+            self.modelos.add(modelo)
+        padre = _modelo(self.tipo_info.get_parent_type())
+        if nodo.name.value in CAMPOS_EXISTENCIAS.get(padre, ()):
+            self.modelos.add(f"{padre}:{EXISTENCIAS}")
+
+
+@lru_cache(maxsize=512)
+def _analizar(schema, query, operation_name):
+    """
+    (consulta normalizada, etiquetas) de una operación cacheable, o None.
+    Se memoriza por texto: los clientes repiten siempre las mismas consultas.
+    """
+    try:
+        documento = parse(query)
+    except GraphQLError:
+        return None
+    operacion = get_operation_ast(documento, operation_name)
+    if operacion is None or operacion.operation != OperationType.QUERY:
+        return None
+    campos = set()
+    for seleccion in operacion.selection_set.selections:
+        if not isinstance(seleccion, FieldNode):
+            return None
+        campos.add(seleccion.name.value)
+    campos.discard('__typename')
+    if not campos or not campos <= CAMPOS_PUBLICOS:
+        return None
+
+    tipo_info = TypeInfo(schema)
+    recolector = _Recolector(tipo_info)
+    visit(documento, TypeInfoVisitor(tipo_info, recolector))
+    etiquetas = set(recolector.modelos)
+    for campo in campos:
+        etiquetas |= DEPENDENCIAS_CAMPO.get(campo, set())
+    if not etiquetas or not {etiqueta.split(':')[0] for etiqueta in etiquetas} <= MODELOS_CATALOGO:
+        return None
+    return print_ast(documento), tuple(sorted(etiquetas))
+
+
+def _versiones(cache, etiquetas):
+    claves = [_clave_version(etiqueta) for etiqueta in etiquetas]
+    versiones = cache.get_many(claves)
+    for clave in claves:
+        if clave not in versiones:
+            # Arranca en la hora actual: si la versión se perdió, no revive entradas viejas
+            cache.add(clave, time.time_ns(), timeout=None)
+            versiones[clave] = cache.get(clave)
+    return [versiones[clave] for clave in claves]
+
+
+class EntradaRespuesta:
+    def __init__(self, cache, clave):
+        self.cache = cache
+        self.clave = clave
+
+    def obtener(self):
+        return self.cache.get(self.clave)
+
+    def guardar(self, datos):
+        self.cache.set(self.clave, datos, TTL)
+
+
+def entrada(schema, query, variables, operation_name, origen=''):
+    """
+    Entrada de cache para una consulta anónima, o None si no es cacheable. La
+    clave combina la consulta normalizada, las variables, el origen (las URLs
+    absolutas dependen del host) y la versión actual de cada modelo que toca:
+    invalidar es subir la versión, las entradas viejas quedan sin leer y
+    vencen por TTL.
+    """
+    if not ACTIVA or not query:
+        return None
+    analisis = _analizar(schema, query, operation_name)
+    if analisis is None:
+        return None
+    normalizada, etiquetas = analisis
+    cache = caches[ALIAS]
+    contenido = json.dumps(
+        [normalizada, operation_name, variables or {}, origen, _versiones(cache, etiquetas)],
+        sort_keys=True, default=str,
+    )
+    return EntradaRespuesta(cache, f"respuestas:{hashlib.sha256(contenido.encode()).hexdigest()}")
+
+
+def invalidar(*modelos):
+    """
+    Sube la versión de los modelos al confirmar la transacción: una lectura
+    que empezó antes guarda con la versión anterior y nadie la vuelve a usar.
+    """
+    if not ACTIVA:
+        return
+    claves = [_clave_version(_etiqueta(modelo)) for modelo in modelos]
+
+    def incrementar():
+        cache = caches[ALIAS]
+        for clave in claves:
+            try:
+                cache.incr(clave)
+            except ValueError:
+                cache.add(clave, time.time_ns(), timeout=None)
+
+    transaction.on_commit(incrementar)
+
+
+def invalidar_existencias(*modelos):
+    """Invalida solo las respuestas que leen stock o precios de los modelos (CAMPOS_EXISTENCIAS)."""
+    invalidar(*(f"{_etiqueta(modelo)}:{EXISTENCIAS}" for modelo in modelos))
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from apps.common.models.categoria import Categoria, CategoriaAncestro
+
+CACHE_ACTIVA = getattr(settings, 'ARBOL_CATEGORIAS_CACHE', True)
+CLAVE_ARBOL = 'arbol_categorias'
+DURACION_ARBOL = 60 * 60
+
+
+def insertar_en_arbol(categoria):
+    """Agrega la categoría recién creada bajo los ancestros de su padre."""
+    filas = [CategoriaAncestro(ancestro_id=categoria.pk, descendiente_id=categoria.pk, profundidad=0)]
+    if categoria.categoriaPadre_id:
+        ancestros = CategoriaAncestro.objects.filter(descendiente_id=categoria.categoriaPadre_id)
+        filas += [
+            CategoriaAncestro(ancestro_id=ancestro_id, descendiente_id=categoria.pk, profundidad=profundidad + 1)
+            for ancestro_id, profundidad in ancestros.values_list('ancestro_id', 'profundidad')
+        ]
+    CategoriaAncestro.objects.bulk_create(filas, ignore_conflicts=True)
+
+
+def mover_en_arbol(categoria):
+    """Reubica el subárbol de la categoría bajo su nuevo padre (o como raíz)."""
+    subarbol = list(CategoriaAncestro.objects.filter(ancestro_id=categoria.pk).values_list('descendiente_id', 'profundidad'))
+    ids = [descendiente_id for descendiente_id, _ in subarbol]
+    # Desvincular el subárbol de sus ancestros anteriores; las filas internas se mantienen
+    CategoriaAncestro.objects.filter(descendiente_id__in=ids).exclude(ancestro_id__in=ids).delete()
+    if not categoria.categoriaPadre_id:
+        return
+    ancestros = CategoriaAncestro.objects.filter(descendiente_id=categoria.categoriaPadre_id).values_list('ancestro_id', 'profundidad')
+    CategoriaAncestro.objects.bulk_create([
+        CategoriaAncestro(ancestro_id=ancestro_id, descendiente_id=descendiente_id, profundidad=p_ancestro + p_descendiente + 1)
+        for ancestro_id, p_ancestro in ancestros
+        for descendiente_id, p_descendiente in subarbol
+    ])
+
+
+def es_descendiente(categoria_id, posible_descendiente_id):
+    return CategoriaAncestro.objects.filter(ancestro_id=categoria_id, descendiente_id=posible_descendiente_id).exists()
+
+
+def ids_subarbol(categoria_id):
+    """Subconsulta con la categoría y todas sus subcategorías, a cualquier profundidad."""
+    return CategoriaAncestro.objects.filter(ancestro_id=categoria_id).values('descendiente_id')
+
+
+def reconstruir_arbol(Categoria=Categoria, CategoriaAncestro=CategoriaAncestro):
+    """
+    Recalcula la tabla de clausura desde categoriaPadre. Recibe los modelos
+    para poder usarse también desde migraciones con los modelos históricos.
+    """
+    padres = dict(Categoria.objects.values_list('id', 'categoriaPadre_id'))
+    filas = []
+    for categoria_id in padres:
+        actual, profundidad, vistos = categoria_id, 0, set()
+        while actual is not None and actual not in vistos:
+            vistos.add(actual)
+            filas.append(CategoriaAncestro(ancestro_id=actual, descendiente_id=categoria_id, profundidad=profundidad))
+            actual, profundidad = padres.get(actual), profundidad + 1
+    CategoriaAncestro.objects.all().delete()
+    CategoriaAncestro.objects.bulk_create(filas, batch_size=1000)
+
+
+def arbol_categorias():
+    """Árbol completo como dicts anidados, armado con una sola consulta y cacheado (si CACHE_ACTIVA)."""
+    arbol = cache.get(CLAVE_ARBOL) if CACHE_ACTIVA else None
+    if arbol is None:
+        nodos = {
+            c['id']: dict(c, hijos=[])
+            for c in Categoria.objects.order_by('nombre').values('id', 'nombre', 'icono', 'categoriaPadre_id')
+        }
+        arbol = []
+        for nodo in nodos.values():
+            padre = nodos.get(nodo['categoriaPadre_id'])
+            (padre['hijos'] if padre else arbol).append(nodo)
+        if CACHE_ACTIVA:
+            cache.set(CLAVE_ARBOL, arbol, DURACION_ARBOL)
+    return arbol
+
+
+def invalidar_arbol():
+    """Borra el árbol cacheado al confirmar: antes, otra lectura lo volvería a guardar viejo."""
+    if CACHE_ACTIVA:
+        transaction.on_commit(lambda: cache.delete(CLAVE_ARBOL))
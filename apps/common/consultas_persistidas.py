@@ -0,0 +1,264 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import HttpError
+from graphql import (ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, parse, print_ast,
+                     validate)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVOS = getattr(settings, 'CONSULTAS_PERSISTIDAS_ARCHIVOS', {})
+SOLO_REGISTRADAS = getattr(settings, 'CONSULTAS_PERSISTIDAS_SOLO_REGISTRADAS', False)
+TAMANO_CACHE = getattr(settings, 'CONSULTAS_PERSISTIDAS_CACHE', 1000)
+INICIOS_OPERACION = ('query', 'mutation', 'subscription', 'fragment', '{')
+
+
+def calcular_hash(texto):
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def extraer_documentos(texto):
+    """
+    [(etiqueta, documento)] de un archivo de ejemplos: cada operación empieza
+    en una línea 'query'/'mutation'/'{' y termina cuando cierran sus llaves; la
+    etiqueta es la última línea de texto libre anterior ('Crear', '<login').
+    """
+    documentos = []
+    etiqueta = None
+    lineas = []
+    profundidad = 0
+    for linea in texto.splitlines():
+        limpia = linea.strip()
+        if not lineas:
+            if not limpia.startswith(INICIOS_OPERACION):
+                if limpia:
+                    etiqueta = limpia.lstrip('<-#').strip() or etiqueta
+                continue
+        lineas.append(linea)
+        en_cadena = False
+        anterior = ''
+        for caracter in linea:
+            if caracter == '"' and anterior != '\\':
+                en_cadena = not en_cadena
+            elif caracter == '#' and not en_cadena:
+                break
+            elif not en_cadena:
+                profundidad += {'{': 1, '}': -1}.get(caracter, 0)
+            anterior = caracter
+        if profundidad <= 0 and '{' in ''.join(lineas):
+            documentos.append((etiqueta, '\n'.join(lineas).strip()))
+            lineas = []
+            profundidad = 0
+    return documentos
+
+
+def _archivos(rutas):
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for nombre in sorted(os.listdir(ruta)):
+                if nombre.endswith(('.txt', '.graphql', '.gql')):
+                    yield os.path.join(ruta, nombre)
+        elif os.path.isfile(ruta):
+            yield ruta
+
+
+class ConsultaCompilada:
+    def __init__(self, texto, documento, etiqueta=None):
+        self.texto = texto
+        self.documento = documento
+        self.etiqueta = etiqueta
+
+
+def compilar(schema, texto, reglas=None, etiqueta=None):
+    """ConsultaCompilada con el documento ya parseado y validado, o la lista de errores."""
+    try:
+        documento = parse(texto)
+    except GraphQLError as error:
+        return [error]
+    errores = validate(schema, documento, reglas, graphene_settings.MAX_VALIDATION_ERRORS)
+    return errores or ConsultaCompilada(texto, documento, etiqueta)
+
+
+class DocumentosCompilados:
+    """
+    LRU (por proceso) de documentos ya parseados y validados, por hash del
+    texto. También guarda las consultas que los clientes registran con APQ.
+    """
+
+    def __init__(self, tamano):
+        self.tamano = tamano
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, hash):
+        with self._lock:
+            compilada = self._datos.get(hash)
+            if compilada is not None:
+                self._datos.move_to_end(hash)
+            return compilada
+
+    def guardar(self, hash, compilada):
+        with self._lock:
+            self._datos[hash] = compilada
+            self._datos.move_to_end(hash)
+            while len(self._datos) > self.tamano:
+                self._datos.popitem(last=False)
+
+
+class Registro:
+    """
+    Consultas conocidas de un schema, cargadas de los archivos de ejemplo la
+    primera vez que se usan. Se indexan por hash del texto exacto y del texto
+    normalizado (print_ast), así la lista blanca no depende del formato.
+    """
+
+    def __init__(self, schema, rutas):
+        self.schema = schema
+        self.rutas = rutas
+        self.consultas = {}
+        self.normalizadas = {}
+        self.documentos = DocumentosCompilados(TAMANO_CACHE)
+        self._cargado = False
+        self._lock = threading.Lock()
+
+    def cargar(self):
+        with self._lock:
+            if self._cargado:
+                return self
+            for archivo in _archivos(self.rutas):
+                with open(archivo, encoding='utf-8') as contenido:
+                    documentos = extraer_documentos(contenido.read())
+                for etiqueta, texto in documentos:
+                    compilada = compilar(self.schema, texto, etiqueta=etiqueta)
+                    if isinstance(compilada, list):
+                        logger.warning("Consulta '%s' de %s no válida para el schema: %s",
+                                       etiqueta, archivo, compilada[0].message)
+                        continue
+                    self.consultas[calcular_hash(texto)] = compilada
+                    self.normalizadas[calcular_hash(print_ast(compilada.documento))] = compilada
+            self._cargado = True
+        return self
+
+    def buscar(self, hash):
+        return self.consultas.get(hash) or self.documentos.obtener(hash)
+
+    def permitida(self, texto):
+        """Consulta registrada con este texto (exacto o con otro formato), o None."""
+        compilada = self.consultas.get(calcular_hash(texto))
+        if compilada is None:
+            try:
+                compilada = self.normalizadas.get(calcular_hash(print_ast(parse(texto))))
+            except GraphQLError:
+                return None
+        return compilada
+
+
+_registros = {}
+_lock_registros = threading.Lock()
+
+
+def registro(nombre, schema):
+    with _lock_registros:
+        if nombre not in _registros:
+            _registros[nombre] = Registro(schema, ARCHIVOS.get(nombre, []))
+    return _registros[nombre].cargar()
+
+
+def _extension(request, data):
+    extensiones = request.GET.get('extensions') or data.get('extensions')
+    if isinstance(extensiones, str):
+        try:
+            extensiones = json.loads(extensiones)
+        except ValueError:
+            raise HttpError(HttpResponse(status=400), "Las extensiones no son JSON válido.")
+    persistida = (extensiones or {}).get('persistedQuery') if isinstance(extensiones, dict) else None
+    return persistida if isinstance(persistida, dict) else None
+
+
+class ConsultasPersistidasMixin:
+    """
+    Para vistas GraphQL: consultas persistidas automáticas (APQ, el cliente
+    manda solo el sha256 en extensions.persistedQuery) y documentos ya
+    validados reutilizados entre requests. Con SOLO_REGISTRADAS solo se
+    ejecutan las consultas de los archivos del registro.
+    """
+    nombre_registro = None
+
+    def registro(self):
+        return registro(self.nombre_registro, self.schema.graphql_schema)
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        persistida = _extension(request, data)
+        registro = self.registro()
+        if persistida is not None:
+            hash = str(persistida.get('sha256Hash') or '')
+            if query:
+                if calcular_hash(query) != hash:
+                    raise HttpError(HttpResponse(status=400), "provided sha does not match query")
+            else:
+                compilada = registro.buscar(hash)
+                if compilada is None:
+                    # Mensaje del protocolo: el cliente reintenta enviando el texto
+                    raise HttpError(HttpResponse(status=200), "PersistedQueryNotFound")
+                query = compilada.texto
+        if query and SOLO_REGISTRADAS and registro.permitida(query) is None:
+            raise HttpError(HttpResponse(status=403), "Consulta no registrada.")
+        return query, variables, operation_name, id
+
+    def _compilada(self, query):
+        registro = self.registro()
+        hash = calcular_hash(query)
+        compilada = registro.buscar(hash) or (registro.permitida(query) if SOLO_REGISTRADAS else None)
+        if compilada is None:
+            compilada = compilar(registro.schema, query, self.validation_rules)
+            if isinstance(compilada, list):
+                return compilada
+            registro.documentos.guardar(hash, compilada)
+        return compilada
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        if not query:
+            return super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        compilada = self._compilada(query)
+        if isinstance(compilada, list):
+            return ExecutionResult(data=None, errors=compilada)
+
+        operacion = get_operation_ast(compilada.documento, operation_name)
+        if request.method.lower() == 'get' and operacion is not None and operacion.operation != OperationType.QUERY:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseNotAllowed(
+                ['POST'], f"Can only perform a {operacion.operation.value} operation from a POST request."
+            ))
+
+        opciones = {
+            'root_value': self.get_root_value(request),
+            'context_value': self.get_context(request),
+            'variable_values': variables,
+            'operation_name': operation_name,
+            'middleware': self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            opciones['execution_context_class'] = self.execution_context_class
+        try:
+            if operacion is not None and operacion.operation == OperationType.MUTATION and (
+                graphene_settings.ATOMIC_MUTATIONS is True
+                or connection.settings_dict.get('ATOMIC_MUTATIONS', False) is True
+            ):
+                with transaction.atomic():
+                    resultado = execute(self.schema.graphql_schema, compilada.documento, **opciones)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return resultado
+            return execute(self.schema.graphql_schema, compilada.documento, **opciones)
+        except Exception as error:
+            return ExecutionResult(errors=[error])
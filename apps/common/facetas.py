@@ -0,0 +1,243 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+from apps.common.models import Producto, Variante
+from apps.common.models.faceta import FacetaProducto, ConteoFaceta
+
+# Límites de los rangos de precio (sobre precioBase): 0-50, 50-100, ..., 500+
+RANGOS_PRECIO = (0, 50, 100, 200, 500)
+CAMPOS_FACETAS = {'estado', 'tienda', 'talla', 'color', 'precioBase'}
+TAMANO_LOTE = 1000
+# Clave (par de int4) de pg_advisory_xact_lock: la sincronización la toma compartida y
+# además bloquea cada producto por su id (clave bigint, otro espacio); reconstruir la toma exclusiva
+BLOQUEO_FACETAS = (0x46414345, 0)
+
+
+def rango_precio(precio):
+    for inferior, superior in zip(RANGOS_PRECIO, RANGOS_PRECIO[1:]):
+        if precio < superior:
+            return f"{inferior}-{superior}"
+    return f"{RANGOS_PRECIO[-1]}+"
+
+
+def normalizar_color(color):
+    return (color or '').strip().lower()
+
+
+def _esperadas(ids):
+    """Valores de faceta que deberían tener los productos `ids` (vacío si no están activos)."""
+    esperadas = {pid: set() for pid in ids}
+    productos = Producto.objects.filter(pk__in=ids, estado='activo').values_list(
+        'id', 'tienda_id', 'talla_id', 'color', 'precioBase'
+    )
+    activos = []
+    for pid, tienda_id, talla_id, color, precio in productos:
+        activos.append(pid)
+        esperadas[pid].add(('tienda', str(tienda_id)))
+        esperadas[pid].add(('precio', rango_precio(precio)))
+        if talla_id:
+            esperadas[pid].add(('talla', str(talla_id)))
+        if normalizar_color(color):
+            esperadas[pid].add(('color', normalizar_color(color)))
+    if not activos:
+        return esperadas
+
+    categorias = Producto.categoria.through.objects.filter(producto_id__in=activos)
+    for pid, categoria_id in categorias.values_list('producto_id', 'categoria_id'):
+        esperadas[pid].add(('categoria', str(categoria_id)))
+    for pid, talla_id, color in Variante.objects.filter(producto_id__in=activos).values_list('producto_id', 'talla_id', 'color'):
+        if talla_id:
+            esperadas[pid].add(('talla', str(talla_id)))
+        if normalizar_color(color):
+            esperadas[pid].add(('color', normalizar_color(color)))
+    return esperadas
+
+
+def _ajustar_conteos(deltas):
+    for (tipo, valor), delta in deltas.items():
+        if not delta:
+            continue
+        actualizados = ConteoFaceta.objects.filter(tipo=tipo, valor=valor).update(cantidad=F('cantidad') + delta)
+        if not actualizados:
+            ConteoFaceta.objects.get_or_create(tipo=tipo, valor=valor)
+            ConteoFaceta.objects.filter(tipo=tipo, valor=valor).update(cantidad=F('cantidad') + delta)
+
+
+def _bloquear(ids=None):
+    """
+    Serializa hasta el fin de la transacción la sincronización de los productos
+    `ids` (también de los ya borrados, por eso no alcanza con select_for_update
+    sobre Producto). Sin ids bloquea todo el índice, para reconstruirlo.
+    """
+    if connection.vendor != 'postgresql':
+        # SQLite ya serializa las escrituras de toda la base
+        return
+    with connection.cursor() as cursor:
+        if ids is None:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", BLOQUEO_FACETAS)
+            return
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(%s, %s)", BLOQUEO_FACETAS)
+        # Siempre en el mismo orden: dos sincronizaciones no se bloquean en cruz
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(id) FROM (SELECT unnest(%s::bigint[]) AS id ORDER BY 1) AS ids",
+            [sorted(ids)],
+        )
+
+
+def _insertar_filas(filas):
+    """Inserta [(producto_id, tipo, valor)] y devuelve las que realmente se insertaron."""
+    if not filas:
+        return []
+    if connection.vendor != 'postgresql':
+        FacetaProducto.objects.bulk_create(
+            [FacetaProducto(producto_id=pid, tipo=tipo, valor=valor) for pid, tipo, valor in filas],
+            batch_size=TAMANO_LOTE,
+        )
+        return filas
+    tabla = connection.ops.quote_name(FacetaProducto._meta.db_table)
+    insertadas = []
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(filas), TAMANO_LOTE):
+            cursor.execute(
+                f"INSERT INTO {tabla} (producto_id, tipo, valor) "
+                "SELECT * FROM unnest(%s::bigint[], %s::varchar[], %s::varchar[]) "
+                "ON CONFLICT (producto_id, tipo, valor) DO NOTHING RETURNING producto_id, tipo, valor",
+                [list(columna) for columna in zip(*filas[inicio:inicio + TAMANO_LOTE])],
+            )
+            insertadas += cursor.fetchall()
+    return insertadas
+
+
+def sincronizar_facetas(ids):
+    """
+    Lleva las filas de FacetaProducto de los productos `ids` a su estado actual
+    y aplica solo la diferencia a ConteoFaceta, sin recontar el catálogo. Los
+    conteos se mueven por las filas que de verdad se borraron e insertaron.
+    """
+    ids = set(ids)
+    if not ids:
+        return
+    with transaction.atomic():
+        _bloquear(ids)
+        esperadas = _esperadas(ids)
+        existentes = defaultdict(dict)
+        filas = FacetaProducto.objects.filter(producto_id__in=ids).values_list('id', 'producto_id', 'tipo', 'valor')
+        for id, pid, tipo, valor in filas:
+            existentes[pid][(tipo, valor)] = id
+
+        quitar = []
+        agregar = []
+        for pid in ids:
+            for clave, id in existentes[pid].items():
+                if clave not in esperadas[pid]:
+                    quitar.append(id)
+            for tipo, valor in esperadas[pid] - existentes[pid].keys():
+                agregar.append((pid, tipo, valor))
+
+        deltas = Counter()
+        if quitar:
+            # Se descuentan las filas que siguen ahí al bloquearlas, que son las que se borran
+            borradas = list(FacetaProducto.objects.select_for_update().filter(pk__in=quitar).values_list('id', 'tipo', 'valor'))
+            FacetaProducto.objects.filter(pk__in=[id for id, _, _ in borradas]).delete()
+            for _, tipo, valor in borradas:
+                deltas[(tipo, valor)] -= 1
+        for _, tipo, valor in _insertar_filas(agregar):
+            deltas[(tipo, valor)] += 1
+        _ajustar_conteos(deltas)
+
+
+def programar_sincronizacion(ids):
+    """Sincroniza al confirmar la transacción, cuando ya se guardaron variantes y categorías."""
+    ids = set(ids)
+    if ids:
+        transaction.on_commit(lambda: sincronizar_facetas(ids))
+
+
+def reconstruir_facetas():
+    """Recalcula ambas tablas desde cero (carga inicial o reparación)."""
+    with transaction.atomic():
+        _bloquear()
+        FacetaProducto.objects.all().delete()
+        ConteoFaceta.objects.all().delete()
+        ids = Producto.objects.filter(estado='activo').values_list('id', flat=True).order_by('id').iterator(chunk_size=TAMANO_LOTE)
+        lote = []
+        for pid in ids:
+            lote.append(pid)
+            if len(lote) == TAMANO_LOTE:
+                _insertar(lote)
+                lote = []
+        _insertar(lote)
+        conteos = FacetaProducto.objects.values('tipo', 'valor').annotate(cantidad=Count('id'))
+        ConteoFaceta.objects.bulk_create([ConteoFaceta(**fila) for fila in conteos], batch_size=TAMANO_LOTE)
+
+
+def _insertar(ids):
+    filas = [
+        FacetaProducto(producto_id=pid, tipo=tipo, valor=valor)
+        for pid, valores in _esperadas(ids).items()
+        for tipo, valor in valores
+    ]
+    FacetaProducto.objects.bulk_create(filas, batch_size=TAMANO_LOTE)
+
+
+# ===== CONSULTA DEL CATÁLOGO =====
+
+def _filtros_faceta(filtros):
+    """Convierte los filtros de la consulta en {tipo: valores} de FacetaProducto."""
+    seleccion = {
+        'categoria': [str(v) for v in filtros.get('categorias') or []],
+        'talla': [str(v) for v in filtros.get('tallas') or []],
+        'color': [normalizar_color(v) for v in filtros.get('colores') or []],
+        'tienda': [str(v) for v in filtros.get('tiendas') or []],
+    }
+    return {tipo: valores for tipo, valores in seleccion.items() if valores}
+
+
+def _productos_filtrados(filtros, excepto=None):
+    productos = Producto.objects.filter(estado='activo')
+    # Dentro de un tipo los valores se combinan con OR y entre tipos con AND
+    for tipo, valores in _filtros_faceta(filtros).items():
+        if tipo != excepto:
+            productos = productos.filter(
+                id__in=FacetaProducto.objects.filter(tipo=tipo, valor__in=valores).values('producto_id')
+            )
+    if excepto != 'precio':
+        if filtros.get('precio_min') is not None:
+            productos = productos.filter(precioBase__gte=Decimal(str(filtros['precio_min'])))
+        if filtros.get('precio_max') is not None:
+            productos = productos.filter(precioBase__lte=Decimal(str(filtros['precio_max'])))
+    return productos
+
+
+def filtrar_catalogo(filtros=None):
+    """Productos activos que cumplen todos los filtros del catálogo."""
+    return _productos_filtrados(filtros or {})
+
+
+def hay_filtros(filtros):
+    filtros = filtros or {}
+    return bool(_filtros_faceta(filtros)) or filtros.get('precio_min') is not None or filtros.get('precio_max') is not None
+
+
+def contar_facetas(filtros=None):
+    """
+    Devuelve {tipo: [(valor, cantidad), ...]}. Sin filtros se lee directo de
+    ConteoFaceta; con filtros se cuenta sobre la tabla angosta de facetas, y
+    cada tipo ignora su propio filtro para que el panel muestre las alternativas.
+    """
+    filtros = filtros or {}
+    conteos = defaultdict(list)
+    if not hay_filtros(filtros):
+        for tipo, valor, cantidad in ConteoFaceta.objects.filter(cantidad__gt=0).values_list('tipo', 'valor', 'cantidad'):
+            conteos[tipo].append((valor, cantidad))
+        return conteos
+
+    for tipo, _ in FacetaProducto._meta.get_field('tipo').choices:
+        filas = (
+            FacetaProducto.objects.filter(tipo=tipo, producto_id__in=_productos_filtrados(filtros, excepto=tipo).values('id'))
+            .values_list('valor')
+            .annotate(cantidad=Count('id'))
+        )
+        conteos[tipo] = list(filas)
+    return conteos
@@ -0,0 +1,161 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image as PILImage, ImageOps
+from apps.common import cache_respuestas
+from apps.common.models.imagen import Imagen
+
+logger = logging.getLogger(__name__)
+
+ASINCRONAS = getattr(settings, 'IMAGENES_ASINCRONAS', True)
+TRABAJADORES = getattr(settings, 'IMAGENES_TRABAJADORES', 2)
+
+# Lado mayor en píxeles de cada versión
+TAMANOS = {
+    'thumb': 200,
+    'medium': 800,
+    'large': 1600,
+}
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def _abrir(archivo):
+    archivo.open('rb')
+    try:
+        imagen = PILImage.open(archivo)
+        imagen.load()
+    finally:
+        archivo.close()
+    # Aplicar la orientación de la cámara antes de descartar el EXIF
+    return ImageOps.exif_transpose(imagen)
+
+
+def _codificar(imagen, formato):
+    nombre_pil, opciones = FORMATOS[formato]
+    if formato == 'jpeg' and imagen.mode != 'RGB':
+        fondo = PILImage.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.convert('RGBA').getchannel('A'))
+        imagen = fondo
+    elif formato == 'webp' and imagen.mode not in ('RGB', 'RGBA'):
+        imagen = imagen.convert('RGBA')
+    salida = io.BytesIO()
+    # Sin exif= ni icc_profile=: la versión sale sin metadatos
+    imagen.save(salida, nombre_pil, **opciones)
+    return salida.getvalue()
+
+
+def rutas_versiones(versiones):
+    return [ruta for version in (versiones or {}).values() for ruta in version.get('rutas', {}).values()]
+
+
+def borrar_versiones(rutas):
+    for ruta in rutas:
+        try:
+            default_storage.delete(ruta)
+        except Exception:
+            logger.warning("No se pudo borrar la versión %s", ruta)
+
+
+def generar_versiones(imagen_id):
+    """
+    Genera las versiones thumb/medium/large en WebP y JPEG de una Imagen,
+    sin EXIF, y las registra en Imagen.versiones. Nunca agranda el original.
+    """
+    imagen = Imagen.objects.filter(pk=imagen_id).first()
+    if imagen is None or not imagen.archivo:
+        return None
+    archivo_original = imagen.archivo.name
+    guardadas = []
+    try:
+        original = _abrir(imagen.archivo)
+        base, _ = os.path.splitext(os.path.basename(archivo_original))
+        carpeta = os.path.join(os.path.dirname(archivo_original), 'versiones')
+
+        versiones = {}
+        for tamano, lado in TAMANOS.items():
+            copia = original.copy()
+            copia.thumbnail((lado, lado), PILImage.Resampling.LANCZOS)
+            rutas = {}
+            for formato in FORMATOS:
+                destino = os.path.join(carpeta, f"{base}-{tamano}.{formato}")
+                rutas[formato] = default_storage.save(destino, ContentFile(_codificar(copia, formato)))
+                guardadas.append(rutas[formato])
+            versiones[tamano] = {'ancho': copia.width, 'alto': copia.height, 'rutas': rutas}
+    except Exception:
+        logger.exception("No se pudieron generar las versiones de la imagen %s", imagen_id)
+        borrar_versiones(guardadas)
+        Imagen.objects.filter(pk=imagen_id, archivo=archivo_original).update(estado_versiones='fallido')
+        return None
+
+    # Si el archivo (o las versiones, por otra generación) cambió mientras se
+    # procesaba, estas versiones ya no sirven
+    actualizadas = Imagen.objects.filter(pk=imagen_id, archivo=archivo_original, versiones=imagen.versiones).update(
+        versiones=versiones, estado_versiones='listo'
+    )
+    if not actualizadas:
+        borrar_versiones(rutas_versiones(versiones))
+        return None
+    cache_respuestas.invalidar(Imagen)
+    # Al regenerar se sueltan las versiones reemplazadas (con el almacenamiento
+    # deduplicado pueden ser las mismas rutas: cada guardado sumó una referencia)
+    borrar_versiones(rutas_versiones(imagen.versiones))
+    return versiones
+
+
+class Procesador:
+    """Pool de hilos que genera las versiones fuera del request (Pillow suelta el GIL al redimensionar)."""
+
+    def __init__(self, trabajadores):
+        self.trabajadores = trabajadores
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _obtener_pool(self):
+        with self._lock:
+            # Tras un fork los hilos del pool del padre no existen en el hijo
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.trabajadores, thread_name_prefix='versiones-imagen')
+                self._pid = os.getpid()
+            return self._pool
+
+    def encolar(self, imagen_id):
+        if not ASINCRONAS:
+            generar_versiones(imagen_id)
+            return
+        try:
+            self._obtener_pool().submit(self._procesar, imagen_id)
+        except RuntimeError:
+            generar_versiones(imagen_id)
+
+    @staticmethod
+    def _procesar(imagen_id):
+        try:
+            generar_versiones(imagen_id)
+        finally:
+            close_old_connections()
+
+
+procesador = Procesador(TRABAJADORES)
+
+
+def programar_versiones(imagen_id):
+    """Genera las versiones al confirmar la transacción que guardó la imagen."""
+    transaction.on_commit(lambda: procesador.encolar(imagen_id))
+
+
+def url_version(imagen, tamano=None, formato='webp'):
+    """URL de la versión pedida, o la del original si todavía no hay versiones."""
+    version = (imagen.versiones or {}).get(tamano) if tamano else None
+    if version and formato in version.get('rutas', {}):
+        return default_storage.url(version['rutas'][formato])
+    return imagen.archivo.url if imagen.archivo else None
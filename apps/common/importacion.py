@@ -0,0 +1,246 @@
+import codecs
+import csv
+import json
+import uuid
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from apps.common import cache_respuestas
+from apps.common.busqueda import actualizar_busqueda
+from apps.common.facetas import programar_sincronizacion
+from apps.common.models import Categoria, Producto, Talla, Variante
+from apps.common.notificaciones import notificar_seguidores
+
+TAMANO_LOTE = getattr(settings, 'IMPORTACION_TAMANO_LOTE', 500)
+# Errores que se devuelven con detalle; del resto solo se informa el total
+MAXIMO_ERRORES = 100
+FORMATOS = ('csv', 'jsonl')
+PRECIO_MAXIMO = Decimal('99999999.99')
+
+# CSV: una fila por variante; las filas seguidas con el mismo nombre son un
+# solo producto. Las categorías van separadas por '|' (id o nombre).
+COLUMNAS_PRODUCTO = ('nombre', 'descripcion', 'precio_base', 'categorias')
+COLUMNAS_VARIANTE = ('talla', 'color', 'precio', 'stock')
+
+
+class ErrorFila(Exception):
+    pass
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.productos = 0
+        self.variantes = 0
+        self.errores = []
+        self.total_errores = 0
+
+    def error(self, linea, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAXIMO_ERRORES:
+            self.errores.append((linea, mensaje))
+
+
+def detectar_formato(nombre):
+    extension = (nombre or '').rsplit('.', 1)[-1].lower()
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    return 'csv' if extension == 'csv' else None
+
+
+def _texto(archivo):
+    # Decodifica por líneas sobre el archivo subido (en memoria o temporal en disco)
+    archivo.seek(0)
+    return codecs.getreader('utf-8-sig')(archivo)
+
+
+def _filas_csv(archivo):
+    """(línea, producto) agrupando en variantes las filas seguidas del mismo producto."""
+    lector = csv.DictReader(_texto(archivo))
+    actual = None
+    for fila in lector:
+        fila = {(clave or '').strip().lower(): (valor or '').strip() for clave, valor in fila.items() if clave}
+        variante = {clave: fila.get(clave, '') for clave in COLUMNAS_VARIANTE}
+        variantes = [variante] if any(variante.values()) else []
+        if actual is not None and fila.get('nombre') == actual[1]['nombre']:
+            actual[1]['variantes'] += variantes
+            continue
+        if actual is not None:
+            yield actual
+        producto = {clave: fila.get(clave, '') for clave in COLUMNAS_PRODUCTO}
+        producto['categorias'] = [categoria for categoria in producto['categorias'].split('|') if categoria.strip()]
+        producto['variantes'] = variantes
+        actual = (lector.line_num, producto)
+    if actual is not None:
+        yield actual
+
+
+def _filas_jsonl(archivo):
+    """(línea, producto) con un objeto JSON por línea; las variantes van en 'variantes'."""
+    for linea, texto in enumerate(_texto(archivo), start=1):
+        if not texto.strip():
+            continue
+        try:
+            producto = json.loads(texto)
+        except ValueError:
+            producto = ErrorFila("JSON inválido.")
+        if not isinstance(producto, (dict, ErrorFila)):
+            producto = ErrorFila("Cada línea debe ser un objeto JSON.")
+        yield linea, producto
+
+
+def _catalogos():
+    """Categorías y tallas por id y por nombre (en minúsculas), cargadas una sola vez."""
+    catalogos = []
+    for modelo in (Categoria, Talla):
+        por_nombre = {nombre.strip().lower(): id for id, nombre in modelo.objects.values_list('id', 'nombre')}
+        por_nombre.update({str(id): id for id in list(por_nombre.values())})
+        catalogos.append(por_nombre)
+    return catalogos
+
+
+def _buscar(catalogo, valor, tipo):
+    try:
+        return catalogo[str(valor).strip().lower()]
+    except KeyError:
+        raise ErrorFila(f"{tipo} '{valor}' no encontrada.")
+
+
+def _precio(valor, campo):
+    try:
+        precio = Decimal(str(valor).strip())
+    except InvalidOperation:
+        raise ErrorFila(f"{campo} no es un número válido.")
+    if not precio.is_finite() or precio < 0 or precio > PRECIO_MAXIMO:
+        raise ErrorFila(f"{campo} fuera de rango.")
+    return precio.quantize(Decimal('0.01'))
+
+
+def _stock(valor):
+    try:
+        stock = int(str(valor).strip())
+    except ValueError:
+        raise ErrorFila("stock debe ser un entero.")
+    if stock < 0:
+        raise ErrorFila("stock no puede ser negativo.")
+    return stock
+
+
+def _validar(tienda, producto, categorias, tallas):
+    """(Producto sin guardar, ids de categorías, datos de sus variantes) o ErrorFila."""
+    nombre = str(producto.get('nombre') or '').strip()
+    if not nombre:
+        raise ErrorFila("Falta el nombre del producto.")
+    if len(nombre) > 255:
+        raise ErrorFila("El nombre supera los 255 caracteres.")
+    nombres_categorias = producto.get('categorias') or []
+    if not isinstance(nombres_categorias, list) or not nombres_categorias:
+        raise ErrorFila("Debe indicar al menos una categoría.")
+    categorias_ids = {_buscar(categorias, categoria, 'Categoría') for categoria in nombres_categorias}
+    precio_base = _precio(producto.get('precio_base', ''), 'precio_base')
+
+    variantes = []
+    combinaciones = set()
+    for variante in producto.get('variantes') or []:
+        if not isinstance(variante, dict):
+            raise ErrorFila("Cada variante debe ser un objeto.")
+        talla = variante.get('talla')
+        talla_id = _buscar(tallas, talla, 'Talla') if talla not in (None, '') else None
+        color = str(variante.get('color') or '').strip() or None
+        if color and len(color) > 50:
+            raise ErrorFila("El color supera los 50 caracteres.")
+        if (talla_id, color) in combinaciones:
+            raise ErrorFila("Variante repetida con la misma talla y color.")
+        combinaciones.add((talla_id, color))
+        variantes.append({
+            'talla_id': talla_id,
+            'color': color,
+            'precio': _precio(variante.get('precio', ''), 'precio'),
+            'stock': _stock(variante.get('stock', '')),
+        })
+
+    # bulk_create no dispara signals: los agregados de las variantes se calculan acá
+    precios = [variante['precio'] for variante in variantes]
+    stock_total = sum(variante['stock'] for variante in variantes)
+    nuevo = Producto(
+        tienda=tienda,
+        nombre=nombre,
+        descripcion=str(producto.get('descripcion') or '').strip() or None,
+        precioBase=precio_base,
+        estado='agotado' if variantes and not stock_total else 'activo',
+        stockTotal=stock_total,
+        precioMinimo=min(precios, default=None),
+        precioMaximo=max(precios, default=None),
+    )
+    return nuevo, categorias_ids, variantes
+
+
+def _guardar_lote(lote, resultado):
+    """Inserta productos, variantes y categorías del lote con un bulk_create por tabla en una transacción."""
+    ProductoCategoria = Producto.categoria.through
+    try:
+        with transaction.atomic():
+            productos = Producto.objects.bulk_create([producto for _, producto, _, _ in lote])
+            variantes = Variante.objects.bulk_create([
+                Variante(producto=producto, **datos)
+                for (_, _, _, datos_variantes), producto in zip(lote, productos)
+                for datos in datos_variantes
+            ])
+            ProductoCategoria.objects.bulk_create([
+                ProductoCategoria(producto_id=producto.pk, categoria_id=categoria_id)
+                for (_, _, categorias_ids, _), producto in zip(lote, productos)
+                for categoria_id in categorias_ids
+            ])
+            # bulk_create no dispara signals: índice de búsqueda y facetas a mano
+            ids = [producto.pk for producto in productos]
+            actualizar_busqueda(Producto.objects.filter(pk__in=ids))
+            programar_sincronizacion(ids)
+            cache_respuestas.invalidar(Producto, Variante)
+    except DatabaseError:
+        for linea, _, _, _ in lote:
+            resultado.error(linea, "No se pudo guardar el producto.")
+        return
+    resultado.productos += len(productos)
+    resultado.variantes += len(variantes)
+
+
+def importar_catalogo(tienda, archivo, formato, tamano_lote=TAMANO_LOTE):
+    """
+    Importa productos con sus variantes y categorías desde un CSV o JSONL
+    leído en streaming. Valida cada producto contra las categorías y tallas
+    precargadas y escribe en transacciones de `tamano_lote` productos; las
+    filas con error se saltan y se informan con su número de línea.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+    categorias, tallas = _catalogos()
+    filas = _filas_csv(archivo) if formato == 'csv' else _filas_jsonl(archivo)
+    resultado = ResultadoImportacion()
+    lote = []
+    linea = 0
+    try:
+        for linea, producto in filas:
+            try:
+                if isinstance(producto, ErrorFila):
+                    raise producto
+                lote.append((linea,) + _validar(tienda, producto, categorias, tallas))
+            except ErrorFila as error:
+                resultado.error(linea, str(error))
+                continue
+            if len(lote) >= tamano_lote:
+                _guardar_lote(lote, resultado)
+                lote = []
+    except UnicodeDecodeError:
+        resultado.error(linea + 1, "El archivo no está en UTF-8; se detuvo la importación.")
+    except csv.Error as error:
+        resultado.error(linea + 1, f"CSV inválido ({error}); se detuvo la importación.")
+    if lote:
+        _guardar_lote(lote, resultado)
+
+    if resultado.productos:
+        # Un solo aviso a los seguidores por importación, no uno por producto
+        notificar_seguidores(
+            tienda, 'nuevo_producto',
+            f"¡{tienda.nombre} publicó {resultado.productos} productos nuevos!",
+            clave=f"importacion:{tienda.pk}:{uuid.uuid4().hex}",
+        )
+    return resultado
@@ -0,0 +1,211 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Max, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from apps.common import cache_respuestas
+from apps.common.facetas import programar_sincronizacion
+from apps.common.models import Producto, ReservaItem, ReservaStock, Variante
+
+MINUTOS_RESERVA = getattr(settings, 'INVENTARIO_RESERVA_MINUTOS', 15)
+MAXIMO_ITEMS = 100
+TAMANO_LOTE = 500
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, variantes_ids):
+        super().__init__(f"Stock insuficiente para las variantes {sorted(variantes_ids)}")
+        self.variantes_ids = sorted(variantes_ids)
+
+
+def _por_variante(cantidades):
+    return Case(*[When(pk=variante_id, then=Value(cantidad)) for variante_id, cantidad in cantidades.items()],
+                output_field=IntegerField())
+
+
+def _cambian_de_estado(productos):
+    return productos.filter(
+        Q(estado='activo', stockTotal=0, precioMinimo__isnull=False) | Q(estado='agotado', stockTotal__gt=0)
+    )
+
+
+def actualizar_estado(productos):
+    """
+    Pasa a 'agotado' los productos del queryset que tienen variantes pero
+    ninguna con stock, y devuelve a 'activo' los agotados que recuperaron
+    stock; los inactivos no se tocan. Devuelve los ids que cambiaron.
+    """
+    ids = list(_cambian_de_estado(productos).values_list('pk', flat=True))
+    if ids:
+        _cambian_de_estado(productos.model._default_manager.filter(pk__in=ids)).update(
+            estado=Case(When(stockTotal=0, then=Value('agotado')), default=Value('activo'))
+        )
+        # Las facetas solo cuentan productos activos
+        programar_sincronizacion(ids)
+        # Entran o salen de los listados: no alcanza con invalidar las existencias
+        cache_respuestas.invalidar(Producto)
+    return ids
+
+
+def _rango_precio(variantes):
+    de_producto = variantes.objects.filter(producto=OuterRef('pk')).values('producto')
+    return {
+        'precioMinimo': Subquery(de_producto.annotate(precio=Min('precio')).values('precio')),
+        'precioMaximo': Subquery(de_producto.annotate(precio=Max('precio')).values('precio')),
+    }
+
+
+def recalcular_existencias(productos, variantes=Variante):
+    """
+    Recalcula desde las variantes el stock total y el rango de precio del
+    queryset `productos` y ajusta su estado. Para altas masivas y para
+    reparar los agregados; el resto de los cambios se aplica por deltas.
+    """
+    de_producto = variantes.objects.filter(producto=OuterRef('pk')).values('producto')
+    productos.update(
+        stockTotal=Coalesce(Subquery(de_producto.annotate(total=Sum('stock')).values('total')), Value(0)),
+        **_rango_precio(variantes),
+    )
+    cache_respuestas.invalidar_existencias(Producto)
+    return actualizar_estado(productos)
+
+
+def recontar_existencias(productos_ids):
+    """
+    Recalcula los productos de una variante recién guardada. Bloquea antes sus
+    filas (en el mismo orden que las reservas: variante y después producto),
+    así el recuento ve las reservas ya confirmadas y las que lleguen después
+    aplican su movimiento sobre este total. Un delta contra el stock leído
+    antes de guardar quedaría corrido si una reserva entra en el medio.
+    """
+    ids = sorted(productos_ids)
+    list(Producto.objects.select_for_update().filter(pk__in=ids).values_list('pk', flat=True))
+    return recalcular_existencias(Producto.objects.filter(pk__in=ids))
+
+
+def _ajustar_productos(cantidades, signo):
+    """Lleva a stockTotal el movimiento de stock de las variantes en `cantidades`, en un solo UPDATE."""
+    variantes = Variante.objects.filter(pk__in=cantidades)
+    movimiento = Subquery(
+        variantes.filter(producto=OuterRef('pk')).values('producto')
+        .annotate(total=Sum(_por_variante(cantidades))).values('total')
+    )
+    productos = Producto.objects.filter(pk__in=variantes.values('producto_id'))
+    productos.update(stockTotal=Greatest(F('stockTotal') + signo * movimiento, Value(0)))
+    actualizar_estado(productos)
+    # Los UPDATE no disparan signals
+    cache_respuestas.invalidar_existencias(Producto, Variante)
+
+
+def descontar_stock(cantidades):
+    """
+    Descuenta {variante_id: cantidad} en un solo UPDATE condicionado a que
+    cada variante tenga stock suficiente (stock >= cantidad). Devuelve False
+    si alguna no alcanzó: el llamador debe revertir la transacción, porque
+    las que sí alcanzaban quedaron descontadas.
+    """
+    por_variante = _por_variante(cantidades)
+    # Sin JOIN: con uno, Django mueve todo el WHERE a un `id IN (SELECT ...)` y
+    # Postgres, al reevaluar la fila que otro carrito acaba de descontar, no
+    # vuelve a mirar el stock de la subconsulta
+    actualizadas = Variante.objects.filter(
+        pk__in=cantidades, stock__gte=por_variante,
+        producto_id__in=Producto.objects.filter(estado='activo').values('pk'),
+    ).update(stock=F('stock') - por_variante)
+    if actualizadas != len(cantidades):
+        return False
+    _ajustar_productos(cantidades, -1)
+    return True
+
+
+def devolver_stock(cantidades):
+    if cantidades:
+        Variante.objects.filter(pk__in=cantidades).update(stock=F('stock') + _por_variante(cantidades))
+        _ajustar_productos(cantidades, 1)
+
+
+def _faltantes(cantidades):
+    disponibles = dict(
+        Variante.objects.filter(pk__in=cantidades, producto__estado='activo').values_list('pk', 'stock')
+    )
+    return [variante_id for variante_id, cantidad in cantidades.items() if disponibles.get(variante_id, 0) < cantidad]
+
+
+def reservar(usuario, items):
+    """
+    Reserva todas las variantes de `items` [(variante_id, cantidad)] o
+    ninguna. No hay SELECT ... FOR UPDATE previo: la condición de stock va en
+    el mismo UPDATE, así que de dos carritos que compiten por la última
+    unidad uno la descuenta y el otro, al reevaluar la fila, no la consigue.
+    """
+    cantidades = {}
+    for variante_id, cantidad in items:
+        if cantidad <= 0:
+            raise ValueError("La cantidad debe ser mayor a cero.")
+        cantidades[int(variante_id)] = cantidades.get(int(variante_id), 0) + cantidad
+    if not cantidades:
+        raise ValueError("La reserva no tiene variantes.")
+    if len(cantidades) > MAXIMO_ITEMS:
+        raise ValueError(f"Una reserva admite hasta {MAXIMO_ITEMS} variantes.")
+
+    try:
+        with transaction.atomic():
+            if not descontar_stock(cantidades):
+                raise StockInsuficiente([])
+            reserva = ReservaStock.objects.create(
+                usuario=usuario, expira=timezone.now() + timedelta(minutes=MINUTOS_RESERVA)
+            )
+            ReservaItem.objects.bulk_create([
+                ReservaItem(reserva=reserva, variante_id=variante_id, cantidad=cantidad)
+                for variante_id, cantidad in cantidades.items()
+            ])
+    except StockInsuficiente:
+        raise StockInsuficiente(_faltantes(cantidades))
+    return reserva
+
+
+def _cerrar(reservas_ids, estado):
+    """Pasa las reservas (ya bloqueadas y activas) a `estado` y devuelve su stock en un UPDATE."""
+    ReservaStock.objects.filter(pk__in=reservas_ids).update(estado=estado, fecha_actualizacion=timezone.now())
+    cantidades = dict(
+        ReservaItem.objects.filter(reserva_id__in=reservas_ids)
+        .values('variante_id').annotate(total=Sum('cantidad')).values_list('variante_id', 'total')
+    )
+    devolver_stock(cantidades)
+
+
+def confirmar(usuario, reserva_id):
+    """Confirma una reserva activa y vigente: el stock ya descontado queda vendido."""
+    return bool(ReservaStock.objects.filter(
+        pk=reserva_id, usuario=usuario, estado='activa', expira__gt=timezone.now()
+    ).update(estado='confirmada', fecha_actualizacion=timezone.now()))
+
+
+def liberar(usuario, reserva_id):
+    """Libera una reserva activa del usuario y devuelve su stock. False si ya no estaba activa."""
+    with transaction.atomic():
+        ids = list(ReservaStock.objects.select_for_update().filter(
+            pk=reserva_id, usuario=usuario, estado='activa'
+        ).values_list('pk', flat=True))
+        if ids:
+            _cerrar(ids, 'liberada')
+    return bool(ids)
+
+
+def liberar_vencidas(lote=TAMANO_LOTE):
+    """
+    Expira en lotes las reservas activas vencidas y devuelve su stock. Salta
+    las filas bloqueadas (una confirmación en curso) y las toma en otra pasada.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(ReservaStock.objects.select_for_update(skip_locked=True).filter(
+                estado='activa', expira__lte=timezone.now()
+            ).order_by('expira').values_list('pk', flat=True)[:lote])
+            if ids:
+                _cerrar(ids, 'expirada')
+        if not ids:
+            return total
+        total += len(ids)
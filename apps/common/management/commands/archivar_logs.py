@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.common.particiones import archivar_anteriores, crear_particiones, inicio_mes
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea las particiones mensuales de UserLog de los próximos meses y archiva "
+        "en JSONL comprimido (y borra) los meses más viejos que la retención"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=settings.LOGS_RETENCION_MESES,
+                            help="Meses que se conservan en la base (incluido el actual)")
+        parser.add_argument('--destino', default=settings.LOGS_ARCHIVO_DIR,
+                            help="Carpeta donde se escriben los archivos userlog-AAAA-MM.jsonl.gz")
+        parser.add_argument('--adelante', type=int, default=3,
+                            help="Meses futuros con partición creada de antemano")
+        parser.add_argument('--simular', action='store_true',
+                            help="Solo mostrar qué se archivaría")
+
+    def handle(self, *args, **options):
+        if not options['simular']:
+            for nombre in crear_particiones(options['adelante']):
+                self.stdout.write(f"Partición creada: {nombre}")
+
+        corte = inicio_mes(timezone.localdate(), -(options['meses'] - 1))
+        archivados = archivar_anteriores(corte, options['destino'], simular=options['simular'])
+        for mes, cantidad, ruta in archivados:
+            accion = "Se archivaría" if options['simular'] else "Archivado"
+            self.stdout.write(f"{accion} {mes:%Y-%m}: {cantidad} logs -> {ruta}")
+        if not archivados:
+            self.stdout.write(f"No hay logs anteriores a {corte:%Y-%m}.")
+        self.stdout.write(self.style.SUCCESS("Retención de logs completada."))
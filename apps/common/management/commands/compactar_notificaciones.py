@@ -0,0 +1,29 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from apps.common.notificaciones import TAMANO_LOTE, compactar_leidas, purgar_anteriores
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrupa las notificaciones leídas viejas en un resumen diario por tienda y "
+        "borra en lotes las notificaciones y eventos más viejos que la retención"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias-resumen', type=int, default=settings.NOTIFICACIONES_DIAS_RESUMEN,
+                            help="Antigüedad a partir de la cual las leídas se agrupan en resúmenes")
+        parser.add_argument('--dias-retencion', type=int, default=settings.NOTIFICACIONES_RETENCION_DIAS,
+                            help="Antigüedad a partir de la cual se borran las notificaciones")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help="Filas por DELETE")
+
+    def handle(self, *args, **options):
+        ahora = timezone.now()
+        creados, compactadas = compactar_leidas(ahora - timedelta(days=options['dias_resumen']), options['lote'])
+        self.stdout.write(f"Resúmenes creados: {creados} (reemplazan {compactadas} notificaciones)")
+
+        borradas, eventos = purgar_anteriores(ahora - timedelta(days=options['dias_retencion']), options['lote'])
+        self.stdout.write(f"Borradas: {borradas} notificaciones y {eventos} eventos de tienda")
+        self.stdout.write(self.style.SUCCESS("Retención de notificaciones completada."))
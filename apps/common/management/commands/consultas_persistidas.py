@@ -0,0 +1,26 @@
+import json
+from django.core.management.base import BaseCommand
+from apps.common.consultas_persistidas import ARCHIVOS, Registro
+
+
+def _schema(nombre):
+    if nombre == 'user':
+        from apps.user_api.schema_user import user_schema as schema
+    elif nombre == 'admin':
+        from apps.admin_api.schema import schema
+    else:
+        from apps.superadmin_api.schema_superadmin import superadmin_schema as schema
+    return schema.graphql_schema
+
+
+class Command(BaseCommand):
+    help = "Valida las consultas registradas de una API y escribe el manifiesto hash -> consulta para los clientes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('api', choices=('user', 'admin', 'superadmin'))
+
+    def handle(self, *args, **options):
+        registro = Registro(_schema(options['api']), ARCHIVOS.get(options['api'], [])).cargar()
+        manifiesto = {hash: compilada.texto for hash, compilada in registro.consultas.items()}
+        self.stdout.write(json.dumps(manifiesto, ensure_ascii=False, indent=2))
+        self.stderr.write(f"{len(manifiesto)} consultas registradas.")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from apps.common.imagenes import generar_versiones
+from apps.common.models.imagen import Imagen
+
+
+class Command(BaseCommand):
+    help = "Genera las versiones redimensionadas de las imágenes que no las tienen (o de todas con --todas)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help="Regenerar también las que ya tienen versiones")
+
+    def handle(self, *args, **options):
+        imagenes = Imagen.objects.all() if options['todas'] else Imagen.objects.exclude(estado_versiones='listo')
+        listas = fallidas = 0
+        for imagen_id in imagenes.order_by('id').values_list('id', flat=True).iterator():
+            if generar_versiones(imagen_id) is None:
+                fallidas += 1
+            else:
+                listas += 1
+        self.stdout.write(self.style.SUCCESS(f"Versiones generadas: {listas} imágenes ({fallidas} con error)."))
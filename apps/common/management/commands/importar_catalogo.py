@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.common.importacion import FORMATOS, TAMANO_LOTE, detectar_formato, importar_catalogo
+from apps.common.models import Tienda
+
+
+class Command(BaseCommand):
+    help = "Importa productos, variantes y categorías de una tienda desde un archivo CSV o JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo .csv o .jsonl")
+        parser.add_argument('--tienda', type=int, required=True, help="Id de la tienda destino")
+        parser.add_argument('--formato', choices=FORMATOS, help="Por defecto, según la extensión")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Productos por transacción")
+
+    def handle(self, *args, **options):
+        try:
+            tienda = Tienda.objects.get(pk=options['tienda'])
+        except Tienda.DoesNotExist:
+            raise CommandError("Tienda no encontrada.")
+        formato = options['formato'] or detectar_formato(options['archivo'])
+        if formato is None:
+            raise CommandError("No se reconoce el formato: use --formato csv|jsonl.")
+
+        with open(options['archivo'], 'rb') as archivo:
+            resultado = importar_catalogo(tienda, archivo, formato, options['lote'])
+        for linea, mensaje in resultado.errores:
+            self.stderr.write(f"Línea {linea}: {mensaje}")
+        if resultado.total_errores > len(resultado.errores):
+            self.stderr.write(f"... y {resultado.total_errores - len(resultado.errores)} errores más")
+        self.stdout.write(self.style.SUCCESS(
+            f"Importados {resultado.productos} productos y {resultado.variantes} variantes "
+            f"({resultado.total_errores} con error)."
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.common.inventario import TAMANO_LOTE, liberar_vencidas
+
+
+class Command(BaseCommand):
+    help = "Expira las reservas de stock vencidas sin confirmar y devuelve su stock a las variantes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help="Reservas por transacción")
+
+    def handle(self, *args, **options):
+        expiradas = liberar_vencidas(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Reservas expiradas: {expiradas}."))
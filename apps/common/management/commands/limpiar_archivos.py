@@ -0,0 +1,23 @@
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from apps.common.almacenamiento import AlmacenamientoDeduplicado, recontar_referencias
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las referencias de los archivos deduplicados a partir de las imágenes "
+        "y fotos de perfil, y borra los contenidos que ya nadie usa"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=24,
+                            help="No tocar archivos más nuevos que esto (subidas en curso)")
+
+    def handle(self, *args, **options):
+        almacenamiento = storages['default']
+        if not isinstance(almacenamiento, AlmacenamientoDeduplicado):
+            raise CommandError("El almacenamiento de media no es AlmacenamientoDeduplicado.")
+        corregidos, borrados = recontar_referencias(almacenamiento, options['horas'] * 3600)
+        self.stdout.write(self.style.SUCCESS(
+            f"Referencias corregidas: {corregidos}. Archivos huérfanos borrados: {borrados}."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from apps.common.notificaciones import reanudar_envios
+
+
+class Command(BaseCommand):
+    help = (
+        "Procesa los envíos de notificaciones pendientes o fallidos, retomando "
+        "cada uno desde el último seguidor notificado"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reanudar', action='store_true',
+                            help="Retomar también los envíos 'en_proceso' (p.ej. tras un reinicio del servidor)")
+
+    def handle(self, *args, **options):
+        envios = [envio for envio in reanudar_envios(incluir_en_proceso=options['reanudar']) if envio is not None]
+        for envio in envios:
+            self.stdout.write(f"{envio.clave}: {envio.estado} ({envio.enviados}/{envio.total})")
+        if not envios:
+            self.stdout.write("No hay envíos pendientes.")
+        self.stdout.write(self.style.SUCCESS("Envíos de notificaciones procesados."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from apps.common.inventario import recalcular_existencias
+from apps.common.models import Producto
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde las variantes el stock total, el rango de precio y el estado agotado de los productos"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tienda', type=int, help="Solo los productos de esta tienda")
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.all()
+        if options['tienda']:
+            productos = productos.filter(tienda_id=options['tienda'])
+        cambiaron = recalcular_existencias(productos)
+        self.stdout.write(self.style.SUCCESS(f"Existencias recalculadas; {len(cambiaron)} productos cambiaron de estado."))
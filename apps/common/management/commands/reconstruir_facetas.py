@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from apps.common.facetas import reconstruir_facetas
+from apps.common.models.faceta import FacetaProducto, ConteoFaceta
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero las facetas del catálogo (carga inicial o reparación de conteos)"
+
+    def handle(self, *args, **options):
+        reconstruir_facetas()
+        self.stdout.write(self.style.SUCCESS(
+            f"Facetas reconstruidas: {FacetaProducto.objects.count()} filas, "
+            f"{ConteoFaceta.objects.count()} valores."
+        ))
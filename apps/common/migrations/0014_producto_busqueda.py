@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 18:49
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def poblar_busqueda(apps, schema_editor):
+    from apps.common.busqueda import vector_producto
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Producto = apps.get_model('common', 'Producto')
+    Producto.objects.update(busqueda=vector_producto(Producto))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0013_remove_categoria_color'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='producto',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busqueda'], name='producto_busqueda_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nombre'], name='producto_nombre_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+    ]
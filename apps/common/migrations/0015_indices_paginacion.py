@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0014_producto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorito',
+            index=models.Index(fields=['usuario', '-fecha', '-id'], name='favorito_usuario_fecha_id'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['-fechaCreacion', '-id'], name='producto_fecha_id'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['tienda', '-fechaCreacion', '-id'], name='producto_tienda_fecha_id'),
+        ),
+        migrations.AddIndex(
+            model_name='seguimiento',
+            index=models.Index(fields=['usuario', '-fecha_creacion', '-id'], name='seguimiento_usuario_fecha_id'),
+        ),
+        migrations.AddIndex(
+            model_name='userlog',
+            index=models.Index(fields=['-fechaHora', '-id'], name='userlog_fecha_id'),
+        ),
+    ]
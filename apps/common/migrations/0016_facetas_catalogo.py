@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0015_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoFaceta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('categoria', 'Categoría'), ('talla', 'Talla'), ('color', 'Color'), ('precio', 'Precio'), ('tienda', 'Tienda')], max_length=20)),
+                ('valor', models.CharField(max_length=100)),
+                ('cantidad', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('tipo', 'valor')},
+            },
+        ),
+        migrations.CreateModel(
+            name='FacetaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField()),
+                ('tipo', models.CharField(choices=[('categoria', 'Categoría'), ('talla', 'Talla'), ('color', 'Color'), ('precio', 'Precio'), ('tienda', 'Tienda')], max_length=20)),
+                ('valor', models.CharField(max_length=100)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tipo', 'valor', 'producto_id'], name='faceta_tipo_valor_producto')],
+                'unique_together': {('producto_id', 'tipo', 'valor')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 18:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def poblar_arbol(apps, schema_editor):
+    from apps.common.categorias import reconstruir_arbol
+
+    reconstruir_arbol(apps.get_model('common', 'Categoria'), apps.get_model('common', 'CategoriaAncestro'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0016_facetas_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoriaAncestro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profundidad', models.PositiveIntegerField()),
+                ('ancestro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendientes_arbol', to='common.categoria')),
+                ('descendiente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestros_arbol', to='common.categoria')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendiente', 'ancestro'], name='categoria_arbol_desc')],
+                'unique_together': {('ancestro', 'descendiente')},
+            },
+        ),
+        migrations.RunPython(poblar_arbol, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 19:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0017_arbol_categorias'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userlog',
+            name='fechaHora',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
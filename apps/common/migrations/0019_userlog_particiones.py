@@ -0,0 +1,87 @@
+# Generated by Django 5.2 on 2026-10-18 19:01
+
+import apps.common.models.log
+from django.db import migrations, models
+
+
+def particionar_userlog(apps, schema_editor):
+    """
+    Convierte common_userlog en una tabla particionada por mes sobre fechaHora
+    (Postgres 11+). La PK pasa a ser (id, fechaHora), como exige Postgres, y el
+    id sale de una secuencia propia. Con otros motores no hace nada.
+    """
+    from django.utils import timezone
+    from apps.common.particiones import inicio_mes, nombre_particion, _limite
+
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    UserLog = apps.get_model('common', 'UserLog')
+    usuario = UserLog._meta.get_field('usuario')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE common_userlog RENAME TO common_userlog_antigua')
+        cursor.execute(
+            'CREATE TABLE common_userlog (LIKE common_userlog_antigua INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE ("fechaHora")'
+        )
+        cursor.execute('CREATE SEQUENCE common_userlog_id_part_seq OWNED BY common_userlog.id')
+        cursor.execute("ALTER TABLE common_userlog ALTER COLUMN id SET DEFAULT nextval('common_userlog_id_part_seq')")
+        cursor.execute('ALTER TABLE common_userlog ADD PRIMARY KEY (id, "fechaHora")')
+        cursor.execute('CREATE TABLE common_userlog_default PARTITION OF common_userlog DEFAULT')
+
+        cursor.execute('SELECT min("fechaHora") FROM common_userlog_antigua')
+        minimo = cursor.fetchone()[0]
+        mes = inicio_mes(timezone.localtime(minimo).date() if minimo else timezone.localdate())
+        ultimo = inicio_mes(timezone.localdate(), 3)
+        while mes <= ultimo:
+            cursor.execute(
+                f'CREATE TABLE {nombre_particion(mes)} PARTITION OF common_userlog FOR VALUES FROM (%s) TO (%s)',
+                [_limite(mes), _limite(inicio_mes(mes, 1))],
+            )
+            mes = inicio_mes(mes, 1)
+
+        cursor.execute('INSERT INTO common_userlog SELECT * FROM common_userlog_antigua')
+        cursor.execute(
+            "SELECT setval('common_userlog_id_part_seq', COALESCE((SELECT max(id) FROM common_userlog), 0) + 1, false)"
+        )
+        cursor.execute('DROP TABLE common_userlog_antigua')
+        # Los índices y la FK de la tabla anterior se fueron con ella. Se recrean
+        # con los nombres que genera Django: un AlterField posterior los encuentra
+        cursor.execute('CREATE INDEX userlog_fecha_id ON common_userlog ("fechaHora" DESC, id DESC)')
+        cursor.execute(str(schema_editor._create_index_sql(UserLog, fields=[usuario])))
+        cursor.execute(str(schema_editor._create_fk_sql(UserLog, usuario, '_fk_%(to_table)s_%(to_column)s')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0018_userlog_fecha_default'),
+    ]
+
+    operations = [
+        # La tabla se rehace con SQL; el estado registra la PK compuesta que queda
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(particionar_userlog),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='userlog',
+                    name='pk',
+                    field=models.CompositePrimaryKey('id', 'fechaHora', blank=True, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='userlog',
+                    name='id',
+                    field=models.BigIntegerField(db_default=apps.common.models.log.SiguienteId(), editable=False),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userlog',
+            index=models.Index(fields=['tipoAccion', '-fechaHora'], name='userlog_tipo_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='userlog',
+            index=models.Index(fields=['usuario', '-fechaHora'], name='userlog_usuario_fecha'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 19:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0020_envios_notificacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BandejaNotificaciones',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='bandeja_notificaciones', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('leidas_hasta', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='envionotificacion',
+            name='modo',
+            field=models.CharField(choices=[('push', 'Push'), ('pull', 'Pull')], default='push', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='envionotificacion',
+            name='tipo',
+            field=models.CharField(choices=[('nuevo_producto', 'Nuevo producto'), ('baja_precio', 'Baja de precio'), ('general', 'General')], default='general', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='notificacion',
+            name='tipo',
+            field=models.CharField(choices=[('nuevo_producto', 'Nuevo producto'), ('baja_precio', 'Baja de precio'), ('general', 'General')], default='general', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='envionotificacion',
+            index=models.Index(fields=['tienda', 'modo', 'fecha_creacion'], name='common_envi_tienda__b1ef8f_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 19:08
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def poblar_contadores(apps, schema_editor):
+    Notificacion = apps.get_model('common', 'Notificacion')
+    BandejaNotificaciones = apps.get_model('common', 'BandejaNotificaciones')
+    conteos = Notificacion.objects.filter(leida=False).values('usuario_id').annotate(total=Count('id'))
+    BandejaNotificaciones.objects.bulk_create(
+        [BandejaNotificaciones(usuario_id=fila['usuario_id']) for fila in conteos],
+        ignore_conflicts=True,
+    )
+    for fila in conteos:
+        BandejaNotificaciones.objects.filter(usuario_id=fila['usuario_id']).update(no_leidas=fila['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0021_feed_notificaciones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bandejanotificaciones',
+            name='no_leidas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 19:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0022_contador_no_leidas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='envionotificacion',
+            name='tipo',
+            field=models.CharField(choices=[('nuevo_producto', 'Nuevo producto'), ('baja_precio', 'Baja de precio'), ('resumen', 'Resumen'), ('general', 'General')], default='general', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='notificacion',
+            name='fecha_creacion',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='notificacion',
+            name='tipo',
+            field=models.CharField(choices=[('nuevo_producto', 'Nuevo producto'), ('baja_precio', 'Baja de precio'), ('resumen', 'Resumen'), ('general', 'General')], default='general', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', '-fecha_creacion', '-id'], name='notificacion_usuario_fecha_id'),
+        ),
+    ]
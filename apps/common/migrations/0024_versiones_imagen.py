@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0023_retencion_notificaciones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagen',
+            name='estado_versiones',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('listo', 'Listo'), ('fallido', 'Fallido')], default='pendiente', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='imagen',
+            name='versiones',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-18 19:31
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def poblar_existencias(apps, schema_editor):
+    Producto = apps.get_model('common', 'Producto')
+    Variante = apps.get_model('common', 'Variante')
+    de_producto = Variante.objects.filter(producto=OuterRef('pk')).values('producto')
+    Producto.objects.update(
+        stockTotal=Coalesce(Subquery(de_producto.annotate(total=Sum('stock')).values('total')), Value(0)),
+        precioMinimo=Subquery(de_producto.annotate(precio=Min('precio')).values('precio')),
+        precioMaximo=Subquery(de_producto.annotate(precio=Max('precio')).values('precio')),
+    )
+    # Con variantes pero sin stock: agotado; los agotados con stock vuelven a activo
+    Producto.objects.filter(estado='activo', stockTotal=0, precioMinimo__isnull=False).update(estado='agotado')
+    Producto.objects.filter(estado='agotado', stockTotal__gt=0).update(estado='activo')
+
+
+def depurar_facetas(apps, schema_editor):
+    """
+    Las facetas solo cuentan productos activos: se quitan las de los que pasaron
+    a agotado y se recuentan los valores. Los que volvieron a activo toman sus
+    facetas con manage.py reconstruir_facetas.
+    """
+    Producto = apps.get_model('common', 'Producto')
+    FacetaProducto = apps.get_model('common', 'FacetaProducto')
+    ConteoFaceta = apps.get_model('common', 'ConteoFaceta')
+    activos = Producto.objects.filter(estado='activo').values('pk')
+    if not FacetaProducto.objects.exclude(producto_id__in=activos).delete()[0]:
+        return
+    conteos = FacetaProducto.objects.filter(tipo=OuterRef('tipo'), valor=OuterRef('valor')).values('tipo', 'valor')
+    ConteoFaceta.objects.update(cantidad=Coalesce(
+        Subquery(conteos.annotate(total=Count('id')).values('total')), Value(0)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0026_reservas_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='precioMaximo',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='precioMinimo',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='stockTotal',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('estado', 'activo'), ('stockTotal__gt', 0)), fields=['precioMinimo', 'id'], name='producto_disponible_precio'),
+        ),
+        migrations.RunPython(poblar_existencias, migrations.RunPython.noop),
+        migrations.RunPython(depurar_facetas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2 on 2026-10-18 19:49
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+
+# MEDIA_ROOT pasó de la raíz del proyecto a su carpeta media/: los archivos no
+# se mueven, solo se les quita el prefijo media/ a los nombres guardados.
+PREFIJO = 'media/'
+CAMPOS = [('CustomUser', 'foto_perfil'), ('Imagen', 'archivo'), ('Tienda', 'foto_perfil'),
+          ('ArchivoAlmacenado', 'ruta')]
+
+
+def _versiones(versiones, cambiar):
+    for version in (versiones or {}).values():
+        rutas = version.get('rutas', {})
+        for formato, ruta in rutas.items():
+            rutas[formato] = cambiar(ruta)
+    return versiones
+
+
+def _migrar(apps, filtro, cambiar, expresion):
+    for modelo, campo in CAMPOS:
+        Modelo = apps.get_model('common', modelo)
+        Modelo.objects.filter(**{f'{campo}__{filtro[0]}': filtro[1]}).update(**{campo: expresion(campo)})
+
+    Imagen = apps.get_model('common', 'Imagen')
+    lote = []
+    for imagen in Imagen.objects.exclude(versiones={}).only('id', 'versiones').iterator(chunk_size=1000):
+        imagen.versiones = _versiones(imagen.versiones, cambiar)
+        lote.append(imagen)
+        if len(lote) >= 1000:
+            Imagen.objects.bulk_update(lote, ['versiones'])
+            lote = []
+    Imagen.objects.bulk_update(lote, ['versiones'])
+
+
+def quitar_prefijo(apps, schema_editor):
+    _migrar(
+        apps, ('startswith', PREFIJO),
+        lambda ruta: ruta[len(PREFIJO):] if ruta.startswith(PREFIJO) else ruta,
+        lambda campo: Substr(campo, len(PREFIJO) + 1),
+    )
+
+
+def agregar_prefijo(apps, schema_editor):
+    _migrar(
+        apps, ('gt', ''),
+        lambda ruta: PREFIJO + ruta,
+        lambda campo: Concat(Value(PREFIJO), F(campo), output_field=models.CharField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0027_existencias_producto'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='foto_perfil',
+            field=models.ImageField(blank=True, null=True, upload_to='usuarios/perfil/'),
+        ),
+        migrations.AlterField(
+            model_name='imagen',
+            name='archivo',
+            field=models.ImageField(upload_to='imagenesProductos/'),
+        ),
+        migrations.AlterField(
+            model_name='tienda',
+            name='foto_perfil',
+            field=models.ImageField(blank=True, null=True, upload_to='tiendas/logos/'),
+        ),
+        migrations.RunPython(quitar_prefijo, agregar_prefijo),
+    ]
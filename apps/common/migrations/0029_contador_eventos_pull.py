@@ -0,0 +1,65 @@
+# Generated by Django 5.2 on 2026-10-18 19:58
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+TAMANO_LOTE = 1000
+
+
+def numerar_eventos(apps, schema_editor):
+    EnvioNotificacion = apps.get_model('common', 'EnvioNotificacion')
+    Tienda = apps.get_model('common', 'Tienda')
+    Seguimiento = apps.get_model('common', 'Seguimiento')
+    BandejaNotificaciones = apps.get_model('common', 'BandejaNotificaciones')
+
+    eventos = EnvioNotificacion.objects.filter(modo='pull').order_by('tienda_id', 'fecha_creacion', 'id').only('id', 'tienda_id')
+    lote = []
+    tienda_id, numero = None, 0
+    for envio in eventos.iterator(chunk_size=TAMANO_LOTE):
+        numero = numero + 1 if envio.tienda_id == tienda_id else 1
+        tienda_id = envio.tienda_id
+        envio.numero = numero
+        lote.append(envio)
+        if len(lote) == TAMANO_LOTE:
+            EnvioNotificacion.objects.bulk_update(lote, ['numero'])
+            lote = []
+    EnvioNotificacion.objects.bulk_update(lote, ['numero'])
+
+    ultimo = EnvioNotificacion.objects.filter(tienda=OuterRef('pk'), modo='pull').values('tienda').annotate(
+        numero=Max('numero')
+    ).values('numero')
+    Tienda.objects.filter(envios_notificacion__modo='pull').update(eventos_pull=Coalesce(Subquery(ultimo), Value(0)))
+
+    # Leídos: los anteriores a seguir la tienda y los anteriores a la marca de lectura del usuario
+    marca = BandejaNotificaciones.objects.filter(usuario_id=OuterRef(OuterRef('usuario_id'))).values('leidas_hasta')[:1]
+    leidos = EnvioNotificacion.objects.filter(tienda=OuterRef('tienda_id'), modo='pull').filter(
+        Q(fecha_creacion__lt=OuterRef('fecha_creacion')) | Q(fecha_creacion__lte=Subquery(marca))
+    ).order_by('-numero').values('numero')[:1]
+    Seguimiento.objects.filter(tienda__eventos_pull__gt=0).update(eventos_leidos=Coalesce(Subquery(leidos), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0028_rutas_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='envionotificacion',
+            name='numero',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='seguimiento',
+            name='eventos_leidos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tienda',
+            name='eventos_pull',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(numerar_eventos, migrations.RunPython.noop),
+    ]
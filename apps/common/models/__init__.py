@@ -1,13 +1,13 @@
 from .user import CustomUser
 from .tienda import Tienda
-from .categoria import Categoria
+from .categoria import Categoria, CategoriaAncestro
 from .talla import Talla
 from .producto import Producto
 from .variante import Variante
 from .imagen import Imagen
 from .log import UserLog
-from .notificacion import Notificacion
+from .notificacion import Notificacion, EnvioNotificacion, BandejaNotificaciones
 from .seguir import Seguimiento
-
-
-
+from .faceta import FacetaProducto, ConteoFaceta
+from .archivo import ArchivoAlmacenado
+from .reserva import ReservaStock, ReservaItem
@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class ArchivoAlmacenado(models.Model):
+    """
+    Contenido guardado una sola vez en el almacenamiento, identificado por su
+    SHA-256. `referencias` cuenta cuántos campos lo usan: al llegar a cero se
+    borra el archivo.
+    """
+    hash = models.CharField(max_length=64, primary_key=True)
+    ruta = models.CharField(max_length=255, unique=True)
+    tamano = models.BigIntegerField()
+    referencias = models.PositiveIntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.ruta} ({self.referencias} referencias)"
@@ -12,4 +12,22 @@ class Categoria(models.Model):
     )
     
     def __str__(self):
-        return self.nombre
\ No newline at end of file
+        return self.nombre
+
+class CategoriaAncestro(models.Model):
+    """
+    Tabla de clausura del árbol de categorías: una fila por cada par
+    (ancestro, descendiente), incluida la propia categoría con profundidad 0.
+    """
+    ancestro = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='descendientes_arbol')
+    descendiente = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name='ancestros_arbol')
+    profundidad = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('ancestro', 'descendiente')
+        indexes = [
+            models.Index(fields=['descendiente', 'ancestro'], name='categoria_arbol_desc'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestro_id} -> {self.descendiente_id} ({self.profundidad})"
@@ -0,0 +1,39 @@
+from django.db import models
+
+TIPOS_FACETA = (
+    ('categoria', 'Categoría'),
+    ('talla', 'Talla'),
+    ('color', 'Color'),
+    ('precio', 'Precio'),
+    ('tienda', 'Tienda'),
+)
+
+class FacetaProducto(models.Model):
+    """Valores de faceta de cada producto activo: una fila por (producto, tipo, valor)."""
+    # Sin FK a propósito: al borrar un producto sus filas se quitan al sincronizar,
+    # descontando antes los conteos (un CASCADE las borraría sin avisar).
+    producto_id = models.BigIntegerField()
+    tipo = models.CharField(max_length=20, choices=TIPOS_FACETA)
+    valor = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ('producto_id', 'tipo', 'valor')
+        indexes = [
+            models.Index(fields=['tipo', 'valor', 'producto_id'], name='faceta_tipo_valor_producto'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto_id} - {self.tipo}: {self.valor}"
+
+
+class ConteoFaceta(models.Model):
+    """Cantidad de productos activos por valor de faceta, mantenida de forma incremental."""
+    tipo = models.CharField(max_length=20, choices=TIPOS_FACETA)
+    valor = models.CharField(max_length=100)
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('tipo', 'valor')
+
+    def __str__(self):
+        return f"{self.tipo}: {self.valor} ({self.cantidad})"
@@ -16,6 +16,9 @@ class Favorito(models.Model):
         verbose_name = "Favorito"
         verbose_name_plural = "Favoritos"
         ordering = ['-fecha']   
+        indexes = [
+            models.Index(fields=['usuario', '-fecha', '-id'], name='favorito_usuario_fecha_id'),
+        ]
         
     def __str__(self):
         return f"{self.usuario} - {self.producto}"
@@ -4,7 +4,14 @@ from apps.common.models.variante import Variante
 
 class Imagen(models.Model):
     nombre = models.CharField(max_length=255, blank=True, null=True)
-    archivo = models.ImageField(upload_to='media/imagenesProductos/')
+    archivo = models.ImageField(upload_to='imagenesProductos/')
+    # Versiones redimensionadas: {tamano: {'ancho', 'alto', 'rutas': {formato: ruta}}}
+    versiones = models.JSONField(default=dict, blank=True)
+    estado_versiones = models.CharField(
+        max_length=20,
+        choices=(('pendiente', 'Pendiente'), ('listo', 'Listo'), ('fallido', 'Fallido')),
+        default='pendiente',
+    )
     esPrincipal = models.BooleanField(default=False)
     orden = models.PositiveIntegerField(default=0)
     
@@ -1,8 +1,28 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 customUser = get_user_model()
 
+SECUENCIA_ID = 'common_userlog_id_part_seq'
+
+
+class SiguienteId(models.Expression):
+    """
+    Default del id de UserLog: la secuencia propia de la tabla particionada
+    (migración 0019). En SQLite la tabla no se particiona y NULL en la PK
+    entera asigna el rowid.
+    """
+    allowed_default = True
+    output_field = models.BigIntegerField()
+
+    def as_sql(self, compiler, connection):
+        return f"nextval('{SECUENCIA_ID}')", []
+
+    def as_sqlite(self, compiler, connection):
+        return 'NULL', []
+
+
 class UserLog(models.Model):
     ORIGENES = [
         ('web', 'Web'),
@@ -16,8 +36,13 @@ class UserLog(models.Model):
         ('casi', 'Casi'),
     ]
 
+    # Postgres exige que la PK de una tabla particionada incluya la columna de partición
+    pk = models.CompositePrimaryKey('id', 'fechaHora')
+    id = models.BigIntegerField(db_default=SiguienteId(), editable=False)
     usuario = models.ForeignKey(customUser, on_delete=models.CASCADE, null=True, blank=True, related_name='logs')
-    fechaHora = models.DateTimeField(auto_now_add=True)
+    # default en vez de auto_now_add: los logs se insertan en lote después y
+    # bulk_create pisaría la hora del evento con la de la inserción
+    fechaHora = models.DateTimeField(default=timezone.now, editable=False)
 
     tipoAccion = models.CharField(max_length=100)
     rutaAcceso = models.CharField(max_length=255)
@@ -30,5 +55,15 @@ class UserLog(models.Model):
     
     detalles = models.JSONField(blank=True, null=True)
 
+    class Meta:
+        # En Postgres la tabla está particionada por mes sobre fechaHora
+        # (migración 0019, apps/common/particiones.py); los índices se crean
+        # en cada partición.
+        indexes = [
+            models.Index(fields=['-fechaHora', '-id'], name='userlog_fecha_id'),
+            models.Index(fields=['tipoAccion', '-fechaHora'], name='userlog_tipo_fecha'),
+            models.Index(fields=['usuario', '-fechaHora'], name='userlog_usuario_fecha'),
+        ]
+
     def __str__(self):
         return f"{self.usuario} - {self.tipoAccion} - {self.fechaHora.strftime('%Y-%m-%d %H:%M:%S')}"
@@ -1,9 +1,10 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from apps.common.models import Tienda, CustomUser, Producto
 # Create your models here.
 class Notificacion(models.Model):
-    opciones = ('nuevo_producto', 'Nuevo producto'), ('general',  'General')
+    opciones = ('nuevo_producto', 'Nuevo producto'), ('baja_precio', 'Baja de precio'), ('resumen', 'Resumen'), ('general',  'General')
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notificaciones')
     tienda = models.ForeignKey('common.Tienda', on_delete=models.CASCADE, null=True, blank=True)
     
@@ -11,7 +12,8 @@ class Notificacion(models.Model):
     mensaje = models.TextField()
     
     leida = models.BooleanField(default=False)
-    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Sin auto_now_add: los resúmenes conservan la fecha de lo que reemplazan
+    fecha_creacion = models.DateTimeField(default=timezone.now, editable=False)
     
     producto = models.ForeignKey('common.Producto', on_delete=models.CASCADE, null=True, blank=True)
 
@@ -19,8 +21,67 @@ class Notificacion(models.Model):
         indexes = [
             models.Index(fields=['usuario', 'leida']),
             models.Index(fields=['fecha_creacion']),
+            models.Index(fields=['usuario', '-fecha_creacion', '-id'], name='notificacion_usuario_fecha_id'),
         ]
         ordering = ['-fecha_creacion']
     
     def __str__(self):
-        return f"Notificación {self.usuario}"  
\ No newline at end of file
+        return f"Notificación {self.usuario}"  
+
+class EnvioNotificacion(models.Model):
+    """
+    Un evento de tienda a notificar a sus seguidores. La clave deduplica el
+    evento y ultimo_usuario_id permite retomar el envío donde quedó.
+
+    En modo 'pull' (tiendas con muchos seguidores) no se crea una Notificacion
+    por seguidor: el evento se guarda una vez y se mezcla al leer el feed.
+    """
+    modos = (
+        ('push', 'Push'),
+        ('pull', 'Pull'),
+    )
+    estados = (
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    )
+    clave = models.CharField(max_length=100, unique=True)
+    tienda = models.ForeignKey('common.Tienda', on_delete=models.CASCADE, related_name='envios_notificacion')
+    producto = models.ForeignKey('common.Producto', on_delete=models.CASCADE, null=True, blank=True)
+    tipo = models.CharField(max_length=50, choices=Notificacion.opciones, default='general')
+    mensaje = models.TextField()
+    modo = models.CharField(max_length=10, choices=modos, default='push')
+    # Posición del evento entre los pull de su tienda (1, 2, ...); 0 en modo push
+    numero = models.PositiveIntegerField(default=0)
+
+    estado = models.CharField(max_length=20, choices=estados, default='pendiente')
+    total = models.PositiveIntegerField(default=0)
+    enviados = models.PositiveIntegerField(default=0)
+    ultimo_usuario_id = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+            models.Index(fields=['tienda', 'modo', 'fecha_creacion']),
+        ]
+
+    def __str__(self):
+        return f"{self.clave} ({self.estado} {self.enviados}/{self.total})"
+
+
+class BandejaNotificaciones(models.Model):
+    """
+    Estado del feed de cada usuario: los eventos de tienda hasta leidas_hasta
+    cuentan como leídos y no_leidas lleva la cuenta de sus Notificacion sin leer.
+    """
+    usuario = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='bandeja_notificaciones')
+    leidas_hasta = models.DateTimeField(null=True, blank=True)
+    no_leidas = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Bandeja de {self.usuario}"
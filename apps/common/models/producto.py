@@ -1,8 +1,15 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from apps.common.models.tienda import Tienda
 from apps.common.models.categoria import Categoria
 from apps.common.models.talla import Talla
 
+class ProductoManager(models.Manager):
+    def get_queryset(self):
+        # El vector de búsqueda solo se usa para filtrar, no se carga con cada fila
+        return super().get_queryset().defer('busqueda')
+
 class Producto(models.Model):
     estados = (
         ('activo', 'Activo'),
@@ -21,5 +28,25 @@ class Producto(models.Model):
     color = models.CharField(max_length=50, blank=True, null=True)
     precio = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stock = models.PositiveIntegerField(default=0)
+    # Agregados de las variantes, mantenidos por apps.common.inventario
+    stockTotal = models.PositiveIntegerField(default=0, editable=False)
+    precioMinimo = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
+    precioMaximo = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, editable=False)
+    busqueda = SearchVectorField(blank=True, null=True, editable=False)
+
+    objects = ProductoManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['busqueda'], name='producto_busqueda_gin'),
+            GinIndex(fields=['nombre'], name='producto_nombre_trgm', opclasses=['gin_trgm_ops']),
+            # Paginación por cursor sobre (fechaCreacion, id)
+            models.Index(fields=['-fechaCreacion', '-id'], name='producto_fecha_id'),
+            models.Index(fields=['tienda', '-fechaCreacion', '-id'], name='producto_tienda_fecha_id'),
+            # Listados "con stock, por precio": índice parcial solo con los disponibles
+            models.Index(fields=['precioMinimo', 'id'], name='producto_disponible_precio',
+                         condition=models.Q(estado='activo', stockTotal__gt=0)),
+        ]
+
     def __str__(self):
         return self.nombre
\ No newline at end of file
@@ -0,0 +1,41 @@
+from django.db import models
+from django.conf import settings
+
+
+class ReservaStock(models.Model):
+    """
+    Stock apartado para un carrito. Se descuenta de las variantes al reservar;
+    si la reserva se libera o vence sin confirmarse, vuelve a las variantes.
+    """
+    estados = (
+        ('activa', 'Activa'),
+        ('confirmada', 'Confirmada'),
+        ('liberada', 'Liberada'),
+        ('expirada', 'Expirada'),
+    )
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservas_stock')
+    estado = models.CharField(max_length=20, choices=estados, default='activa')
+    expira = models.DateTimeField()
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Barrido de reservas vencidas
+            models.Index(fields=['estado', 'expira']),
+        ]
+
+    def __str__(self):
+        return f"Reserva #{self.pk} ({self.estado})"
+
+
+class ReservaItem(models.Model):
+    reserva = models.ForeignKey(ReservaStock, on_delete=models.CASCADE, related_name='items')
+    variante = models.ForeignKey('common.Variante', on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('reserva', 'variante')
+
+    def __str__(self):
+        return f"{self.cantidad} x variante {self.variante_id}"
@@ -6,12 +6,15 @@ class Seguimiento(models.Model):
     usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='tiendas_seguidas')
     tienda = models.ForeignKey('common.Tienda', on_delete=models.CASCADE, related_name='seguidores')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Número del último evento pull de la tienda que el usuario ya leyó (o que es anterior a seguirla)
+    eventos_leidos = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('usuario', 'tienda')
         indexes = [
             models.Index(fields=['usuario']),
             models.Index(fields=['tienda']),
+            models.Index(fields=['usuario', '-fecha_creacion', '-id'], name='seguimiento_usuario_fecha_id'),
         ]
         ordering = ['-fecha_creacion']
         
@@ -1,9 +1,27 @@
 # apps/user_api/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, m2m_changed, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
+from django.db import transaction
+from django.db.models import Q, QuerySet
 from apps.common.models.producto import Producto  # ajusta import si tu ruta cambia
 from apps.common.models.seguir import Seguimiento
 from apps.common.models.notificacion import Notificacion
+from apps.common.models.tienda import Tienda
+from apps.common.models.categoria import Categoria
+from apps.common.models.variante import Variante
+from apps.common.models.talla import Talla
+from apps.common.models.faceta import FacetaProducto
+from apps.common.busqueda import actualizar_busqueda
+from apps.common.facetas import CAMPOS_FACETAS, programar_sincronizacion
+from apps.common.categorias import insertar_en_arbol, mover_en_arbol, invalidar_arbol
+from apps.common.autenticacion import usuarios as cache_usuarios
+from apps.common.notificaciones import descontar_no_leidas, notificar_seguidores
+from apps.common.models.user import CustomUser
+from apps.common.models.imagen import Imagen
+from apps.common.imagenes import borrar_versiones, programar_versiones, rutas_versiones
+from apps.common.almacenamiento import liberar_al_confirmar
+from apps.common.inventario import recalcular_existencias, recontar_existencias
+from apps.common import cache_respuestas
 
 @receiver(post_save, sender=Producto)
 def notificar_seguidores_nuevo_producto(sender, instance, created, **kwargs):
@@ -14,25 +32,265 @@ def notificar_seguidores_nuevo_producto(sender, instance, created, **kwargs):
     if tienda is None:
         return
 
-    # Traer IDs de usuarios que siguen esa tienda
-    seguidores_ids = list(
-        Seguimiento.objects.filter(tienda=tienda)
-        .values_list('usuario_id', flat=True)
+    mensaje = f"¡{tienda.nombre} publicó un nuevo producto: {getattr(instance, 'nombre', str(instance))}!"
+
+    # El fan-out a los seguidores corre fuera del request, en lotes reanudables
+    notificar_seguidores(tienda, 'nuevo_producto', mensaje, clave=f"nuevo_producto:{instance.pk}", producto=instance)
+
+@receiver(pre_save, sender=Producto)
+def detectar_baja_precio(sender, instance, **kwargs):
+    anterior = sender.objects.filter(pk=instance.pk).values_list('precioBase', flat=True).first() if instance.pk else None
+    instance._baja_precio = anterior is not None and instance.precioBase is not None and instance.precioBase < anterior
+
+@receiver(post_save, sender=Producto)
+def notificar_seguidores_baja_precio(sender, instance, created, **kwargs):
+    if created or not getattr(instance, '_baja_precio', False) or instance.tienda_id is None:
+        return
+    tienda = instance.tienda
+    mensaje = f"¡{instance.nombre} de {tienda.nombre} bajó de precio a {instance.precioBase}!"
+    notificar_seguidores(tienda, 'baja_precio', mensaje, clave=f"baja_precio:{instance.pk}:{instance.precioBase}", producto=instance)
+
+
+# ===== ÍNDICE DE BÚSQUEDA DE PRODUCTOS =====
+
+CAMPOS_BUSQUEDA = {'nombre', 'descripcion', 'tienda'}
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not CAMPOS_BUSQUEDA & set(update_fields):
+        return
+    actualizar_busqueda(Producto.objects.filter(pk=instance.pk))
+
+@receiver(m2m_changed, sender=Producto.categoria.through)
+def indexar_categorias_producto(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Después del clear ya no se sabe qué productos tenía la categoría
+        instance._productos_busqueda = list(instance.productos.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        ids = [instance.pk]
+    elif action == 'post_clear':
+        ids = getattr(instance, '_productos_busqueda', [])
+    else:
+        ids = pk_set
+    actualizar_busqueda(Producto.objects.filter(pk__in=ids))
+    programar_sincronizacion(ids)
+
+@receiver(pre_save, sender=Tienda)
+@receiver(pre_save, sender=Categoria)
+def detectar_cambio_nombre(sender, instance, **kwargs):
+    anterior = sender.objects.filter(pk=instance.pk).values_list('nombre', flat=True).first() if instance.pk else None
+    instance._reindexar_busqueda = anterior is not None and anterior != instance.nombre
+
+@receiver(post_save, sender=Tienda)
+def reindexar_productos_tienda(sender, instance, created, **kwargs):
+    if getattr(instance, '_reindexar_busqueda', False):
+        actualizar_busqueda(Producto.objects.filter(tienda=instance))
+
+@receiver(post_save, sender=Categoria)
+def reindexar_productos_categoria(sender, instance, created, **kwargs):
+    if getattr(instance, '_reindexar_busqueda', False):
+        actualizar_busqueda(Producto.objects.filter(categoria=instance))
+
+@receiver(pre_delete, sender=Categoria)
+def guardar_productos_categoria(sender, instance, **kwargs):
+    instance._productos_busqueda = list(instance.productos.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=Categoria)
+def reindexar_productos_categoria_eliminada(sender, instance, **kwargs):
+    ids = getattr(instance, '_productos_busqueda', [])
+    actualizar_busqueda(Producto.objects.filter(pk__in=ids))
+    programar_sincronizacion(ids)
+
+
+# ===== ÁRBOL DE CATEGORÍAS =====
+
+@receiver(pre_save, sender=Categoria)
+def detectar_cambio_padre(sender, instance, **kwargs):
+    anterior = list(sender.objects.filter(pk=instance.pk).values_list('categoriaPadre_id', flat=True)) if instance.pk else []
+    instance._mover_en_arbol = bool(anterior) and anterior[0] != instance.categoriaPadre_id
+
+@receiver(post_save, sender=Categoria)
+def actualizar_arbol_categoria(sender, instance, created, **kwargs):
+    if created:
+        insertar_en_arbol(instance)
+    elif getattr(instance, '_mover_en_arbol', False):
+        mover_en_arbol(instance)
+    invalidar_arbol()
+
+@receiver(post_delete, sender=Categoria)
+def invalidar_arbol_categoria(sender, instance, **kwargs):
+    # Las filas de la tabla de clausura se borran en cascada
+    invalidar_arbol()
+
+
+# ===== FACETAS DEL CATÁLOGO =====
+
+@receiver(post_save, sender=Producto)
+def sincronizar_facetas_producto(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not CAMPOS_FACETAS & set(update_fields):
+        return
+    programar_sincronizacion([instance.pk])
+
+@receiver(post_delete, sender=Producto)
+def quitar_facetas_producto(sender, instance, **kwargs):
+    programar_sincronizacion([instance.pk])
+
+@receiver(post_save, sender=Variante)
+@receiver(post_delete, sender=Variante)
+def sincronizar_facetas_variante(sender, instance, **kwargs):
+    programar_sincronizacion([instance.producto_id])
+
+# ===== EXISTENCIAS DEL PRODUCTO =====
+
+@receiver(pre_save, sender=Variante)
+def detectar_cambio_existencias(sender, instance, **kwargs):
+    instance._existencias_anteriores = sender.objects.filter(pk=instance.pk).values_list(
+        'producto_id', 'stock', 'precio'
+    ).first() if instance.pk else None
+
+@receiver(post_save, sender=Variante)
+def ajustar_existencias_variante(sender, instance, **kwargs):
+    anterior = getattr(instance, '_existencias_anteriores', None)
+    if anterior == (instance.producto_id, instance.stock, instance.precio):
+        return
+    # Se recuenta el producto (y el anterior si la variante cambió de producto)
+    recontar_existencias({instance.producto_id} | ({anterior[0]} if anterior else set()))
+
+@receiver(post_delete, sender=Variante)
+def recalcular_existencias_variante(sender, instance, origin=None, **kwargs):
+    # En el borrado en cascada de un producto, tienda o usuario no hay nada que mantener
+    modelo = getattr(origin, 'model', None) if isinstance(origin, QuerySet) else type(origin)
+    if modelo is Variante:
+        recalcular_existencias(Producto.objects.filter(pk=instance.producto_id))
+
+@receiver(pre_delete, sender=Talla)
+def guardar_productos_talla(sender, instance, **kwargs):
+    # Las variantes quedan con talla NULL vía UPDATE, sin señales propias
+    instance._productos_facetas = list(
+        FacetaProducto.objects.filter(tipo='talla', valor=str(instance.pk)).values_list('producto_id', flat=True)
     )
 
-    if not seguidores_ids:
+@receiver(post_delete, sender=Talla)
+def sincronizar_facetas_talla(sender, instance, **kwargs):
+    programar_sincronizacion(getattr(instance, '_productos_facetas', []))
+
+
+# ===== CONTADOR DE NO LEÍDAS =====
+
+@receiver(pre_delete, sender=Tienda)
+def descontar_no_leidas_tienda(sender, instance, **kwargs):
+    # El CASCADE borra sus notificaciones (y las de sus productos) sin pasar por marcar_leida
+    descontar_no_leidas(Notificacion.objects.filter(Q(tienda=instance) | Q(producto__tienda=instance)))
+
+@receiver(pre_delete, sender=Producto)
+def descontar_no_leidas_producto(sender, instance, origin=None, **kwargs):
+    # Si el producto cae con su tienda o su dueño, ya lo descontó la tienda
+    modelo = getattr(origin, 'model', None) if isinstance(origin, QuerySet) else type(origin)
+    if modelo is Producto:
+        descontar_no_leidas(Notificacion.objects.filter(producto=instance))
+
+@receiver(pre_save, sender=Seguimiento)
+def iniciar_eventos_leidos(sender, instance, **kwargs):
+    # Los eventos anteriores a seguir la tienda no aparecen en el feed ni en el contador
+    if instance.pk is None:
+        instance.eventos_leidos = Tienda.objects.filter(pk=instance.tienda_id).values_list(
+            'eventos_pull', flat=True
+        ).first() or 0
+
+
+# ===== CACHE DE AUTENTICACIÓN =====
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidar_usuario_autenticado(sender, instance, **kwargs):
+    cache_usuarios.invalidar(instance.pk)
+
+
+# ===== VERSIONES DE IMÁGENES =====
+
+@receiver(pre_save, sender=Imagen)
+def detectar_cambio_archivo(sender, instance, **kwargs):
+    anterior = sender.objects.filter(pk=instance.pk).values('archivo', 'versiones').first() if instance.pk else None
+    instance._generar_versiones = anterior is None or anterior['archivo'] != instance.archivo.name
+    instance._versiones_anteriores = []
+    instance._archivo_reemplazado = None
+    if anterior is not None and instance._generar_versiones:
+        instance._archivo_reemplazado = anterior['archivo'] or None
+        instance._versiones_anteriores = rutas_versiones(anterior['versiones'])
+        instance.versiones = {}
+        instance.estado_versiones = 'pendiente'
+
+@receiver(post_save, sender=Imagen)
+def generar_versiones_imagen(sender, instance, created, **kwargs):
+    if getattr(instance, '_generar_versiones', False):
+        programar_versiones(instance.pk)
+    anteriores = getattr(instance, '_versiones_anteriores', [])
+    if anteriores:
+        transaction.on_commit(lambda: borrar_versiones(anteriores))
+
+@receiver(post_delete, sender=Imagen)
+def borrar_versiones_imagen(sender, instance, **kwargs):
+    rutas = rutas_versiones(instance.versiones)
+    if rutas:
+        transaction.on_commit(lambda: borrar_versiones(rutas))
+
+
+# ===== REFERENCIAS A ARCHIVOS =====
+
+# Campo de archivo de cada modelo: al reemplazarlo o borrar la fila se suelta la
+# referencia y el almacenamiento borra el contenido si nadie más lo usa
+CAMPOS_ARCHIVO = {Imagen: 'archivo', Tienda: 'foto_perfil', CustomUser: 'foto_perfil'}
+
+@receiver(pre_save, sender=Tienda)
+@receiver(pre_save, sender=CustomUser)
+def detectar_archivo_reemplazado(sender, instance, update_fields=None, **kwargs):
+    campo = CAMPOS_ARCHIVO[sender]
+    instance._archivo_reemplazado = None
+    if instance.pk is None or (update_fields is not None and campo not in update_fields):
         return
+    anterior = sender.objects.filter(pk=instance.pk).values_list(campo, flat=True).first()
+    if anterior and anterior != getattr(instance, campo).name:
+        instance._archivo_reemplazado = anterior
 
-    mensaje = f"¡{tienda.nombre} publicó un nuevo producto: {getattr(instance, 'nombre', str(instance))}!"
+@receiver(post_save, sender=Imagen)
+@receiver(post_save, sender=Tienda)
+@receiver(post_save, sender=CustomUser)
+def liberar_archivo_reemplazado(sender, instance, **kwargs):
+    anterior = getattr(instance, '_archivo_reemplazado', None)
+    if anterior:
+        instance._archivo_reemplazado = None
+        liberar_al_confirmar(getattr(instance, CAMPOS_ARCHIVO[sender]), anterior)
+
+@receiver(post_delete, sender=Imagen)
+@receiver(post_delete, sender=Tienda)
+@receiver(post_delete, sender=CustomUser)
+def liberar_archivo_eliminado(sender, instance, **kwargs):
+    archivo = getattr(instance, CAMPOS_ARCHIVO[sender])
+    if archivo:
+        liberar_al_confirmar(archivo, archivo.name)
+
+
+# ===== CACHE DE RESPUESTAS PÚBLICAS =====
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Tienda)
+@receiver(post_delete, sender=Tienda)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_save, sender=Imagen)
+@receiver(post_delete, sender=Imagen)
+@receiver(post_save, sender=Variante)
+@receiver(post_delete, sender=Variante)
+@receiver(post_save, sender=Talla)
+@receiver(post_delete, sender=Talla)
+def invalidar_respuestas(sender, **kwargs):
+    cache_respuestas.invalidar(sender)
 
-    notifs = [
-        Notificacion(
-            usuario_id=uid,
-            tienda=tienda,
-            producto=instance,
-            tipo='nuevo_producto',
-            mensaje=mensaje
-        )
-        for uid in seguidores_ids
-    ]
-    Notificacion.objects.bulk_create(notifs)
+@receiver(m2m_changed, sender=Producto.categoria.through)
+def invalidar_respuestas_categorias(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        cache_respuestas.invalidar(Producto, Categoria)
@@ -21,7 +21,9 @@ class Tienda(models.Model):
     actualizacion = models.DateTimeField(auto_now=True)
     estado = models.CharField(max_length=30, choices=estados, default='activo')
     fecha_eliminacion = models.DateTimeField(blank=True, null=True)
-    foto_perfil = models.ImageField(upload_to='media/tiendas/logos/', blank=True, null=True)
+    foto_perfil = models.ImageField(upload_to='tiendas/logos/', blank=True, null=True)
+    # Número del último evento pull de la tienda (EnvioNotificacion.numero)
+    eventos_pull = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.nombre
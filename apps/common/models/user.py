@@ -29,7 +29,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     nombre = models.CharField(max_length=150)
     apellidos = models.CharField(max_length=150)
     celular = models.CharField(max_length=20, blank=True, null=True)
-    foto_perfil = models.ImageField(upload_to='media/usuarios/perfil/', blank=True, null=True)
+    foto_perfil = models.ImageField(upload_to='usuarios/perfil/', blank=True, null=True)
     is_seller = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
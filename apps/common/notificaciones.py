@@ -0,0 +1,467 @@
+import logging
+import os
+import queue
+import threading
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from graphql import GraphQLError
+from apps.common.models.notificacion import Notificacion, EnvioNotificacion, BandejaNotificaciones
+from apps.common.models.tienda import Tienda
+from apps.common.paginacion import MAXIMO, POR_DEFECTO, Pagina, codificar_cursor, decodificar_cursor
+from apps.common.models.seguir import Seguimiento
+from apps.common.tiempo_real import avisar_tienda, avisar_usuarios
+
+logger = logging.getLogger(__name__)
+
+ASINCRONAS = getattr(settings, 'NOTIFICACIONES_ASINCRONAS', True)
+TAMANO_LOTE = getattr(settings, 'NOTIFICACIONES_TAMANO_LOTE', 1000)
+UMBRAL_PULL = getattr(settings, 'NOTIFICACIONES_UMBRAL_PULL', 5000)
+
+PREFIJO_EVENTO = 'evento:'
+CAMPOS_CURSOR = (Notificacion._meta.get_field('fecha_creacion'), IntegerField(), Notificacion._meta.get_field('id'))
+
+
+def procesar_envio(envio_id):
+    """
+    Inserta las notificaciones de un envío a los seguidores de la tienda, en
+    lotes de TAMANO_LOTE. Cada lote y su avance se confirman juntos, así que
+    un envío interrumpido se retoma sin duplicar notificaciones.
+    """
+    # Tomar el envío de forma atómica: si otro proceso ya lo tiene, no hacer nada
+    tomados = EnvioNotificacion.objects.filter(pk=envio_id, estado__in=('pendiente', 'fallido')).update(estado='en_proceso')
+    if not tomados:
+        return None
+    envio = EnvioNotificacion.objects.get(pk=envio_id)
+    try:
+        if not envio.total:
+            envio.total = Seguimiento.objects.filter(tienda_id=envio.tienda_id).count()
+            envio.save(update_fields=['total'])
+
+        seguidores = (
+            Seguimiento.objects.filter(tienda_id=envio.tienda_id, usuario_id__gt=envio.ultimo_usuario_id)
+            .order_by('usuario_id')
+            .values_list('usuario_id', flat=True)
+        )
+        lote = []
+        for usuario_id in seguidores.iterator(chunk_size=TAMANO_LOTE):
+            lote.append(usuario_id)
+            if len(lote) == TAMANO_LOTE:
+                _insertar_lote(envio, lote)
+                lote = []
+        if lote:
+            _insertar_lote(envio, lote)
+
+        EnvioNotificacion.objects.filter(pk=envio.pk).update(estado='completado', error=None)
+    except Exception as e:
+        logger.exception("Falló el envío de notificaciones %s", envio.clave)
+        EnvioNotificacion.objects.filter(pk=envio.pk).update(estado='fallido', error=str(e))
+    envio.refresh_from_db()
+    return envio
+
+
+def _insertar_lote(envio, usuarios_ids):
+    with transaction.atomic():
+        Notificacion.objects.bulk_create([
+            Notificacion(
+                usuario_id=usuario_id,
+                tienda_id=envio.tienda_id,
+                producto_id=envio.producto_id,
+                tipo=envio.tipo,
+                mensaje=envio.mensaje,
+            )
+            for usuario_id in usuarios_ids
+        ])
+        sumar_no_leidas(usuarios_ids)
+        avisar_usuarios(usuarios_ids)
+        EnvioNotificacion.objects.filter(pk=envio.pk).update(
+            enviados=F('enviados') + len(usuarios_ids),
+            ultimo_usuario_id=usuarios_ids[-1],
+        )
+    logger.info("Envío %s: %s notificaciones más", envio.clave, len(usuarios_ids))
+
+
+class Despachador:
+    """Hilo de fondo que procesa los envíos encolados, uno a la vez."""
+
+    def __init__(self):
+        self.cola = queue.Queue()
+        self._hilo = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def encolar(self, envio_id):
+        if not ASINCRONAS or not self._iniciar():
+            procesar_envio(envio_id)
+            return
+        self.cola.put(envio_id)
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None or self._pid != os.getpid() or not self._hilo.is_alive():
+                try:
+                    self._hilo = threading.Thread(target=self._bucle, name='despachador-notificaciones', daemon=True)
+                    self._hilo.start()
+                    self._pid = os.getpid()
+                except RuntimeError:
+                    return False
+        return True
+
+    def _bucle(self):
+        while True:
+            envio_id = self.cola.get()
+            try:
+                procesar_envio(envio_id)
+            except Exception:
+                logger.exception("Error procesando el envío %s", envio_id)
+            finally:
+                close_old_connections()
+
+
+despachador = Despachador()
+
+
+def notificar_seguidores(tienda, tipo, mensaje, clave, producto=None):
+    """
+    Punto único para notificar un evento de tienda a sus seguidores. Registra
+    el envío (una sola vez por `clave`) y lo procesa en segundo plano al
+    confirmar la transacción; el request no espera el fan-out.
+
+    Si la tienda tiene UMBRAL_PULL seguidores o más, el evento queda en modo
+    'pull': no se copia a cada seguidor y se mezcla al leer su feed.
+    """
+    seguidores = Seguimiento.objects.filter(tienda=tienda).count()
+    modo = 'pull' if seguidores >= UMBRAL_PULL else 'push'
+    defaults = {'tienda': tienda, 'producto': producto, 'tipo': tipo, 'mensaje': mensaje, 'modo': modo, 'total': seguidores}
+    if modo == 'pull':
+        defaults['estado'] = 'completado'
+    with transaction.atomic():
+        envio, creado = EnvioNotificacion.objects.get_or_create(clave=clave, defaults=defaults)
+        if creado and modo == 'pull':
+            _numerar_evento(envio)
+    if creado and modo == 'push':
+        transaction.on_commit(lambda: despachador.encolar(envio.pk))
+    elif creado:
+        avisar_tienda(tienda.pk)
+    return envio
+
+
+def _numerar_evento(envio):
+    """Da al evento pull el número siguiente de su tienda (el UPDATE la bloquea hasta confirmar)."""
+    tiendas = Tienda.objects.filter(pk=envio.tienda_id)
+    tiendas.update(eventos_pull=F('eventos_pull') + 1)
+    envio.numero = tiendas.values_list('eventos_pull', flat=True).get()
+    EnvioNotificacion.objects.filter(pk=envio.pk).update(numero=envio.numero)
+
+
+# ===== FEED: NOTIFICACIONES PROPIAS + EVENTOS PULL =====
+
+def eventos_usuario(usuario):
+    """Eventos 'pull' de las tiendas que sigue el usuario, desde que las sigue."""
+    return EnvioNotificacion.objects.filter(
+        modo='pull',
+        tienda__seguidores__usuario=usuario,
+        fecha_creacion__gte=F('tienda__seguidores__fecha_creacion'),
+    )
+
+
+def leidas_hasta(usuario):
+    return BandejaNotificaciones.objects.filter(usuario=usuario).values_list('leidas_hasta', flat=True).first()
+
+
+def como_notificacion(evento, usuario, marca):
+    """Notificacion en memoria (no se guarda) para mostrar un evento en el feed."""
+    return Notificacion(
+        id=f"{PREFIJO_EVENTO}{evento.pk}",
+        usuario_id=usuario.pk,
+        tienda_id=evento.tienda_id,
+        producto_id=evento.producto_id,
+        tipo=evento.tipo,
+        mensaje=evento.mensaje,
+        leida=marca is not None and evento.fecha_creacion <= marca,
+        fecha_creacion=evento.fecha_creacion,
+    )
+
+
+def _filtro_cursor(fecha, origen, pk, origen_fuente):
+    """Filas de la fuente `origen_fuente` (0 propias, 1 eventos) posteriores al cursor en el orden del feed."""
+    if origen_fuente == origen:
+        return Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, pk__lt=pk)
+    if origen_fuente > origen:
+        return Q(fecha_creacion__lte=fecha)
+    return Q(fecha_creacion__lt=fecha)
+
+
+def pagina_feed(usuario, solo_no_leidas=False, first=None, after=None, last=None, before=None):
+    """
+    Página del feed: notificaciones del usuario y eventos pull de sus tiendas,
+    de la más nueva a la más vieja. Pagina por keyset hacia adelante sobre
+    (fecha, origen, id), leyendo a lo sumo first+1 filas de cada fuente.
+    """
+    if last is not None or before:
+        raise GraphQLError("misNotificaciones se pagina hacia adelante (first/after).")
+    if first is not None and first < 0:
+        raise GraphQLError("first y last deben ser positivos.")
+    cantidad = POR_DEFECTO if first is None else min(first, MAXIMO)
+
+    marca = leidas_hasta(usuario)
+    propias = Notificacion.objects.filter(usuario=usuario)
+    eventos = eventos_usuario(usuario)
+    if solo_no_leidas:
+        propias = propias.filter(leida=False)
+        if marca is not None:
+            eventos = eventos.filter(fecha_creacion__gt=marca)
+    if after:
+        fecha, origen, pk = decodificar_cursor(after, CAMPOS_CURSOR)
+        propias = propias.filter(_filtro_cursor(fecha, origen, pk, 0))
+        eventos = eventos.filter(_filtro_cursor(fecha, origen, pk, 1))
+
+    filas = [(n.fecha_creacion, 0, n.pk, n) for n in propias.order_by('-fecha_creacion', '-id')[:cantidad + 1]]
+    filas += [
+        (e.fecha_creacion, 1, e.pk, como_notificacion(e, usuario, marca))
+        for e in eventos.order_by('-fecha_creacion', '-id')[:cantidad + 1]
+    ]
+    # Orden del feed: fecha descendente, propias antes que eventos, id descendente
+    filas.sort(key=lambda fila: (fila[0], -fila[1], fila[2]), reverse=True)
+    hay_mas = len(filas) > cantidad
+    filas = filas[:cantidad]
+    return Pagina(
+        [fila[3] for fila in filas],
+        [codificar_cursor([fecha, origen, pk]) for fecha, origen, pk, _ in filas],
+        hay_siguiente=hay_mas,
+        hay_anterior=bool(after),
+    )
+
+
+def evento_de_usuario(usuario, notificacion_id):
+    """Evento pull con id 'evento:<pk>' visible para el usuario, o None si el id no es de un evento."""
+    notificacion_id = str(notificacion_id)
+    if not notificacion_id.startswith(PREFIJO_EVENTO):
+        return None
+    pk = notificacion_id[len(PREFIJO_EVENTO):]
+    if not pk.isdigit():
+        raise EnvioNotificacion.DoesNotExist
+    return eventos_usuario(usuario).get(pk=pk)
+
+
+def marcar_eventos_leidos(usuario, hasta=None):
+    """
+    Avanza la marca de lectura del usuario hasta `hasta` (por defecto ahora):
+    todos los eventos pull anteriores pasan a leídos. Devuelve cuántos eran nuevos.
+    """
+    hasta = hasta or timezone.now()
+    marca = leidas_hasta(usuario)
+    nuevos = eventos_usuario(usuario).filter(fecha_creacion__lte=hasta)
+    if marca is not None:
+        nuevos = nuevos.filter(fecha_creacion__gt=marca)
+    cantidad = nuevos.count()
+    BandejaNotificaciones.objects.get_or_create(usuario=usuario)
+    # La marca nunca retrocede, aunque dos requests la muevan a la vez
+    BandejaNotificaciones.objects.filter(usuario=usuario).filter(
+        Q(leidas_hasta__isnull=True) | Q(leidas_hasta__lt=hasta)
+    ).update(leidas_hasta=hasta)
+    # Para el contador: cada tienda seguida queda leída hasta su último evento anterior a la marca
+    ultimo = EnvioNotificacion.objects.filter(
+        tienda=OuterRef('tienda_id'), modo='pull', fecha_creacion__lte=hasta
+    ).order_by('-fecha_creacion', '-numero').values('numero')[:1]
+    Seguimiento.objects.filter(usuario=usuario).update(
+        eventos_leidos=Greatest(F('eventos_leidos'), Coalesce(Subquery(ultimo), Value(0)))
+    )
+    return cantidad
+
+
+# ===== CONTADOR DE NO LEÍDAS =====
+
+def sumar_no_leidas(usuarios_ids, cantidad=1):
+    """Suma `cantidad` al contador de cada usuario. Debe llamarse dentro de la transacción que crea las notificaciones."""
+    BandejaNotificaciones.objects.bulk_create(
+        [BandejaNotificaciones(usuario_id=usuario_id) for usuario_id in usuarios_ids],
+        ignore_conflicts=True,
+    )
+    # Bloquear las filas en orden de usuario evita deadlocks entre envíos simultáneos
+    bandejas = BandejaNotificaciones.objects.select_for_update().filter(usuario_id__in=usuarios_ids)
+    list(bandejas.order_by('usuario_id').values_list('usuario_id', flat=True))
+    bandejas.update(no_leidas=F('no_leidas') + cantidad)
+
+
+def marcar_leida(usuario, notificacion):
+    """Marca una Notificacion propia como leída y descuenta el contador si no lo estaba."""
+    with transaction.atomic():
+        marcadas = Notificacion.objects.filter(pk=notificacion.pk, leida=False).update(leida=True)
+        if marcadas:
+            BandejaNotificaciones.objects.filter(usuario=usuario, no_leidas__gt=0).update(no_leidas=F('no_leidas') - 1)
+    notificacion.leida = True
+    return marcadas
+
+
+def marcar_todas_leidas(usuario):
+    """Marca todas las notificaciones propias como leídas y pone el contador en cero."""
+    with transaction.atomic():
+        BandejaNotificaciones.objects.get_or_create(usuario=usuario)
+        # Con la bandeja bloqueada, un envío en curso suma después de este reinicio
+        BandejaNotificaciones.objects.select_for_update().filter(usuario=usuario).first()
+        marcadas = Notificacion.objects.filter(usuario=usuario, leida=False).update(leida=True)
+        BandejaNotificaciones.objects.filter(usuario=usuario).update(no_leidas=0)
+    return marcadas
+
+
+def descontar_no_leidas(notificaciones):
+    """
+    Resta del contador de cada usuario sus notificaciones sin leer del queryset
+    `notificaciones`, antes de que un borrado en cascada las quite sin pasar
+    por marcar_leida. Un solo UPDATE para todos los usuarios afectados.
+    """
+    pendientes = notificaciones.filter(leida=False)
+    por_usuario = pendientes.filter(usuario=OuterRef('usuario_id')).values('usuario')
+    cantidad = Subquery(por_usuario.annotate(total=Count('id')).values('total'))
+    BandejaNotificaciones.objects.filter(usuario_id__in=pendientes.values('usuario_id')).update(
+        no_leidas=Greatest(F('no_leidas') - Coalesce(cantidad, Value(0)), Value(0))
+    )
+
+
+def contador_no_leidas(usuario):
+    """
+    Notificaciones propias sin leer (contador de la bandeja) más los eventos pull
+    sin leer: en cada tienda seguida, su último número menos el último leído.
+    Lee la bandeja y una fila por tienda seguida, sin contar notificaciones ni eventos.
+    """
+    no_leidas = BandejaNotificaciones.objects.filter(usuario=usuario).values_list('no_leidas', flat=True).first()
+    eventos = Seguimiento.objects.filter(usuario=usuario, tienda__eventos_pull__gt=F('eventos_leidos')).aggregate(
+        total=Sum(F('tienda__eventos_pull') - F('eventos_leidos'))
+    )['total']
+    return (no_leidas or 0) + (eventos or 0)
+
+
+def recalcular_contadores(usuarios_ids=None):
+    """Rehace los contadores desde las notificaciones (tras cargas o borrados masivos)."""
+    pendientes = Notificacion.objects.filter(leida=False)
+    if usuarios_ids is not None:
+        pendientes = pendientes.filter(usuario_id__in=usuarios_ids)
+    conteos = dict(pendientes.values('usuario_id').annotate(total=Count('id')).values_list('usuario_id', 'total'))
+    bandejas = BandejaNotificaciones.objects.all()
+    if usuarios_ids is not None:
+        bandejas = bandejas.filter(usuario_id__in=usuarios_ids)
+    with transaction.atomic():
+        bandejas.exclude(usuario_id__in=conteos).update(no_leidas=0)
+        BandejaNotificaciones.objects.bulk_create(
+            [BandejaNotificaciones(usuario_id=usuario_id) for usuario_id in conteos],
+            ignore_conflicts=True,
+        )
+        for usuario_id, total in conteos.items():
+            BandejaNotificaciones.objects.filter(usuario_id=usuario_id).update(no_leidas=total)
+    return len(conteos)
+
+
+# ===== RETENCIÓN Y RESÚMENES =====
+
+USUARIOS_POR_TANDA = 100
+
+
+def _mensaje_resumen(cantidad, nombre_tienda, dia):
+    novedades = "novedad" if cantidad == 1 else "novedades"
+    if nombre_tienda is None:
+        return f"{cantidad} {novedades} del {dia:%d/%m/%Y}"
+    return f"{cantidad} {novedades} de {nombre_tienda} el {dia:%d/%m/%Y}"
+
+
+def compactar_leidas(antes_de, lote=TAMANO_LOTE):
+    """
+    Reemplaza las notificaciones leídas anteriores a `antes_de` por una
+    notificación 'resumen' por usuario, tienda y día. Trabaja por tandas de
+    usuarios; cada tanda crea sus resúmenes y borra los originales en una
+    transacción. Devuelve (resúmenes creados, notificaciones borradas).
+    """
+    viejas = Notificacion.objects.filter(leida=True, fecha_creacion__lt=antes_de).exclude(tipo='resumen')
+    creados = borradas = 0
+    ultimo_usuario = 0
+    while True:
+        usuarios = list(
+            viejas.filter(usuario_id__gt=ultimo_usuario).order_by('usuario_id')
+            .values_list('usuario_id', flat=True).distinct()[:USUARIOS_POR_TANDA]
+        )
+        if not usuarios:
+            break
+        ultimo_usuario = usuarios[-1]
+
+        grupos, ids = {}, []
+        filas = viejas.filter(usuario_id__in=usuarios).order_by('id').values_list('id', 'usuario_id', 'tienda_id', 'fecha_creacion')
+        for pk, usuario_id, tienda_id, fecha in filas.iterator(chunk_size=lote):
+            clave = (usuario_id, tienda_id, timezone.localtime(fecha).date())
+            cantidad, ultima = grupos.get(clave, (0, fecha))
+            grupos[clave] = (cantidad + 1, max(ultima, fecha))
+            ids.append(pk)
+
+        nombres = dict(Tienda.objects.filter(pk__in={tienda_id for _, tienda_id, _ in grupos}).values_list('pk', 'nombre'))
+        resumenes = [
+            Notificacion(
+                usuario_id=usuario_id,
+                tienda_id=tienda_id,
+                tipo='resumen',
+                mensaje=_mensaje_resumen(cantidad, nombres.get(tienda_id), dia),
+                leida=True,
+                fecha_creacion=ultima,
+            )
+            for (usuario_id, tienda_id, dia), (cantidad, ultima) in grupos.items()
+        ]
+        with transaction.atomic():
+            Notificacion.objects.bulk_create(resumenes, batch_size=lote)
+            for i in range(0, len(ids), lote):
+                Notificacion.objects.filter(pk__in=ids[i:i + lote]).delete()
+        creados += len(resumenes)
+        borradas += len(ids)
+        logger.info("Compactadas %s notificaciones en %s resúmenes", len(ids), len(resumenes))
+    return creados, borradas
+
+
+def _borrar_en_lotes(queryset, lote, antes_de_borrar=None):
+    """
+    Borra `queryset` de a `lote` filas por id y devuelve cuántas borró.
+    `antes_de_borrar(filas)` corre en la misma transacción que cada DELETE:
+    si el proceso se corta a la mitad, los lotes ya borrados dejaron sus
+    contadores corregidos.
+    """
+    borradas = 0
+    while True:
+        ids = list(queryset.order_by('fecha_creacion', 'id').values_list('id', flat=True)[:lote])
+        if not ids:
+            return borradas
+        filas = queryset.model.objects.filter(pk__in=ids)
+        with transaction.atomic():
+            if antes_de_borrar is not None:
+                antes_de_borrar(filas)
+            borradas += filas.delete()[1].get(queryset.model._meta.label, 0)
+
+
+def _dar_por_leidos(eventos):
+    """Los eventos pull que se borran dejan de contar como no leídos para los seguidores de su tienda."""
+    ultimos = eventos.filter(modo='pull').values('tienda_id').annotate(numero=Max('numero'))
+    for fila in ultimos:
+        Seguimiento.objects.filter(tienda_id=fila['tienda_id'], eventos_leidos__lt=fila['numero']).update(
+            eventos_leidos=fila['numero']
+        )
+
+
+def purgar_anteriores(antes_de, lote=TAMANO_LOTE):
+    """
+    Borra en lotes las notificaciones y los eventos pull anteriores a `antes_de`;
+    cada lote descuenta en su transacción las notificaciones sin leer de los
+    contadores y da por leídos sus eventos. Devuelve (notificaciones borradas,
+    eventos borrados).
+    """
+    borradas = _borrar_en_lotes(
+        Notificacion.objects.filter(fecha_creacion__lt=antes_de), lote, descontar_no_leidas
+    )
+    # Los envíos sin terminar se conservan: todavía pueden reanudarse
+    eventos = EnvioNotificacion.objects.filter(fecha_creacion__lt=antes_de, estado__in=('completado', 'fallido'))
+    return borradas, _borrar_en_lotes(eventos, lote, _dar_por_leidos)
+
+
+def reanudar_envios(incluir_en_proceso=False):
+    """Procesa en el proceso actual los envíos pendientes o fallidos (p.ej. tras un reinicio)."""
+    estados = ['pendiente', 'fallido']
+    if incluir_en_proceso:
+        EnvioNotificacion.objects.filter(estado='en_proceso').update(estado='pendiente')
+    ids = list(EnvioNotificacion.objects.filter(estado__in=estados).order_by('fecha_creacion').values_list('pk', flat=True))
+    return [procesar_envio(envio_id) for envio_id in ids]
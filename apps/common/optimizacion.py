@@ -0,0 +1,108 @@
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_camel_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode, get_named_type
+
+
+def campos_seleccionados(info, nodos):
+    """Agrupa por nombre los campos pedidos en los nodos, expandiendo fragmentos."""
+    campos = {}
+
+    def recorrer(selection_set):
+        if selection_set is None:
+            return
+        for seleccion in selection_set.selections:
+            if isinstance(seleccion, FieldNode):
+                campos.setdefault(seleccion.name.value, []).append(seleccion)
+            elif isinstance(seleccion, FragmentSpreadNode):
+                recorrer(info.fragments[seleccion.name.value].selection_set)
+            elif isinstance(seleccion, InlineFragmentNode):
+                recorrer(seleccion.selection_set)
+
+    for nodo in nodos:
+        recorrer(nodo.selection_set)
+    return campos
+
+
+def _campos_modelo(modelo):
+    campos = {}
+    for campo in modelo._meta.get_fields():
+        if campo.auto_created and not campo.concrete:
+            nombre = campo.get_accessor_name()  # relaciones inversas
+        else:
+            nombre = campo.name
+        campos[to_camel_case(nombre)] = (nombre, campo)
+    return campos
+
+
+def _proyeccion(modelo, tipo, info, nodos, prefijo='', extra=()):
+    graphene_tipo = getattr(tipo, 'graphene_type', None)
+    requeridos = getattr(graphene_tipo, 'campos_requeridos', {})
+    campos = _campos_modelo(modelo)
+
+    # La PK y las claves foráneas siempre: son angostas y las usan los resolvers (loaders, urls)
+    only = [prefijo + modelo._meta.pk.name]
+    only += [prefijo + campo.name for campo in modelo._meta.concrete_fields if campo.is_relation]
+    only += [prefijo + campo for campo in extra]
+    select, prefetch = [], []
+
+    for nombre_gql, sub_nodos in campos_seleccionados(info, nodos).items():
+        for ruta in requeridos.get(nombre_gql, ()):
+            only.append(prefijo + ruta)
+            if '__' in ruta:
+                select.append(prefijo + ruta.rsplit('__', 1)[0])
+
+        if nombre_gql not in campos:
+            continue
+        nombre, campo = campos[nombre_gql]
+        if not campo.is_relation:
+            only.append(prefijo + nombre)
+            continue
+        if hasattr(graphene_tipo, f'resolve_{nombre}'):
+            continue  # El resolver del tipo ya carga la relación
+
+        sub_tipo = get_named_type(tipo.fields[nombre_gql].type)
+        if campo.concrete and (campo.many_to_one or campo.one_to_one):
+            sub_only, sub_select, sub_prefetch = _proyeccion(
+                campo.related_model, sub_tipo, info, sub_nodos, prefijo + nombre + '__'
+            )
+            only += sub_only
+            select += [prefijo + nombre] + sub_select
+            prefetch += sub_prefetch
+        else:
+            sub_qs = optimizar_queryset(campo.related_model._default_manager.all(), info, sub_nodos, sub_tipo)
+            prefetch.append(Prefetch(prefijo + nombre, queryset=sub_qs))
+
+    return only, select, prefetch
+
+
+def optimizar_queryset(queryset, info, nodos=None, tipo=None, extra=()):
+    """
+    Ajusta el queryset a la selección de la consulta GraphQL: .only() con las
+    columnas pedidas, select_related() para FKs y prefetch_related() para
+    relaciones inversas y ManyToMany. Se aplica antes de paginar.
+
+    Los campos calculados del tipo (p.ej. `url`) declaran las columnas que
+    necesitan en `campos_requeridos = {"url": ["archivo"]}`; `extra` agrega
+    columnas que necesita quien llama (p.ej. las del orden de paginación).
+    """
+    nodos = info.field_nodes if nodos is None else nodos
+    tipo = tipo or get_named_type(info.return_type)
+    only, select, prefetch = _proyeccion(queryset.model, tipo, info, nodos, extra=extra)
+    queryset = queryset.only(*only)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def optimizar_conexion(queryset, info, orden):
+    """optimizar_queryset para un campo Relay: proyecta sobre `edges { node { ... } }`."""
+    tipo_conexion = get_named_type(info.return_type)
+    tipo_edge = get_named_type(tipo_conexion.fields['edges'].type)
+    edges = campos_seleccionados(info, info.field_nodes).get('edges', [])
+    nodos = campos_seleccionados(info, edges).get('node', [])
+    return optimizar_queryset(
+        queryset, info, nodos, get_named_type(tipo_edge.fields['node'].type),
+        extra=[campo.lstrip('-') for campo in orden],
+    )
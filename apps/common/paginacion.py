@@ -0,0 +1,102 @@
+import base64
+import json
+from graphene.relay import PageInfo
+from graphql import GraphQLError
+from django.db.models import Q
+
+POR_DEFECTO = 20
+MAXIMO = 100
+
+
+def codificar_cursor(valores):
+    return base64.urlsafe_b64encode(json.dumps(valores, default=str).encode()).decode()
+
+
+def decodificar_cursor(cursor, campos):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            raise ValueError
+        return [campo.to_python(valor) for campo, valor in zip(campos, valores)]
+    except Exception:
+        raise GraphQLError("Cursor inválido")
+
+
+def _filtro_keyset(nombres, descendentes, valores, hacia_adelante):
+    """
+    (a, b) > (va, vb) expandido a OR de prefijos iguales, respetando la
+    dirección de cada columna: a > va OR (a = va AND b > vb).
+    """
+    condicion = Q()
+    for i, nombre in enumerate(nombres):
+        menor = descendentes[i] == hacia_adelante
+        paso = Q(**{f"{nombre}__{'lt' if menor else 'gt'}": valores[i]})
+        for anterior, valor in zip(nombres[:i], valores[:i]):
+            paso &= Q(**{anterior: valor})
+        condicion |= paso
+    return condicion
+
+
+class Pagina:
+    def __init__(self, filas, cursores, hay_siguiente, hay_anterior, nodo=None):
+        self.filas = filas
+        self.nodos = [nodo(fila) for fila in filas] if nodo else filas
+        self.cursores = cursores
+        self.hay_siguiente = hay_siguiente
+        self.hay_anterior = hay_anterior
+
+    def conexion(self, tipo):
+        return tipo(
+            edges=[tipo.Edge(node=nodo, cursor=cursor) for nodo, cursor in zip(self.nodos, self.cursores)],
+            page_info=PageInfo(
+                has_next_page=self.hay_siguiente,
+                has_previous_page=self.hay_anterior,
+                start_cursor=self.cursores[0] if self.cursores else None,
+                end_cursor=self.cursores[-1] if self.cursores else None,
+            ),
+        )
+
+
+def paginar(queryset, orden, first=None, after=None, last=None, before=None, nodo=None):
+    """
+    Paginación por keyset (sin OFFSET) al estilo Relay. `orden` son los campos
+    de ordenamiento y el último debe ser único, p.ej. ('-fechaCreacion', '-id').
+    El cursor guarda los valores de esas columnas de la última fila, así que
+    cualquier página cuesta lo mismo si existe un índice sobre ellas.
+    `nodo` transforma cada fila en el nodo devuelto (p.ej. favorito -> producto).
+    """
+    if (first is not None and first < 0) or (last is not None and last < 0):
+        raise GraphQLError("first y last deben ser positivos.")
+
+    nombres = [c.lstrip('-') for c in orden]
+    descendentes = [c.startswith('-') for c in orden]
+    campos = [queryset.model._meta.get_field(nombre) for nombre in nombres]
+
+    hacia_adelante = last is None or first is not None
+    solicitado = first if hacia_adelante else last
+    cantidad = POR_DEFECTO if solicitado is None else min(solicitado, MAXIMO)
+
+    if after:
+        queryset = queryset.filter(_filtro_keyset(nombres, descendentes, decodificar_cursor(after, campos), True))
+    if before:
+        queryset = queryset.filter(_filtro_keyset(nombres, descendentes, decodificar_cursor(before, campos), False))
+
+    if hacia_adelante:
+        filas = list(queryset.order_by(*orden)[:cantidad + 1])
+    else:
+        invertido = [c[1:] if c.startswith('-') else f"-{c}" for c in orden]
+        filas = list(queryset.order_by(*invertido)[:cantidad + 1])
+
+    hay_mas = len(filas) > cantidad
+    filas = filas[:cantidad]
+    if not hacia_adelante:
+        filas.reverse()
+
+    cursores = [codificar_cursor([getattr(fila, nombre) for nombre in nombres]) for fila in filas]
+    return Pagina(
+        filas,
+        cursores,
+        hay_siguiente=hay_mas if hacia_adelante else bool(before),
+        hay_anterior=hay_mas if not hacia_adelante else bool(after),
+        nodo=nodo,
+    )
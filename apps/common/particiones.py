@@ -0,0 +1,146 @@
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime, time
+from django.db import connection, transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from apps.common.models.log import UserLog
+
+logger = logging.getLogger(__name__)
+
+TABLA = UserLog._meta.db_table
+DEFAULT = f"{TABLA}_default"
+
+
+def inicio_mes(fecha, meses=0):
+    """Primer día del mes de `fecha` desplazado `meses` meses."""
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nombre_particion(mes):
+    return f"{TABLA}_p{mes:%Y%m}"
+
+
+def _limite(mes):
+    return timezone.make_aware(datetime.combine(mes, time.min), timezone.get_default_timezone())
+
+
+def es_particionada():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = %s",
+            [TABLA],
+        )
+        return cursor.fetchone() is not None
+
+
+def particiones():
+    """Particiones mensuales existentes como {mes: nombre}."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT hijo.relname FROM pg_inherits
+            JOIN pg_class padre ON padre.oid = pg_inherits.inhparent
+            JOIN pg_class hijo ON hijo.oid = pg_inherits.inhrelid
+            WHERE padre.relname = %s
+            """,
+            [TABLA],
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+    prefijo = f"{TABLA}_p"
+    return {
+        datetime.strptime(nombre[len(prefijo):], '%Y%m').date(): nombre
+        for nombre in nombres if nombre.startswith(prefijo)
+    }
+
+
+def crear_particion(mes, cursor):
+    nombre, siguiente = nombre_particion(mes), inicio_mes(mes, 1)
+    # Si ya hay filas de ese mes en la partición DEFAULT, Postgres no deja crear
+    # la partición: se desengancha DEFAULT, se crea y se mueven las filas.
+    cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {DEFAULT}')
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {nombre} PARTITION OF {TABLA} FOR VALUES FROM (%s) TO (%s)',
+        [_limite(mes), _limite(siguiente)],
+    )
+    cursor.execute(
+        f'''WITH movidas AS (
+                DELETE FROM {DEFAULT} WHERE "fechaHora" >= %s AND "fechaHora" < %s RETURNING *
+            ) INSERT INTO {TABLA} SELECT * FROM movidas''',
+        [_limite(mes), _limite(siguiente)],
+    )
+    cursor.execute(f'ALTER TABLE {TABLA} ATTACH PARTITION {DEFAULT} DEFAULT')
+
+
+def crear_particiones(meses_adelante=3, desde=None):
+    """Asegura las particiones desde `desde` (o el mes actual) hasta `meses_adelante` meses."""
+    if not es_particionada():
+        return []
+    existentes = particiones()
+    primero = inicio_mes(desde or timezone.localdate())
+    ultimo = inicio_mes(timezone.localdate(), meses_adelante)
+    creadas = []
+    mes = primero
+    while mes <= ultimo:
+        if mes not in existentes:
+            with transaction.atomic(), connection.cursor() as cursor:
+                crear_particion(mes, cursor)
+            creadas.append(nombre_particion(mes))
+        mes = inicio_mes(mes, 1)
+    return creadas
+
+
+def _archivar(filas, ruta):
+    """Escribe las filas en JSONL comprimido; el archivo aparece recién al terminar."""
+    temporal = f"{ruta}.parcial"
+    cantidad = 0
+    with gzip.open(temporal, 'wt', encoding='utf-8') as archivo:
+        for fila in filas:
+            archivo.write(json.dumps(fila, default=str, ensure_ascii=False) + '\n')
+            cantidad += 1
+    os.replace(temporal, ruta)
+    return cantidad
+
+
+def archivar_anteriores(corte, destino, simular=False):
+    """
+    Archiva en `destino` los logs de los meses anteriores a `corte` (un
+    archivo userlog-AAAA-MM.jsonl.gz por mes) y los quita de la base: con
+    particiones se desengancha y borra la partición entera; sin ellas (o si
+    las filas del mes quedaron en DEFAULT), se borra por rango de fechas.
+    """
+    corte = inicio_mes(corte)
+    os.makedirs(destino, exist_ok=True)
+    resultado = []
+    existentes = {}
+
+    # Meses con filas; con particiones, también los que quedaron en DEFAULT por no tener la suya
+    anteriores = UserLog.objects.filter(fechaHora__lt=_limite(corte)).annotate(mes=TruncMonth('fechaHora'))
+    meses = {fecha.date() for fecha in anteriores.values_list('mes', flat=True).distinct()}
+    if es_particionada():
+        existentes = particiones()
+        meses |= {mes for mes in existentes if inicio_mes(mes, 1) <= corte}
+    meses = sorted(meses)
+
+    for mes in meses:
+        rango = UserLog.objects.filter(fechaHora__gte=_limite(mes), fechaHora__lt=_limite(inicio_mes(mes, 1)))
+        ruta = os.path.join(destino, f"userlog-{mes:%Y-%m}.jsonl.gz")
+        if simular:
+            resultado.append((mes, rango.count(), ruta))
+            continue
+        cantidad = _archivar(rango.order_by('fechaHora', 'id').values().iterator(chunk_size=2000), ruta)
+        with transaction.atomic():
+            if mes in existentes:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {nombre_particion(mes)}')
+                    cursor.execute(f'DROP TABLE {nombre_particion(mes)}')
+            else:
+                rango.delete()
+        logger.info("Logs de %s archivados en %s (%s filas)", f"{mes:%Y-%m}", ruta, cantidad)
+        resultado.append((mes, cantidad, ruta))
+    return resultado
@@ -0,0 +1,94 @@
+import base64
+import binascii
+import uuid
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from graphql import GraphQLError
+
+TAMANO_MAXIMO = getattr(settings, 'IMAGENES_TAMANO_MAXIMO', 10 * 1024 * 1024)
+# Caracteres base64 por bloque (múltiplo de 4): ~48 KB decodificados por escritura
+BLOQUE = 64 * 1024
+
+# Firma de los primeros bytes -> (extensión, content type)
+FIRMAS = (
+    (b'\xff\xd8\xff', ('jpg', 'image/jpeg')),
+    (b'\x89PNG\r\n\x1a\n', ('png', 'image/png')),
+    (b'GIF87a', ('gif', 'image/gif')),
+    (b'GIF89a', ('gif', 'image/gif')),
+)
+
+
+def detectar_tipo(cabecera):
+    """(extensión, content type) según los bytes iniciales, o None si no es una imagen admitida."""
+    if cabecera[:4] == b'RIFF' and cabecera[8:12] == b'WEBP':
+        return 'webp', 'image/webp'
+    for firma, tipo in FIRMAS:
+        if cabecera.startswith(firma):
+            return tipo
+    return None
+
+
+def _error_tamano(maximo):
+    legible = f"{maximo // (1024 * 1024)} MB" if maximo >= 1024 * 1024 else f"{maximo // 1024} KB"
+    return GraphQLError(f"La imagen supera el tamaño máximo de {legible}.")
+
+
+def decodificar_base64(datos, maximo=TAMANO_MAXIMO):
+    """
+    Decodifica una imagen en base64 (con o sin prefijo data:...;base64,) por
+    bloques a un archivo temporal, sin armar nunca el binario completo en
+    memoria. Corta apenas se pasa de `maximo` bytes y decide el tipo por el
+    contenido, no por el prefijo.
+    """
+    inicio = datos.find(';base64,')
+    inicio = inicio + len(';base64,') if inicio != -1 else 0
+
+    archivo = TemporaryUploadedFile('imagen', 'application/octet-stream', 0, None)
+    escritos = 0
+    resto = ''
+    cabecera = b''
+    try:
+        for posicion in range(inicio, len(datos), BLOQUE):
+            # Algunos clientes cortan el base64 en líneas: se ignoran los espacios
+            bloque = resto + ''.join(datos[posicion:posicion + BLOQUE].split())
+            completo = len(bloque) - len(bloque) % 4
+            bloque, resto = bloque[:completo], bloque[completo:]
+            binario = base64.b64decode(bloque, validate=True)
+            escritos += len(binario)
+            if escritos > maximo:
+                raise _error_tamano(maximo)
+            if len(cabecera) < 12:
+                cabecera += binario[:12 - len(cabecera)]
+            archivo.write(binario)
+        if resto:
+            raise binascii.Error
+    except (binascii.Error, ValueError):
+        archivo.close()
+        raise GraphQLError("La imagen en base64 no es válida.")
+    except GraphQLError:
+        archivo.close()
+        raise
+
+    tipo = detectar_tipo(cabecera)
+    if tipo is None:
+        archivo.close()
+        raise GraphQLError("Formato de imagen no soportado. Use JPEG, PNG, WebP o GIF.")
+    extension, content_type = tipo
+    archivo.name = f"{uuid.uuid4()}.{extension}"
+    archivo.content_type = content_type
+    archivo.size = escritos
+    archivo.seek(0)
+    return archivo
+
+
+def validar_subida(archivo, maximo=TAMANO_MAXIMO):
+    """Valida tamaño y tipo real de un archivo subido por multipart (Upload)."""
+    if archivo.size > maximo:
+        raise _error_tamano(maximo)
+    archivo.seek(0)
+    tipo = detectar_tipo(archivo.read(12))
+    archivo.seek(0)
+    if tipo is None:
+        raise GraphQLError("Formato de imagen no soportado. Use JPEG, PNG, WebP o GIF.")
+    archivo.content_type = tipo[1]
+    return archivo
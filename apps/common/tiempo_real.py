@@ -0,0 +1,138 @@
+import json
+import logging
+import select
+import threading
+import time
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CANAL = 'notificaciones'
+# NOTIFY acepta hasta 8000 bytes por mensaje: los ids se mandan en tandas
+IDS_POR_MENSAJE = 500
+
+
+class PubSubMemoria:
+    """
+    Pub/sub dentro del proceso: entrega cada mensaje a las suscripciones
+    locales. Alcanza con un solo proceso y es el que se usa en los tests.
+    """
+
+    def __init__(self):
+        self._suscripciones = {}
+        self._lock = threading.Lock()
+
+    def suscribir(self, canal, callback):
+        """Registra `callback(mensaje)` en `canal` y devuelve la función que cancela la suscripción."""
+        with self._lock:
+            self._suscripciones.setdefault(canal, set()).add(callback)
+
+        def cancelar():
+            with self._lock:
+                self._suscripciones.get(canal, set()).discard(callback)
+        return cancelar
+
+    def publicar(self, canal, mensaje):
+        self._entregar(canal, mensaje)
+
+    def _entregar(self, canal, mensaje):
+        with self._lock:
+            callbacks = list(self._suscripciones.get(canal, ()))
+        for callback in callbacks:
+            try:
+                callback(mensaje)
+            except Exception:
+                logger.exception("Error entregando un mensaje de %s", canal)
+
+
+class PubSubPostgres(PubSubMemoria):
+    """
+    Pub/sub entre procesos con LISTEN/NOTIFY de Postgres. Cada proceso abre
+    una conexión dedicada que escucha los canales con suscripciones locales.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._canales = set()
+        self._hilo = None
+        self._conexion = None
+
+    def suscribir(self, canal, callback):
+        cancelar = super().suscribir(canal, callback)
+        with self._lock:
+            if canal not in self._canales:
+                self._canales.add(canal)
+                if self._conexion is not None:
+                    self._listen(canal)
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._escuchar, name='pubsub-postgres', daemon=True)
+                self._hilo.start()
+        return cancelar
+
+    def publicar(self, canal, mensaje):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [canal, json.dumps(mensaje)])
+
+    def _listen(self, canal):
+        with self._conexion.cursor() as cursor:
+            cursor.execute(f'LISTEN "{canal}"')
+
+    def _conectar(self):
+        base = connections['default']
+        conexion = base.get_new_connection(base.get_connection_params())
+        conexion.autocommit = True
+        with self._lock:
+            self._conexion = conexion
+            for canal in self._canales:
+                self._listen(canal)
+        return conexion
+
+    def _escuchar(self):
+        while True:
+            try:
+                conexion = self._conectar()
+                while True:
+                    if select.select([conexion], [], [], 5) == ([], [], []):
+                        continue
+                    conexion.poll()
+                    while conexion.notifies:
+                        aviso = conexion.notifies.pop(0)
+                        self._entregar(aviso.channel, json.loads(aviso.payload))
+            except Exception:
+                logger.exception("Se perdió la conexión LISTEN; reintentando")
+                with self._lock:
+                    self._conexion = None
+                time.sleep(1)
+
+
+_pubsub = None
+_pubsub_lock = threading.Lock()
+
+
+def obtener_pubsub():
+    global _pubsub
+    if _pubsub is None:
+        with _pubsub_lock:
+            if _pubsub is None:
+                _pubsub = import_string(settings.TIEMPO_REAL_BACKEND)()
+    return _pubsub
+
+
+def _publicar_al_confirmar(mensaje):
+    # Los suscriptores leen la base al recibir el aviso: publicar antes del
+    # commit les haría buscar filas que todavía no ven.
+    transaction.on_commit(lambda: obtener_pubsub().publicar(CANAL, mensaje))
+
+
+def avisar_usuarios(usuarios_ids):
+    """Avisa que los usuarios tienen notificaciones nuevas."""
+    usuarios_ids = list(usuarios_ids)
+    for i in range(0, len(usuarios_ids), IDS_POR_MENSAJE):
+        _publicar_al_confirmar({'usuarios': usuarios_ids[i:i + IDS_POR_MENSAJE]})
+
+
+def avisar_tienda(tienda_id):
+    """Avisa a los seguidores de la tienda que hay un evento pull nuevo."""
+    _publicar_al_confirmar({'tienda': tienda_id})
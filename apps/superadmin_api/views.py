@@ -1,3 +1,6 @@
-from django.shortcuts import render
+from graphene_django.views import GraphQLView
+from apps.common.consultas_persistidas import ConsultasPersistidasMixin
 
-# Create your views here.
+
+class SuperadminGraphQLView(ConsultasPersistidasMixin, GraphQLView):
+    nombre_registro = 'superadmin'
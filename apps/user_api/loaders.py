@@ -0,0 +1,149 @@
+from collections import defaultdict
+from apps.common.models import CustomUser, Categoria, Producto, Tienda, Imagen
+from apps.common.models.favoritos import Favorito
+from apps.common.models.seguir import Seguimiento
+from apps.common.models.notificacion import Notificacion
+from apps.common.optimizacion import optimizar_conexion
+from apps.common.paginacion import paginar
+
+
+# Las vistas GraphQL se ejecutan de forma síncrona, así que no hay event loop que
+# agrupe los .load() como en un DataLoader clásico. En su lugar, cada resolver de
+# lista "encola" las claves de los objetos que devuelve y el primer .load() que
+# falla en caché trae de una vez todas las claves pendientes.
+class Loader:
+    def __init__(self, registro, cargar_lote, default=None):
+        self.registro = registro
+        self.cargar_lote = cargar_lote
+        self.default = default
+        self.cache = {}
+        self.pendientes = set()
+
+    def encolar(self, clave):
+        if clave is not None and clave not in self.cache:
+            self.pendientes.add(clave)
+
+    def load(self, clave):
+        if clave is None:
+            return self.default
+        if clave not in self.cache:
+            self.pendientes.add(clave)
+            claves = list(self.pendientes)
+            self.pendientes.clear()
+            resultados = self.cargar_lote(claves)
+            for c in claves:
+                self.cache[c] = resultados.get(c, self.default)
+            # Encolar las relaciones de lo recién cargado para el siguiente nivel
+            for valor in resultados.values():
+                self.registro.encolar(valor if isinstance(valor, list) else [valor])
+        return self.cache[clave]
+
+
+def por_id(modelo):
+    def cargar_lote(ids):
+        return modelo.objects.in_bulk(ids)
+    return cargar_lote
+
+
+def por_relacion(modelo, campo, orden=None):
+    def cargar_lote(ids):
+        qs = modelo.objects.filter(**{f"{campo}__in": ids})
+        if orden:
+            qs = qs.order_by(*orden)
+        agrupados = defaultdict(list)
+        for obj in qs:
+            agrupados[getattr(obj, f"{campo}_id")].append(obj)
+        return agrupados
+    return cargar_lote
+
+
+def por_m2m(through, origen, destino):
+    def cargar_lote(ids):
+        filas = through.objects.filter(**{f"{origen}_id__in": ids}).select_related(destino)
+        agrupados = defaultdict(list)
+        for fila in filas:
+            agrupados[getattr(fila, f"{origen}_id")].append(getattr(fila, destino))
+        return agrupados
+    return cargar_lote
+
+
+class Loaders:
+    """Loaders de un request: uno por cada relación expuesta en apps/user_api/types.py"""
+
+    def __init__(self):
+        ProductoCategoria = Producto.categoria.through
+
+        # Claves foráneas
+        self.usuario = Loader(self, por_id(CustomUser))
+        self.tienda = Loader(self, por_id(Tienda))
+        self.producto = Loader(self, por_id(Producto))
+        self.categoria = Loader(self, por_id(Categoria))
+
+        # Relaciones inversas y ManyToMany (devuelven listas)
+        self.categorias_producto = Loader(self, por_m2m(ProductoCategoria, 'producto', 'categoria'), default=[])
+        self.productos_categoria = Loader(self, por_m2m(ProductoCategoria, 'categoria', 'producto'), default=[])
+        self.imagenes_producto = Loader(self, por_relacion(Imagen, 'producto', orden=('orden', 'id')), default=[])
+        self.productos_tienda = Loader(self, por_relacion(Producto, 'tienda'), default=[])
+        self.subcategorias = Loader(self, por_relacion(Categoria, 'categoriaPadre'), default=[])
+
+        # Qué claves encolar en cada loader según el tipo de objeto
+        self.relaciones = {
+            Producto: [
+                (self.tienda, 'tienda_id'),
+                (self.categorias_producto, 'id'),
+                (self.imagenes_producto, 'id'),
+            ],
+            Tienda: [
+                (self.usuario, 'propietario_id'),
+                (self.productos_tienda, 'id'),
+            ],
+            Categoria: [
+                (self.categoria, 'categoriaPadre_id'),
+                (self.subcategorias, 'id'),
+                (self.productos_categoria, 'id'),
+            ],
+            Imagen: [(self.producto, 'producto_id')],
+            Favorito: [(self.usuario, 'usuario_id'), (self.producto, 'producto_id')],
+            Seguimiento: [(self.usuario, 'usuario_id'), (self.tienda, 'tienda_id')],
+            Notificacion: [
+                (self.usuario, 'usuario_id'),
+                (self.tienda, 'tienda_id'),
+                (self.producto, 'producto_id'),
+            ],
+        }
+
+    def encolar(self, objetos):
+        for obj in objetos:
+            for loader, atributo in self.relaciones.get(type(obj), ()):
+                loader.encolar(getattr(obj, atributo))
+
+
+def obtener_loaders(info):
+    request = info.context
+    if request is None:
+        return Loaders()
+    loaders = getattr(request, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        request.loaders = loaders
+    return loaders
+
+
+def cargar_lista(info, objetos):
+    """Evalúa un queryset (o lista) y encola sus relaciones para cargarlas por lotes."""
+    objetos = list(objetos)
+    obtener_loaders(info).encolar(objetos)
+    return objetos
+
+
+def cargar_conexion(info, tipo, queryset, orden, nodo=None, **args):
+    """
+    Pagina por cursor un listado y devuelve la conexión Relay `tipo`, con la
+    selección proyectada y las relaciones de la página encoladas en los loaders.
+    Con `nodo` (fila -> objeto devuelto) no se proyecta el queryset.
+    """
+    if nodo is None:
+        queryset = optimizar_conexion(queryset, info, orden)
+    pagina = paginar(queryset, orden, nodo=nodo, **args)
+    cargar_lista(info, pagina.nodos)
+    return pagina.conexion(tipo)
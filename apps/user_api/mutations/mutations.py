@@ -1,18 +1,30 @@
 import graphene
 from graphql import GraphQLError
 from .utils_logs import log_mutation
+from apps.common.auditoria import registrar_log
+from apps.common.subidas import decodificar_base64, validar_subida
+from apps.common.importacion import FORMATOS, detectar_formato, importar_catalogo
+from apps.common import cache_respuestas, inventario
+from apps.common.inventario import recalcular_existencias
+from apps.common.notificaciones import (evento_de_usuario, como_notificacion, marcar_eventos_leidos,
+                                         marcar_leida, marcar_todas_leidas)
 from apps.common.models import (CustomUser,Tienda,Categoria,Producto,Variante,Imagen,
-                                Talla,
-                                UserLog,)
+                                Talla,)
 from apps.common.models.favoritos import Favorito
-from apps.user_api.types import SeguimientoType, Seguimiento, Notificacion, NotificacionType
+from apps.common.models.notificacion import EnvioNotificacion
+from apps.user_api.types import (SeguimientoType, Seguimiento, Notificacion, NotificacionType, ErrorImportacionType,
+                                 ItemReservaInput, ReservaStockType, CambioVarianteInput, ResultadoVarianteType)
 from ..auth import generate_jwt
+from apps.common.autenticacion import TTL_TOKEN_STREAM, generar_token_stream
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from django.contrib.auth import authenticate
 from functools import wraps
 from ..validador import validar_usuario_vendedor
-from django.core.files.base import ContentFile
 from graphene_file_upload.scalars import Upload
-import uuid
 
 def vendedor_required(func):
     @wraps(func)
@@ -57,7 +69,7 @@ class LoginUsuario(graphene.Mutation):
 
         if not user:
             # Registrar intento fallido
-            UserLog.objects.create(
+            registrar_log(
                 usuario=None,
                 tipoAccion="LOGIN",
                 rutaAcceso="/graphql/user/login",  # o la ruta exacta de tu endpoint
@@ -69,7 +81,7 @@ class LoginUsuario(graphene.Mutation):
             raise GraphQLError("Correo o contraseña incorrectos.")
 
         # Registrar login exitoso
-        UserLog.objects.create(
+        registrar_log(
             usuario=user,
             tipoAccion="LOGIN",
             rutaAcceso="/graphql/user/login",
@@ -276,6 +288,7 @@ class EliminarTienda(graphene.Mutation):
             tienda.estado = 'eliminada'
             tienda.save()
             tienda.productos.update(estado='inactivo')
+            cache_respuestas.invalidar(Producto)
             return EliminarTienda(ok=True, message="Tienda desactivada correctamente.")
         except Tienda.DoesNotExist:
             return EliminarTienda(ok=False, message="Tienda no encontrada.")
@@ -296,7 +309,7 @@ class CrearProducto(graphene.Mutation):
         tienda_id = graphene.Int(required=True)
         
     @vendedor_required
-    def mutate(self, info, nombre, descripcion, precioBase, categoria_ids, tienda_id):
+    def mutate(self, info, nombre, precioBase, categoria_ids, tienda_id, descripcion=None):
         user = info.context.user
         validar_usuario_vendedor(user)
 
@@ -314,29 +327,20 @@ class CrearProducto(graphene.Mutation):
         except Tienda.DoesNotExist:
             raise GraphQLError("El vendedor no tiene una tienda activa")
         
-        # Crear producto sin categorías primero
-        producto = Producto.objects.create(
-            nombre=nombre,
-            descripcion=descripcion,
-            precioBase=precioBase,
-            tienda=tienda,
-            estado='activo'
-        )
-        
-        # Asignar las categorías usando ManyToMany
-        producto.categoria.set(categorias)
-        
-        # Notificar a los seguidores de la subida de productos de la tienda
-        seguidores = Seguimiento.objects.filter(tienda=tienda)
-        for seguidor in seguidores:
-            Notificacion.objects.create(
-                usuario=seguidor.usuario,
+        # Crear producto sin categorías primero. Los seguidores se notifican en
+        # segundo plano (signal de Producto) recién al confirmar la transacción.
+        with transaction.atomic():
+            producto = Producto.objects.create(
+                nombre=nombre,
+                descripcion=descripcion,
+                precioBase=precioBase,
                 tienda=tienda,
-                producto=producto,
-                tipo='nuevo_producto',
-                mensaje=f"{tienda.nombre} ha añadido un nuevo producto: {producto.nombre}",
+                estado='activo'
             )
 
+            # Asignar las categorías usando ManyToMany
+            producto.categoria.set(categorias)
+
         return CrearProducto(ok=True, message="Producto creado correctamente", producto_id=producto.id)
 
 
@@ -401,6 +405,42 @@ class EliminarProducto(graphene.Mutation):
         producto.save()
         return EliminarProducto(ok=True, message="Producto eliminado.")
 
+class ImportarCatalogo(graphene.Mutation):
+    ok = graphene.Boolean()
+    message = graphene.String()
+    productos_creados = graphene.Int()
+    variantes_creadas = graphene.Int()
+    total_errores = graphene.Int()
+    errores = graphene.List(ErrorImportacionType)
+
+    class Arguments:
+        archivo = Upload(required=True)
+        formato = graphene.String()
+
+    @vendedor_required
+    def mutate(self, info, archivo, formato=None):
+        user = info.context.user
+        validar_usuario_vendedor(user)
+        try:
+            tienda = Tienda.objects.get(propietario=user, estado='activo')
+        except Tienda.DoesNotExist:
+            raise GraphQLError("El vendedor no tiene una tienda activa")
+
+        formato = (formato or detectar_formato(archivo.name) or '').lower()
+        if formato not in FORMATOS:
+            raise GraphQLError("Formato no soportado. Use un archivo .csv o .jsonl (o indique formato).")
+
+        resultado = importar_catalogo(tienda, archivo, formato)
+        return ImportarCatalogo(
+            ok=resultado.productos > 0 or resultado.total_errores == 0,
+            message=f"Importados {resultado.productos} productos y {resultado.variantes} variantes "
+                    f"({resultado.total_errores} con error).",
+            productos_creados=resultado.productos,
+            variantes_creadas=resultado.variantes,
+            total_errores=resultado.total_errores,
+            errores=[ErrorImportacionType(linea=linea, mensaje=mensaje) for linea, mensaje in resultado.errores],
+        )
+
 # ===== NUEVAS MUTACIONES DE VARIANTES =====
 
 class CrearVariante(graphene.Mutation):
@@ -464,7 +504,7 @@ class EditarVariante(graphene.Mutation):
     @vendedor_required
     def mutate(self, info, variante_id, talla_id=None, color=None, precio=None, stock=None):
         user = info.context.user
-        tienda = Tienda.objects.get(propiertario=user, estado="activo")
+        tienda = Tienda.objects.get(propietario=user, estado="activo")
 
         try:
             variante = Variante.objects.get(id=variante_id, producto__tienda=tienda)
@@ -488,6 +528,92 @@ class EditarVariante(graphene.Mutation):
         variante.save()
         return EditarVariante(ok=True, message="Variante actualizada correctamente.")
 
+MAXIMO_CAMBIOS_VARIANTES = 500
+
+class ActualizarVariantesMasivo(graphene.Mutation):
+    ok = graphene.Boolean()
+    message = graphene.String()
+    resultados = graphene.List(ResultadoVarianteType)
+
+    class Arguments:
+        cambios = graphene.List(graphene.NonNull(CambioVarianteInput), required=True)
+
+    @vendedor_required
+    def mutate(self, info, cambios):
+        user = info.context.user
+        if len(cambios) > MAXIMO_CAMBIOS_VARIANTES:
+            raise GraphQLError(f"Se admiten hasta {MAXIMO_CAMBIOS_VARIANTES} cambios por llamada.")
+
+        # Propiedad verificada una sola vez para todas las variantes
+        variantes = Variante.objects.filter(
+            id__in=[cambio.variante_id for cambio in cambios],
+            producto__tienda__propietario=user,
+            producto__tienda__estado="activo",
+        ).only('id', 'producto_id', 'precio', 'stock').in_bulk()
+
+        errores = {}
+        por_precio, por_stock, vistos = [], [], set()
+        for posicion, cambio in enumerate(cambios):
+            variante_id = cambio.variante_id
+            variante = variantes.get(variante_id)
+            if variante_id in vistos:
+                errores[posicion] = "Variante repetida en los cambios."
+            elif variante is None:
+                errores[posicion] = "Variante no encontrada."
+            elif cambio.precio is None and cambio.stock is None and cambio.ajuste_stock is None:
+                errores[posicion] = "No hay cambios para la variante."
+            elif cambio.stock is not None and cambio.ajuste_stock is not None:
+                errores[posicion] = "Use stock o ajusteStock, no ambos."
+            elif cambio.precio is not None and not 0 <= cambio.precio < 10 ** 8:
+                errores[posicion] = "El precio debe ser positivo."
+            elif cambio.stock is not None and cambio.stock < 0:
+                errores[posicion] = "El stock no puede ser negativo."
+            else:
+                if cambio.precio is not None:
+                    variante.precio = Decimal(str(cambio.precio)).quantize(Decimal('0.01'))
+                    por_precio.append(variante)
+                if cambio.stock is not None:
+                    variante.stock = cambio.stock
+                    por_stock.append(variante)
+                elif cambio.ajuste_stock is not None:
+                    variante.stock = Greatest(F('stock') + Value(cambio.ajuste_stock), Value(0))
+                    por_stock.append(variante)
+            vistos.add(variante_id)
+
+        # Un UPDATE por campo: las variantes que solo cambian precio no
+        # reescriben un stock leído antes (pisaría reservas concurrentes)
+        with transaction.atomic():
+            Variante.objects.bulk_update(por_precio, ['precio'], batch_size=MAXIMO_CAMBIOS_VARIANTES)
+            Variante.objects.bulk_update(por_stock, ['stock'], batch_size=MAXIMO_CAMBIOS_VARIANTES)
+            # bulk_update no dispara signals: agregados del producto y cache a mano
+            cache_respuestas.invalidar_existencias(Variante)
+            recalcular_existencias(Producto.objects.filter(
+                pk__in={variante.producto_id for variante in por_precio + por_stock}
+            ))
+
+        actuales = {
+            variante_id: (precio, stock)
+            for variante_id, precio, stock in Variante.objects.filter(
+                id__in=[variante.id for variante in por_precio + por_stock]
+            ).values_list('id', 'precio', 'stock')
+        }
+        resultados = []
+        for posicion, cambio in enumerate(cambios):
+            variante_id = cambio.variante_id
+            if posicion in errores:
+                resultados.append(ResultadoVarianteType(variante_id=variante_id, ok=False, mensaje=errores[posicion]))
+                continue
+            precio, stock = actuales[variante_id]
+            resultados.append(ResultadoVarianteType(
+                variante_id=variante_id, ok=True, mensaje="Variante actualizada.", precio=precio, stock=stock
+            ))
+        actualizadas = len(cambios) - len(errores)
+        return ActualizarVariantesMasivo(
+            ok=not errores,
+            message=f"{actualizadas} variantes actualizadas, {len(errores)} con error.",
+            resultados=resultados,
+        )
+
 class EliminarVariante(graphene.Mutation):
     ok = graphene.Boolean()
     message = graphene.String()
@@ -559,13 +685,14 @@ class SubirImagenVariante(graphene.Mutation):
 
     class Arguments:
         variante_id = graphene.Int(required=True)
-        imagen_base64 = graphene.String(required=True)
+        imagen_base64 = graphene.String()
+        archivo = Upload()
         nombre = graphene.String()
         es_principal = graphene.Boolean()
         orden = graphene.Int()
 
     @vendedor_required
-    def mutate(self, info, variante_id, imagen_base64, nombre=None, es_principal=False, orden=0):
+    def mutate(self, info, variante_id, imagen_base64=None, archivo=None, nombre=None, es_principal=False, orden=0):
         user = info.context.user
         tienda = Tienda.objects.get(propietario=user, estado="activo")
 
@@ -574,13 +701,15 @@ class SubirImagenVariante(graphene.Mutation):
         except Variante.DoesNotExist:
             raise GraphQLError("Variante no encontrada.")
 
+        if not imagen_base64 and not archivo:
+            raise GraphQLError("Debe enviar la imagen en imagenBase64 o en archivo (multipart).")
+        if imagen_base64 and archivo:
+            raise GraphQLError("Envíe la imagen en imagenBase64 o en archivo, no ambos.")
+
+        # Se decodifica por bloques a un archivo temporal: nunca se arma el binario en memoria
+        data = decodificar_base64(imagen_base64) if imagen_base64 else validar_subida(archivo)
+
         try:
-            # Decodificar imagen base64
-            format, imgstr = imagen_base64.split(';base64,')
-            ext = format.split('/')[-1]
-            filename = f"{uuid.uuid4()}.{ext}"
-            data = ContentFile(base64.b64decode(imgstr), name=filename)
-            
             # Si es principal, quitar el flag de las demás imágenes de la variante
             if es_principal:
                 Imagen.objects.filter(variante=variante, esPrincipal=True).update(esPrincipal=False)
@@ -601,6 +730,8 @@ class SubirImagenVariante(graphene.Mutation):
 
         except Exception as e:
             raise GraphQLError(f"Error al procesar la imagen: {str(e)}")
+        finally:
+            data.close()
 
 class EliminarImagen(graphene.Mutation):
     ok = graphene.Boolean()
@@ -628,10 +759,8 @@ class EliminarImagen(graphene.Mutation):
             if not imagen:
                 raise GraphQLError("Imagen no encontrada.")
             
-            # Eliminar archivo físico
-            if imagen.archivo:
-                imagen.archivo.delete()
-            
+            # El archivo (y sus versiones) se suelta al borrar la fila: el
+            # almacenamiento lo elimina si ninguna otra imagen o perfil lo usa
             imagen.delete()
             return EliminarImagen(ok=True, message="Imagen eliminada correctamente.")
 
@@ -765,16 +894,21 @@ class MarcarNotificacionLeida(graphene.Mutation):
         if user.is_anonymous:
             raise Exception("No autenticado")
 
+        # Los eventos de tiendas con muchos seguidores se marcan con la marca de lectura
+        try:
+            evento = evento_de_usuario(user, notificacion_id)
+        except EnvioNotificacion.DoesNotExist:
+            raise Exception("Notificación no encontrada")
+        if evento is not None:
+            marcar_eventos_leidos(user, evento.fecha_creacion)
+            return MarcarNotificacionLeida(ok=True, notificacion=como_notificacion(evento, user, evento.fecha_creacion))
+
         try:
             notif = Notificacion.objects.get(id=notificacion_id, usuario=user)
         except Notificacion.DoesNotExist:
             raise Exception("Notificación no encontrada")
 
-        if notif.leida:
-            return MarcarNotificacionLeida(ok=True, notificacion=notif)
-        
-        notif.leida = True
-        notif.save()
+        marcar_leida(user, notif)
         return MarcarNotificacionLeida(ok=True, notificacion=notif)
 
 
@@ -785,11 +919,69 @@ class MarcarTodasNotificacionesLeidas(graphene.Mutation):
     @login_required
     def mutate(self, info):
         user = info.context.user
-        actualizadas = Notificacion.objects.filter(usuario=user, leida=False).update(leida=True)
+        actualizadas = marcar_todas_leidas(user)
+        actualizadas += marcar_eventos_leidos(user)
         return MarcarTodasNotificacionesLeidas(ok=True, total=actualizadas)
+
+
+class TokenNotificaciones(graphene.Mutation):
+    """Token corto para abrir /eventos/notificaciones/?token= con EventSource."""
+    token = graphene.String()
+    expira_en = graphene.Int()
+
+    @login_required
+    def mutate(self, info):
+        return TokenNotificaciones(token=generar_token_stream(info.context.user), expira_en=TTL_TOKEN_STREAM)
     
     
 
+# ===== RESERVAS DE STOCK =====
+
+class ReservarStock(graphene.Mutation):
+    ok = graphene.Boolean()
+    message = graphene.String()
+    reserva = graphene.Field(ReservaStockType)
+
+    class Arguments:
+        items = graphene.List(graphene.NonNull(ItemReservaInput), required=True)
+
+    @login_required
+    def mutate(self, info, items):
+        user = info.context.user
+        try:
+            reserva = inventario.reservar(user, [(item.variante_id, item.cantidad) for item in items])
+        except ValueError as e:
+            raise GraphQLError(str(e))
+        except inventario.StockInsuficiente as e:
+            raise GraphQLError(f"Stock insuficiente para las variantes: {', '.join(map(str, e.variantes_ids))}.")
+        return ReservarStock(ok=True, message=f"Stock reservado hasta {timezone.localtime(reserva.expira):%H:%M}.", reserva=reserva)
+
+class ConfirmarReserva(graphene.Mutation):
+    ok = graphene.Boolean()
+    message = graphene.String()
+
+    class Arguments:
+        reserva_id = graphene.Int(required=True)
+
+    @login_required
+    def mutate(self, info, reserva_id):
+        if not inventario.confirmar(info.context.user, reserva_id):
+            raise GraphQLError("La reserva no existe, ya fue cerrada o venció.")
+        return ConfirmarReserva(ok=True, message="Reserva confirmada.")
+
+class LiberarReserva(graphene.Mutation):
+    ok = graphene.Boolean()
+    message = graphene.String()
+
+    class Arguments:
+        reserva_id = graphene.Int(required=True)
+
+    @login_required
+    def mutate(self, info, reserva_id):
+        if not inventario.liberar(info.context.user, reserva_id):
+            raise GraphQLError("La reserva no existe o ya fue cerrada.")
+        return LiberarReserva(ok=True, message="Reserva liberada.")
+
 # ===== MUTACIONES PRINCIPALES =====
 
 class MutationUser(graphene.ObjectType):
@@ -809,11 +1001,13 @@ class MutationUser(graphene.ObjectType):
     crear_producto = CrearProducto.Field()
     editar_producto = EditarProducto.Field()
     eliminar_producto = EliminarProducto.Field()
+    importar_catalogo = ImportarCatalogo.Field()
 
     # Nuevas mutaciones de variantes
     crear_variante = CrearVariante.Field()
     editar_variante = EditarVariante.Field()
     eliminar_variante = EliminarVariante.Field()
+    actualizar_variantes_masivo = ActualizarVariantesMasivo.Field()
 
     # Nuevas mutaciones de imágenes
     subir_imagen = SubirImagenProducto.Field()
@@ -830,4 +1024,11 @@ class MutationUser(graphene.ObjectType):
     dejar_seguir_tienda = DejarDeSeguirTienda.Field()
     
     # Nuevas mutaciones de Notificaciones
-    marcar_notificacion = MarcarNotificacionLeida.Field()
\ No newline at end of file
+    marcar_notificacion = MarcarNotificacionLeida.Field()
+    marcar_todas_notificaciones = MarcarTodasNotificacionesLeidas.Field()
+    token_notificaciones = TokenNotificaciones.Field()
+
+    # Reservas de stock
+    reservar_stock = ReservarStock.Field()
+    confirmar_reserva = ConfirmarReserva.Field()
+    liberar_reserva = LiberarReserva.Field()
@@ -1,69 +1,40 @@
 import inspect
 import asyncio
-from apps.common.models.log import UserLog
+from apps.common.auditoria import registrar_log
+
+def _datos_request(info):
+    user_agent = info.context.META.get("HTTP_USER_AGENT", "").lower()
+    return {
+        "usuario": info.context.user,
+        "tipoAccion": info.field_name.upper(),
+        "rutaAcceso": "/graphql",
+        "origenConexion": "mobile" if "mobile" in user_agent else "web",
+        "direccionIP": info.context.META.get("REMOTE_ADDR"),
+    }
 
 def log_mutation(func):
+    # Los logs se encolan y se escriben en lotes en segundo plano (apps/common/auditoria.py)
     if inspect.iscoroutinefunction(func):
         # Para funciones async
         async def async_wrapper(root, info, **kwargs):
-            user = info.context.user
-            user_agent = info.context.META.get("HTTP_USER_AGENT", "").lower()
-            origen = "mobile" if "mobile" in user_agent else "web"
-            ip = info.context.META.get("REMOTE_ADDR")
-            action = info.field_name.upper()
+            datos = _datos_request(info)
             try:
                 result = await func(root, info, **kwargs)
-                UserLog.objects.create(
-                    usuario=user if user.is_authenticated else None,
-                    tipoAccion=action,
-                    rutaAcceso="/graphql",
-                    origenConexion=origen,
-                    direccionIP=ip,
-                    resultado="exito",
-                    detalles={"args": kwargs},
-                )
+                registrar_log(resultado="exito", detalles={"args": kwargs}, **datos)
                 return result
             except Exception as e:
-                UserLog.objects.create(
-                    usuario=user if user.is_authenticated else None,
-                    tipoAccion=action,
-                    rutaAcceso="/graphql",
-                    origenConexion=origen,
-                    direccionIP=ip,
-                    resultado="fallo",
-                    detalles={"args": kwargs, "error": str(e)},
-                )
+                registrar_log(resultado="fallo", detalles={"args": kwargs, "error": str(e)}, **datos)
                 raise e
         return async_wrapper
     else:
         # Para funciones sync
         def sync_wrapper(root, info, **kwargs):
-            user = info.context.user
-            user_agent = info.context.META.get("HTTP_USER_AGENT", "").lower()
-            origen = "mobile" if "mobile" in user_agent else "web"
-            ip = info.context.META.get("REMOTE_ADDR")
-            action = info.field_name.upper()
+            datos = _datos_request(info)
             try:
                 result = func(root, info, **kwargs)
-                UserLog.objects.create(
-                    usuario=user if user.is_authenticated else None,
-                    tipoAccion=action,
-                    rutaAcceso="/graphql",
-                    origenConexion=origen,
-                    direccionIP=ip,
-                    resultado="exito",
-                    detalles={"args": kwargs},
-                )
+                registrar_log(resultado="exito", detalles={"args": kwargs}, **datos)
                 return result
             except Exception as e:
-                UserLog.objects.create(
-                    usuario=user if user.is_authenticated else None,
-                    tipoAccion=action,
-                    rutaAcceso="/graphql",
-                    origenConexion=origen,
-                    direccionIP=ip,
-                    resultado="fallo",
-                    detalles={"args": kwargs, "error": str(e)},
-                )
+                registrar_log(resultado="fallo", detalles={"args": kwargs, "error": str(e)}, **datos)
                 raise e
         return sync_wrapper
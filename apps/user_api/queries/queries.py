@@ -5,9 +5,16 @@ from apps.common.models import CustomUser, Categoria, Producto, Tienda, Imagen
 from apps.common.models.favoritos import Favorito
 from functools import wraps
 from .queriesProductos import QueryProductos
-from apps.common.models import Seguimiento, Notificacion
-from apps.user_api.types import SeguimientoType, NotificacionType
+from apps.common.models import Seguimiento, Notificacion, EnvioNotificacion
+from apps.user_api.types import SeguimientoType, NotificacionType, BusquedaProductosType, EnvioNotificacionType
 from apps.user_api.types import PerfilType,CategoriaType, ProductoType, TiendaType, ImagenType, SeguimientoType 
+from apps.user_api.types import ProductoConnection, CategoriaConnection, TiendaConnection, SeguimientoConnection, NotificacionConnection
+from apps.user_api.types import CatalogoType, FiltrosCatalogoInput, CategoriaNodoType
+from apps.user_api.loaders import cargar_lista, cargar_conexion
+from apps.common.optimizacion import optimizar_queryset, campos_seleccionados
+from apps.common import busqueda
+from apps.common.categorias import arbol_categorias, ids_subarbol
+from apps.common.notificaciones import pagina_feed, contador_no_leidas
 
 # Decorador para proteger queries que requieren autenticación
 def login_required(func):
@@ -34,45 +41,98 @@ def vendedor_required(func):
     return wrapper
 
 
+# Orden de los listados paginados por cursor (el último campo debe ser único)
+ORDEN_PRODUCTOS = ('-fechaCreacion', '-id')
+# Sobre el índice parcial producto_disponible_precio (se recorre en ambos sentidos)
+ORDEN_PRECIO = ('precioMinimo', 'id')
+ORDEN_PRECIO_DESCENDENTE = ('-precioMinimo', '-id')
+ORDEN_POR_ID = ('id',)
+ORDEN_SEGUIMIENTOS = ('-fecha_creacion', '-id')
+ORDEN_FAVORITOS = ('-fecha', '-id')
+
 # Clase principal de Queries
 class Query(QueryProductos,graphene.ObjectType):
     # --------- QUERIES PÚBLICAS ---------
-    categorias = graphene.List(CategoriaType)
-    productos = graphene.List(ProductoType)
-    buscar_productos = graphene.List(ProductoType, nombre=graphene.String(required=True))
-    productos = graphene.List(ProductoType, limit=graphene.Int(), offset=graphene.Int())
-    productos_por_categoria = graphene.List(ProductoType, categoria_id=graphene.Int(required=True))
-    productos_por_tipo = graphene.List(ProductoType, tipo=graphene.String(required=True))
-    tiendas = graphene.List(TiendaType)
+    categorias = graphene.relay.ConnectionField(CategoriaConnection)
+    arbol_categorias = graphene.List(CategoriaNodoType)
+    buscar_productos = graphene.Field(
+        BusquedaProductosType,
+        query=graphene.String(required=True),
+        limit=graphene.Int(default_value=20),
+        after=graphene.String(),
+    )
+    productos = graphene.relay.ConnectionField(ProductoConnection)
+    productos_disponibles = graphene.relay.ConnectionField(
+        ProductoConnection,
+        precio_descendente=graphene.Boolean(default_value=False),
+    )
+    productos_por_categoria = graphene.relay.ConnectionField(
+        ProductoConnection,
+        categoria_id=graphene.Int(required=True),
+        incluir_subcategorias=graphene.Boolean(default_value=False),
+    )
+    productos_por_tipo = graphene.relay.ConnectionField(ProductoConnection, tipo=graphene.String(required=True))
+    tiendas = graphene.relay.ConnectionField(TiendaConnection)
+    catalogo = graphene.Field(CatalogoType, filtros=FiltrosCatalogoInput())
     tienda_por_id = graphene.Field(TiendaType, tienda_id=graphene.Int(required=True))
 
-    def resolve_categorias(self, info):
-        return Categoria.objects.filter()
+    def resolve_categorias(self, info, **kwargs):
+        return cargar_conexion(info, CategoriaConnection, Categoria.objects.all(), ORDEN_POR_ID, **kwargs)
     
     def resolve_producto(self, info):
         from apps.common.models.producto import Producto
         return Producto.objects.get(id=id)
 
-    def resolve_productos(self, info, limit=None, offset=None):
-        queryset = Producto.objects.select_related('tienda', 'categoria').prefetch_related('imagenes').all()
-        if offset is not None:
-            queryset = queryset[offset:]
-        elif limit is not None:
-            queryset = queryset[:limit]
-        return queryset
+    def resolve_productos(self, info, **kwargs):
+        return cargar_conexion(info, ProductoConnection, Producto.objects.all(), ORDEN_PRODUCTOS, **kwargs)
+
+    def resolve_productos_disponibles(self, info, precio_descendente=False, **kwargs):
+        # Mismo predicado que el índice parcial: filtra y ordena sin recorrer la tabla
+        queryset = Producto.objects.filter(estado='activo', stockTotal__gt=0)
+        orden = ORDEN_PRECIO_DESCENDENTE if precio_descendente else ORDEN_PRECIO
+        return cargar_conexion(info, ProductoConnection, queryset, orden, **kwargs)
+
+    def resolve_buscar_productos(self, info, query, limit=20, after=None):
+        queryset = Producto.objects.filter(estado='activo')
+        nodos = campos_seleccionados(info, info.field_nodes).get('productos')
+        if nodos:
+            queryset = optimizar_queryset(queryset, info, nodos, info.schema.get_type('ProductoType'))
+        try:
+            productos, siguiente = busqueda.buscar_productos(queryset, query, limit, after)
+        except ValueError as e:
+            raise GraphQLError(str(e))
+        return BusquedaProductosType(
+            productos=cargar_lista(info, productos),
+            siguiente_cursor=siguiente,
+            hay_mas=siguiente is not None,
+        )
+
+    def resolve_arbol_categorias(self, info):
+        return arbol_categorias()
 
-    def resolve_buscar_productos(self, info, nombre):
-        return Producto.objects.select_related('tienda', 'categoria').prefetch_related('imagenes').filter(nombre__icontains=nombre, estado='activo')
+    def resolve_productos_por_categoria(self, info, categoria_id, incluir_subcategorias=False, **kwargs):
+        if incluir_subcategorias:
+            # Subconsulta sobre la tabla de clausura: sin recursión ni filas duplicadas
+            en_subarbol = Producto.categoria.through.objects.filter(categoria_id__in=ids_subarbol(categoria_id))
+            queryset = Producto.objects.filter(id__in=en_subarbol.values('producto_id'), estado='activo')
+        else:
+            queryset = Producto.objects.filter(categoria__id=categoria_id, estado='activo')
+        return cargar_conexion(info, ProductoConnection, queryset, ORDEN_PRODUCTOS, **kwargs)
 
-    def resolve_productos_por_categoria(self, info, categoria_id):
-        return Producto.objects.select_related('tienda', 'categoria').prefetch_related('imagenes').filter(categoria_id=categoria_id, estado='activo')
+    def resolve_productos_por_tipo(self, info, tipo, **kwargs):
+        queryset = Producto.objects.filter(tipo__iexact=tipo, estado='activo')
+        return cargar_conexion(info, ProductoConnection, queryset, ORDEN_PRODUCTOS, **kwargs)
 
-    def resolve_productos_por_tipo(self, info, tipo):
-        return Producto.objects.filter(tipo__iexact=tipo, estado='activo')
+    def resolve_catalogo(self, info, filtros=None):
+        filtros = dict(filtros or {})
+        for campo in ('precio_min', 'precio_max'):
+            if filtros.get(campo) is not None and filtros[campo] < 0:
+                raise GraphQLError("El rango de precio no puede ser negativo.")
+        return filtros
 
-    def resolve_tiendas(self, info):
+    def resolve_tiendas(self, info, **kwargs):
         from apps.common.models.tienda import Tienda
-        return Tienda.objects.all()
+        return cargar_conexion(info, TiendaConnection, Tienda.objects.all(), ORDEN_POR_ID, **kwargs)
 
     def resolve_tienda_por_id(self, info, tienda_id):
         from apps.common.models.tienda import Tienda
@@ -83,13 +143,14 @@ class Query(QueryProductos,graphene.ObjectType):
 
     # --------- QUERIES PRIVADAS (con login) ---------
     perfil = graphene.Field(PerfilType)
-    mis_favoritos = graphene.List(ProductoType)
-    mis_tiendas_seguidas = graphene.List(TiendaType)
-    mis_seguimientos = graphene.List(SeguimientoType)
-    mis_notificaciones = graphene.List(
-        NotificacionType,
+    mis_favoritos = graphene.relay.ConnectionField(ProductoConnection)
+    mis_tiendas_seguidas = graphene.relay.ConnectionField(TiendaConnection)
+    mis_seguimientos = graphene.relay.ConnectionField(SeguimientoConnection)
+    mis_notificaciones = graphene.relay.ConnectionField(
+        NotificacionConnection,
         solo_no_leidas=graphene.Boolean(required=False, default_value=False)
     )
+    contador_notificaciones_no_leidas = graphene.Int()
 
     @login_required
     def resolve_perfil(self, info):
@@ -99,40 +160,47 @@ class Query(QueryProductos,graphene.ObjectType):
         return user
     
     @login_required
-    def resolve_mis_favoritos(self, info):
+    def resolve_mis_favoritos(self, info, **kwargs):
         user = info.context.user
-        return [fav.producto for fav in Favorito.objects.select_related('producto').filter(usuario=user)]
+        favoritos = Favorito.objects.select_related('producto').defer('producto__busqueda').filter(usuario=user)
+        return cargar_conexion(info, ProductoConnection, favoritos, ORDEN_FAVORITOS, nodo=lambda fav: fav.producto, **kwargs)
 
     @login_required
-    def resolve_mis_tiendas_seguidas(self, info):
+    def resolve_mis_tiendas_seguidas(self, info, **kwargs):
         user = info.context.user
         segs = Seguimiento.objects.select_related('tienda').filter(usuario=user)
-        return [s.tienda for s in segs]
+        return cargar_conexion(info, TiendaConnection, segs, ORDEN_SEGUIMIENTOS, nodo=lambda s: s.tienda, **kwargs)
     
     @login_required
-    def resolve_mis_seguimientos(self, info):
+    def resolve_mis_seguimientos(self, info, **kwargs):
         user = info.context.user
-        return Seguimiento.objects.filter(usuario=user)
+        segs = Seguimiento.objects.filter(usuario=user)
+        return cargar_conexion(info, SeguimientoConnection, segs, ORDEN_SEGUIMIENTOS, **kwargs)
     
     @login_required
-    def resolve_mis_notificaciones(self, info, solo_no_leidas=False):
+    def resolve_mis_notificaciones(self, info, solo_no_leidas=False, **kwargs):
         user = info.context.user
-        qs = Notificacion.objects.filter(usuario=user)
-        if solo_no_leidas:
-            qs = qs.filter(leida=False)
-        return qs.order_by('-fecha_creacion')
+        pagina = pagina_feed(user, solo_no_leidas, **kwargs)
+        cargar_lista(info, pagina.nodos)
+        return pagina.conexion(NotificacionConnection)
+
+    @login_required
+    def resolve_contador_notificaciones_no_leidas(self, info):
+        return contador_no_leidas(info.context.user)
     
     
     #QUERIES PRIVADAS DE VENDEDORES
     tienda_perfil = graphene.Field(TiendaType, tienda_id=graphene.Int(required=True))
-    mis_tiendas = graphene.List(TiendaType)
-    mis_productos = graphene.List(ProductoType, tienda_id=graphene.Int(required=True))
+    mis_tiendas = graphene.relay.ConnectionField(TiendaConnection)
+    mis_productos = graphene.relay.ConnectionField(ProductoConnection, tienda_id=graphene.Int(required=True))
+    estado_notificaciones = graphene.Field(EnvioNotificacionType, producto_id=graphene.Int(required=True))
     
     @login_required
     @vendedor_required
-    def resolve_mis_tiendas(self, info):
+    def resolve_mis_tiendas(self, info, **kwargs):
         user = info.context.user
-        return Tienda.objects.filter(propietario=user, estado='activo')
+        tiendas = Tienda.objects.filter(propietario=user, estado='activo')
+        return cargar_conexion(info, TiendaConnection, tiendas, ORDEN_POR_ID, **kwargs)
     
     @login_required
     @vendedor_required
@@ -146,7 +214,7 @@ class Query(QueryProductos,graphene.ObjectType):
         
     @login_required
     @vendedor_required
-    def resolve_mis_productos(self, info, tienda_id):
+    def resolve_mis_productos(self, info, tienda_id, **kwargs):
         user = info.context.user
         try:
             tienda = Tienda.objects.get(id=tienda_id)
@@ -156,4 +224,12 @@ class Query(QueryProductos,graphene.ObjectType):
         if tienda.propietario != user:
             raise GraphQLError("No tienes permiso para ver los productos de esta tienda.")
         
-        return Producto.objects.filter(tienda__id=tienda_id, tienda__propietario=user)
\ No newline at end of file
+        queryset = Producto.objects.filter(tienda__id=tienda_id, tienda__propietario=user)
+        return cargar_conexion(info, ProductoConnection, queryset, ORDEN_PRODUCTOS, **kwargs)
+
+    @login_required
+    @vendedor_required
+    def resolve_estado_notificaciones(self, info, producto_id):
+        user = info.context.user
+        envios = EnvioNotificacion.objects.filter(producto_id=producto_id, tienda__propietario=user)
+        return envios.order_by('-fecha_creacion').first()
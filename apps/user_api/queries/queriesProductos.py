@@ -2,15 +2,16 @@
 import graphene
 from graphql import GraphQLError
 from apps.common.models.producto import Producto
-from apps.user_api.types import ProductoType
+from apps.user_api.types import ProductoType, ProductoConnection
 from apps.user_api.validador import validar_usuario_vendedor
+from apps.user_api.loaders import cargar_conexion
 
 
 
 class QueryProductos(graphene.ObjectType):
     mis_productos = graphene.List(ProductoType)
     producto_por_id = graphene.Field(ProductoType, producto_id=graphene.Int(required=True))
-    productos_por_estado = graphene.List(ProductoType, estado=graphene.String(required=True))
+    productos_por_estado = graphene.relay.ConnectionField(ProductoConnection, estado=graphene.String(required=True))
 
 
     @validar_usuario_vendedor
@@ -27,6 +28,7 @@ class QueryProductos(graphene.ObjectType):
             raise GraphQLError("Producto no encontrado o no pertenece a tu tienda.")
 
     @validar_usuario_vendedor
-    def resolve_productos_por_estado(self, info, estado):
+    def resolve_productos_por_estado(self, info, estado, **kwargs):
         tienda = info.context.user.tienda
-        return Producto.objects.filter(tienda=tienda, estado=estado)
+        queryset = Producto.objects.filter(tienda=tienda, estado=estado)
+        return cargar_conexion(info, ProductoConnection, queryset, ('-fechaCreacion', '-id'), **kwargs)
@@ -5,49 +5,96 @@ from apps.common.models.categoria import Categoria
 from apps.common.models.tienda import Tienda
 from apps.common.models.favoritos import Favorito
 from apps.common.models.seguir import Seguimiento   
-from apps.common.models.notificacion import Notificacion
+from apps.common.models.notificacion import Notificacion, EnvioNotificacion
 from apps.common.models import CustomUser as Usuario
 from apps.common.models.imagen import Imagen
 from apps.common.models.seguir import Seguimiento
+from apps.common.models.talla import Talla
+from apps.common.models.reserva import ReservaStock
+from apps.common import facetas
+from apps.common.imagenes import url_version
+from apps.user_api.loaders import obtener_loaders, cargar_conexion
 
 class ProductoType(DjangoObjectType):
     url = graphene.String()
     class Meta:
         model = Producto
-        fields = "__all__"
+        exclude = ("busqueda",)
         
     def resolve_url(self, info):
-        if not self.tienda.id: #Verifica que el producto tenga una tienda asociada
+        if not self.tienda_id: #Verifica que el producto tenga una tienda asociada
             return None
         request = info.context
         if info.context is not None:
-            return request.build_absolute_uri(f"/tienda/{self.tienda.id}/producto/{self.id}")
+            return request.build_absolute_uri(f"/tienda/{self.tienda_id}/producto/{self.id}")
         else:
-            return f"/tienda/{self.tienda.id}/producto/{self.id}"
+            return f"/tienda/{self.tienda_id}/producto/{self.id}"
+
+    def resolve_tienda(self, info):
+        return obtener_loaders(info).tienda.load(self.tienda_id)
+
+    def resolve_categoria(self, info):
+        return obtener_loaders(info).categorias_producto.load(self.id)
+
+    def resolve_imagenes(self, info):
+        return obtener_loaders(info).imagenes_producto.load(self.id)
+
+class BusquedaProductosType(graphene.ObjectType):
+    productos = graphene.List(ProductoType)
+    siguiente_cursor = graphene.String()
+    hay_mas = graphene.Boolean()
+
+class CategoriaNodoType(graphene.ObjectType):
+    """Nodo del árbol de categorías (se resuelve desde el dict cacheado)."""
+    id = graphene.ID()
+    nombre = graphene.String()
+    icono = graphene.String()
+    hijos = graphene.List(lambda: CategoriaNodoType)
 
 class CategoriaType(DjangoObjectType):
     class Meta:
         model = Categoria
         fields = "__all__"
 
+    def resolve_categoriaPadre(self, info):
+        return obtener_loaders(info).categoria.load(self.categoriaPadre_id)
+
+    def resolve_subcategorias(self, info):
+        return obtener_loaders(info).subcategorias.load(self.id)
+
+    def resolve_productos(self, info):
+        return obtener_loaders(info).productos_categoria.load(self.id)
+
 class TiendaType(DjangoObjectType):
     url = graphene.String()
     class Meta:
         model = Tienda
         fields = "__all__"
     def resolve_url(self, info):
-        if not self.propietario:
+        if not self.propietario_id:
             return None
         request = info.context
         if info.context is not None:
             return request.build_absolute_uri(f"/tienda/{self.id}")
         else:
-            return f"/tienda/{self.tienda.id}"
+            return f"/tienda/{self.id}"
+
+    def resolve_propietario(self, info):
+        return obtener_loaders(info).usuario.load(self.propietario_id)
+
+    def resolve_productos(self, info):
+        return obtener_loaders(info).productos_tienda.load(self.id)
         
 class FavoritoType(DjangoObjectType):
     class Meta:
         model = Favorito
         fields = "__all__"
+
+    def resolve_usuario(self, info):
+        return obtener_loaders(info).usuario.load(self.usuario_id)
+
+    def resolve_producto(self, info):
+        return obtener_loaders(info).producto.load(self.producto_id)
         
 class SeguimientoType(DjangoObjectType):
     class Meta:
@@ -58,12 +105,27 @@ class NotificacionType(DjangoObjectType):
     class Meta:
         model = Notificacion
         fields = ("id", "usuario", "tienda", "producto", "tipo", "mensaje", "leida", "fecha_creacion")
+
+    def resolve_usuario(self, info):
+        return obtener_loaders(info).usuario.load(self.usuario_id)
+
+    def resolve_tienda(self, info):
+        return obtener_loaders(info).tienda.load(self.tienda_id)
+
+    def resolve_producto(self, info):
+        return obtener_loaders(info).producto.load(self.producto_id)
         
+class EnvioNotificacionType(DjangoObjectType):
+    class Meta:
+        model = EnvioNotificacion
+        fields = ("id", "producto", "tipo", "mensaje", "estado", "total", "enviados", "fecha_creacion", "fecha_actualizacion")
+
 class PerfilType(DjangoObjectType):
     fotoPerfil = graphene.String()
     class Meta:
         model = Usuario
         fields = ("id", "email", "username", "nombre", "apellidos", "celular", "is_seller",  "foto_perfil", "fotoPerfil")
+    campos_requeridos = {"fotoPerfil": ["foto_perfil"]}
         
     def resolve_fotoPerfil(self, info):
         if self.foto_perfil:
@@ -72,24 +134,164 @@ class PerfilType(DjangoObjectType):
         return None
         
         
+class TamanoImagen(graphene.Enum):
+    THUMB = 'thumb'
+    MEDIUM = 'medium'
+    LARGE = 'large'
+
+class FormatoImagen(graphene.Enum):
+    WEBP = 'webp'
+    JPEG = 'jpeg'
+
 class ImagenType(DjangoObjectType):
-    url = graphene.String()
+    url = graphene.String(tamano=TamanoImagen(), formato=FormatoImagen(default_value='webp'))
     
     class Meta:
         model = Imagen
         fields = "__all__"
+    campos_requeridos = {"url": ["archivo", "versiones"]}
         
-    def resolve_url(self, info):
-        """Resolver para obtener la URL absoluta del archivo"""
-        if self.archivo and hasattr(self.archivo, 'url'):
-            request = info.context
-            if request is not None:
-                return request.build_absolute_uri(self.archivo.url)
-            else:
-                return self.archivo.url
-        return None
+    def resolve_url(self, info, tamano=None, formato='webp'):
+        """URL absoluta de la versión pedida (sin tamaño, o mientras se generan, la del original)"""
+        if not self.archivo:
+            return None
+        # graphene entrega los argumentos enum como miembros del Enum
+        url = url_version(self, getattr(tamano, 'value', tamano), getattr(formato, 'value', formato))
+        request = info.context
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def resolve_producto(self, info):
+        return obtener_loaders(info).producto.load(self.producto_id)
 
 class SeguimientoType(DjangoObjectType):
     class Meta:
         model = Seguimiento
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
+
+    def resolve_usuario(self, info):
+        return obtener_loaders(info).usuario.load(self.usuario_id)
+
+    def resolve_tienda(self, info):
+        return obtener_loaders(info).tienda.load(self.tienda_id)
+
+# Conexiones Relay para los listados paginados por cursor
+class ProductoConnection(graphene.relay.Connection):
+    class Meta:
+        node = ProductoType
+
+class CategoriaConnection(graphene.relay.Connection):
+    class Meta:
+        node = CategoriaType
+
+class TiendaConnection(graphene.relay.Connection):
+    class Meta:
+        node = TiendaType
+
+class SeguimientoConnection(graphene.relay.Connection):
+    class Meta:
+        node = SeguimientoType
+
+class NotificacionConnection(graphene.relay.Connection):
+    class Meta:
+        node = NotificacionType
+
+
+# Catálogo con facetas
+class FiltrosCatalogoInput(graphene.InputObjectType):
+    categorias = graphene.List(graphene.Int)
+    tallas = graphene.List(graphene.Int)
+    colores = graphene.List(graphene.String)
+    tiendas = graphene.List(graphene.Int)
+    precio_min = graphene.Float()
+    precio_max = graphene.Float()
+
+class FacetaType(graphene.ObjectType):
+    valor = graphene.String()
+    etiqueta = graphene.String()
+    cantidad = graphene.Int()
+
+class FacetasType(graphene.ObjectType):
+    categorias = graphene.List(FacetaType)
+    tallas = graphene.List(FacetaType)
+    colores = graphene.List(FacetaType)
+    precios = graphene.List(FacetaType)
+    tiendas = graphene.List(FacetaType)
+
+    @staticmethod
+    def _con_nombres(conteos, modelo):
+        nombres = dict(modelo.objects.filter(pk__in=[int(v) for v, _ in conteos]).values_list('pk', 'nombre'))
+        return [
+            FacetaType(valor=valor, etiqueta=nombres[int(valor)], cantidad=cantidad)
+            for valor, cantidad in sorted(conteos, key=lambda c: -c[1])
+            if int(valor) in nombres
+        ]
+
+    def resolve_categorias(self, info):
+        return FacetasType._con_nombres(self['categoria'], Categoria)
+
+    def resolve_tallas(self, info):
+        return FacetasType._con_nombres(self['talla'], Talla)
+
+    def resolve_tiendas(self, info):
+        return FacetasType._con_nombres(self['tienda'], Tienda)
+
+    def resolve_colores(self, info):
+        return [
+            FacetaType(valor=valor, etiqueta=valor.capitalize(), cantidad=cantidad)
+            for valor, cantidad in sorted(self['color'], key=lambda c: -c[1])
+        ]
+
+    def resolve_precios(self, info):
+        orden = lambda c: float(c[0].split('-')[0].rstrip('+'))
+        return [
+            FacetaType(valor=valor, etiqueta=valor, cantidad=cantidad)
+            for valor, cantidad in sorted(self['precio'], key=orden)
+        ]
+
+class CatalogoType(graphene.ObjectType):
+    """La raíz es el dict de filtros; productos y facetas solo se calculan si se piden."""
+    productos = graphene.relay.ConnectionField(ProductoConnection)
+    facetas = graphene.Field(FacetasType)
+
+    def resolve_productos(self, info, **kwargs):
+        return cargar_conexion(info, ProductoConnection, facetas.filtrar_catalogo(self), ('-fechaCreacion', '-id'), **kwargs)
+
+    def resolve_facetas(self, info):
+        return facetas.contar_facetas(self)
+
+class ErrorImportacionType(graphene.ObjectType):
+    linea = graphene.Int()
+    mensaje = graphene.String()
+
+class ItemReservaInput(graphene.InputObjectType):
+    variante_id = graphene.Int(required=True)
+    cantidad = graphene.Int(required=True)
+
+class ReservaItemType(graphene.ObjectType):
+    variante_id = graphene.Int()
+    cantidad = graphene.Int()
+
+class ReservaStockType(DjangoObjectType):
+    items = graphene.List(ReservaItemType)
+
+    class Meta:
+        model = ReservaStock
+        fields = ("id", "estado", "expira", "fecha_creacion")
+
+    def resolve_items(self, info):
+        return [ReservaItemType(variante_id=item.variante_id, cantidad=item.cantidad) for item in self.items.all()]
+
+class CambioVarianteInput(graphene.InputObjectType):
+    variante_id = graphene.Int(required=True)
+    precio = graphene.Float()
+    stock = graphene.Int(description="Stock nuevo (reemplaza al actual)")
+    ajuste_stock = graphene.Int(description="Suma o resta al stock actual sin pisar reservas concurrentes; no baja de 0")
+
+class ResultadoVarianteType(graphene.ObjectType):
+    variante_id = graphene.Int()
+    ok = graphene.Boolean()
+    mensaje = graphene.String()
+    precio = graphene.Float()
+    stock = graphene.Int()
@@ -1,27 +1,323 @@
+import asyncio
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
 from graphene_file_upload.django import FileUploadGraphQLView
+from graphql import ExecutionResult
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.core.files.storage import default_storage
+from django.db.models import Max
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse,
+                         StreamingHttpResponse)
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
-from apps.user_api.auth import decode_jwt
-from django.contrib.auth.models import AnonymousUser
+from django.views.decorators.http import require_GET, require_safe
+from apps.common import cache_respuestas
+from apps.common.almacenamiento import hash_de_ruta
+from apps.common.consultas_persistidas import ConsultasPersistidasMixin
+from apps.common.autenticacion import USO_STREAM, autenticar_request, token_de_request, usuario_desde_token
+from apps.common.models import Notificacion, Seguimiento
+from apps.common.notificaciones import eventos_usuario, como_notificacion, leidas_hasta
+from apps.common.tiempo_real import CANAL, obtener_pubsub
 
 @method_decorator(csrf_exempt, name='dispatch')
-class UserFileUploadGraphQLView(FileUploadGraphQLView):
-    def dispatch(self, request, *args, **kwargs):
-        auth_header = request.headers.get('Authorization', '')
-        token = None
-
-        if auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-        elif auth_header.startswith('JWT '):
-            token = auth_header.split(' ')[1]
+class UserFileUploadGraphQLView(ConsultasPersistidasMixin, FileUploadGraphQLView):
+    nombre_registro = 'user'
 
-        if token:
-            user = decode_jwt(token)
-            request.user = user if user is not None else AnonymousUser()
-        else:
-            request.user = AnonymousUser()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # La autenticación se hace una vez en dispatch; sin middlewares por campo
+        self.middleware = []
 
+    def dispatch(self, request, *args, **kwargs):
+        autenticar_request(request)
         return super().dispatch(request, *args, **kwargs)
 
     def get_context(self, request):
         return request
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        # Catálogo público: un anónimo recibe la respuesta cacheada sin validar ni ejecutar
+        anonimo = request.user.is_anonymous and not show_graphiql
+        entrada = cache_respuestas.entrada(
+            self.schema.graphql_schema, query, variables, operation_name, request.build_absolute_uri('/')
+        ) if anonimo else None
+        if entrada is not None:
+            datos = entrada.obtener()
+            if datos is not None:
+                return ExecutionResult(data=datos)
+        resultado = super().execute_graphql_request(request, data, query, variables, operation_name, show_graphiql)
+        if entrada is not None and resultado is not None and not resultado.errors:
+            entrada.guardar(resultado.data)
+        return resultado
+
+
+# ===== NOTIFICACIONES EN TIEMPO REAL (SSE) =====
+
+INTERVALO_PING = getattr(settings, 'TIEMPO_REAL_PING', 15)
+MAXIMO_POR_LECTURA = 100
+
+
+def _posicion_inicial(usuario, ultimo_id):
+    """(última notificación, último evento) ya entregados; sale del Last-Event-ID al reconectar."""
+    try:
+        ultima, ultimo_evento = (int(parte) for parte in ultimo_id.split('-'))
+        return ultima, ultimo_evento
+    except (AttributeError, ValueError):
+        pass
+    ultima = Notificacion.objects.filter(usuario=usuario).aggregate(maximo=Max('id'))['maximo'] or 0
+    ultimo_evento = eventos_usuario(usuario).aggregate(maximo=Max('id'))['maximo'] or 0
+    return ultima, ultimo_evento
+
+
+def _serializar(notificacion):
+    return {
+        'id': str(notificacion.id),
+        'tipo': notificacion.tipo,
+        'mensaje': notificacion.mensaje,
+        'tiendaId': notificacion.tienda_id,
+        'productoId': notificacion.producto_id,
+        'leida': notificacion.leida,
+        'fechaCreacion': notificacion.fecha_creacion.isoformat(),
+    }
+
+
+def _nuevas(usuario, posicion):
+    """Notificaciones posteriores a `posicion`, cada una con la posición que deja al entregarla."""
+    ultima, ultimo_evento = posicion
+    propias = Notificacion.objects.filter(usuario=usuario, id__gt=ultima).order_by('id')[:MAXIMO_POR_LECTURA]
+    nuevas = [(notificacion, (notificacion.id, ultimo_evento)) for notificacion in propias]
+    if nuevas:
+        ultima = nuevas[-1][0].id
+    eventos = list(eventos_usuario(usuario).filter(pk__gt=ultimo_evento).order_by('pk')[:MAXIMO_POR_LECTURA])
+    if eventos:
+        marca = leidas_hasta(usuario)
+        nuevas += [(como_notificacion(evento, usuario, marca), (ultima, evento.pk)) for evento in eventos]
+    return nuevas
+
+
+def _tiendas_seguidas(usuario):
+    return set(Seguimiento.objects.filter(usuario=usuario).values_list('tienda_id', flat=True))
+
+
+async def _transmitir(usuario, posicion):
+    loop = asyncio.get_running_loop()
+    aviso = asyncio.Event()
+    tiendas = await sync_to_async(_tiendas_seguidas)(usuario)
+
+    def recibir(mensaje):
+        # Llega desde el hilo del publicador o del LISTEN: solo despierta al stream
+        if usuario.pk in mensaje.get('usuarios', ()) or mensaje.get('tienda') in tiendas:
+            try:
+                loop.call_soon_threadsafe(aviso.set)
+            except RuntimeError:
+                pass
+
+    cancelar = obtener_pubsub().suscribir(CANAL, recibir)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            nuevas = await sync_to_async(_nuevas)(usuario, posicion)
+            for notificacion, posicion in nuevas:
+                datos = json.dumps(_serializar(notificacion), ensure_ascii=False)
+                yield f"id: {posicion[0]}-{posicion[1]}\nevent: notificacion\ndata: {datos}\n\n"
+            if len(nuevas) >= MAXIMO_POR_LECTURA:
+                continue
+            try:
+                await asyncio.wait_for(aviso.wait(), INTERVALO_PING)
+                aviso.clear()
+            except asyncio.TimeoutError:
+                tiendas = await sync_to_async(_tiendas_seguidas)(usuario)
+                yield ": ping\n\n"
+    finally:
+        cancelar()
+
+
+@require_GET
+async def eventos_notificaciones(request):
+    """
+    Stream SSE con las notificaciones nuevas del usuario autenticado. El token
+    de sesión va en Authorization; EventSource no permite headers, así que
+    también acepta ?token= con un token de stream (mutación tokenNotificaciones),
+    que vence en segundos: al reconectar el cliente pide uno nuevo.
+
+    Solo funciona con ASGI (config.asgi). Bajo WSGI el stream ocuparía un
+    worker para siempre, así que responde 501.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Las notificaciones en tiempo real requieren un servidor ASGI'}, status=501)
+
+    token = token_de_request(request)
+    if token:
+        usuario = await sync_to_async(usuario_desde_token)(token)
+    else:
+        token = request.GET.get('token')
+        usuario = await sync_to_async(usuario_desde_token)(token, USO_STREAM) if token else None
+    if usuario is None:
+        return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+
+    posicion = await sync_to_async(_posicion_inicial)(usuario, request.headers.get('Last-Event-ID'))
+    respuesta = StreamingHttpResponse(_transmitir(usuario, posicion), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
+
+
+# ===== ARCHIVOS DE MEDIA =====
+
+# Los blobs deduplicados llevan el SHA-256 en la ruta: su contenido no cambia nunca
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_MEDIA = f"public, max-age={getattr(settings, 'MEDIA_CACHE_SEGUNDOS', 86400)}"
+SENDFILE = getattr(settings, 'MEDIA_SENDFILE', '')
+SENDFILE_PREFIJO = getattr(settings, 'MEDIA_SENDFILE_PREFIJO', '/_media/')
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class _Tramo:
+    """
+    Lee a lo sumo `longitud` bytes desde la posición actual del archivo. Deja
+    ver fileno() para que el servidor (gunicorn) mande el tramo con sendfile.
+    """
+
+    def __init__(self, archivo, longitud):
+        self._archivo = archivo
+        self._restante = longitud
+
+    def fileno(self):
+        return self._archivo.fileno()
+
+    def read(self, tamano=-1):
+        if self._restante <= 0:
+            return b''
+        tamano = self._restante if tamano is None or tamano < 0 else min(tamano, self._restante)
+        datos = self._archivo.read(tamano)
+        self._restante -= len(datos)
+        return datos
+
+    def close(self):
+        self._archivo.close()
+
+
+def _rango(cabecera, tamano):
+    """(inicio, fin) inclusivos del header Range, None si se ignora y False si no se puede satisfacer."""
+    coincidencia = _RANGO.match(cabecera.replace(' ', ''))
+    if coincidencia is None:
+        # Varios rangos u otra unidad: se responde el archivo completo
+        return None
+    desde, hasta = coincidencia.groups()
+    if not desde:
+        if not hasta:
+            return None
+        # bytes=-N: los últimos N bytes
+        sufijo = int(hasta)
+        if sufijo == 0 or tamano == 0:
+            return False
+        return max(tamano - sufijo, 0), tamano - 1
+    inicio = int(desde)
+    if hasta and int(hasta) < inicio:
+        return None
+    if inicio >= tamano:
+        return False
+    return inicio, min(int(hasta), tamano - 1) if hasta else tamano - 1
+
+
+def _sin_debil(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def _no_modificado(request, etag, modificado):
+    si_no_coincide = request.headers.get('If-None-Match')
+    if si_no_coincide is not None:
+        etags = [_sin_debil(valor) for valor in parse_etags(si_no_coincide)]
+        return '*' in etags or etag in etags
+    desde = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return desde is not None and int(modificado) <= desde
+
+
+def _respetar_rango(request, etag, ultima_modificacion):
+    # If-Range: el rango vale solo si el cliente tiene esta misma versión
+    si_rango = request.headers.get('If-Range')
+    return si_rango is None or si_rango in (etag, ultima_modificacion)
+
+
+def _con_cabeceras(respuesta, cabeceras):
+    for nombre, valor in cabeceras.items():
+        respuesta[nombre] = valor
+    return respuesta
+
+
+@require_safe
+def servir_media(request, ruta):
+    """
+    Sirve los archivos de MEDIA_ROOT con ETag fuerte, respuestas 304, Range (un
+    tramo) y cache inmutable para los blobs direccionados por contenido. El
+    archivo sale con FileResponse, que gunicorn manda con sendfile; con
+    MEDIA_SENDFILE la transferencia se delega a nginx (X-Accel-Redirect) o
+    Apache (X-Sendfile) y el worker solo arma los headers.
+    """
+    # La ruta ya llega decodificada: %2e%2e/ o ..%2f son '..' a esta altura
+    nombre = posixpath.normpath(ruta)
+    if nombre.startswith('/') or '..' in nombre.split('/') or nombre == '.':
+        raise Http404("Archivo no encontrado.")
+    try:
+        camino = default_storage.path(nombre)
+        estado = os.stat(camino)
+    except (SuspiciousFileOperation, NotImplementedError, OSError, ValueError):
+        raise Http404("Archivo no encontrado.")
+    if not stat.S_ISREG(estado.st_mode):
+        raise Http404("Archivo no encontrado.")
+
+    hash = hash_de_ruta(nombre)
+    etag = f'"{hash}"' if hash else f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+    ultima_modificacion = http_date(estado.st_mtime)
+    cabeceras = {
+        'ETag': etag,
+        'Last-Modified': ultima_modificacion,
+        'Cache-Control': CACHE_INMUTABLE if hash else CACHE_MEDIA,
+    }
+    if _no_modificado(request, etag, estado.st_mtime):
+        return _con_cabeceras(HttpResponseNotModified(), cabeceras)
+
+    content_type = mimetypes.guess_type(camino)[0] or 'application/octet-stream'
+    tamano = estado.st_size
+
+    if SENDFILE:
+        # El proxy resuelve Range y manda el archivo sin pasar por Python
+        respuesta = HttpResponse(content_type=content_type)
+        if SENDFILE == 'x-accel-redirect':
+            respuesta['X-Accel-Redirect'] = SENDFILE_PREFIJO + quote(nombre)
+        else:
+            respuesta['X-Sendfile'] = camino
+        return _con_cabeceras(respuesta, cabeceras)
+
+    rango = None
+    if 'Range' in request.headers and _respetar_rango(request, etag, ultima_modificacion):
+        rango = _rango(request.headers['Range'], tamano)
+        if rango is False:
+            respuesta = HttpResponse(status=416)
+            respuesta['Content-Range'] = f'bytes */{tamano}'
+            return _con_cabeceras(respuesta, cabeceras)
+
+    inicio, fin = rango or (0, tamano - 1)
+    if request.method == 'HEAD':
+        respuesta = HttpResponse(content_type=content_type, status=206 if rango else 200)
+    else:
+        archivo = open(camino, 'rb')
+        if rango is None:
+            respuesta = FileResponse(archivo, content_type=content_type)
+        else:
+            archivo.seek(inicio)
+            respuesta = FileResponse(_Tramo(archivo, fin - inicio + 1), status=206, content_type=content_type)
+    if rango:
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+    respuesta['Content-Length'] = fin - inicio + 1
+    respuesta['Accept-Ranges'] = 'bytes'
+    return _con_cabeceras(respuesta, cabeceras)
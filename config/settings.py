@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from decouple import config
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,6 +29,10 @@ DEBUG = config('DEBUG', default=False, cast=bool)
 
 ALLOWED_HOSTS = config('RENDER_EXTERNAL_HOSTNAME', default='localhost').split(',')
 
+# Corriendo la suite (manage.py test o pytest): los hilos de fondo no ven la
+# transacción de cada TestCase, así que por defecto todo se escribe en el request
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 # Archivos estáticos
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -57,6 +62,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'graphene_django',
     'django_filters',
     'corsheaders',
@@ -151,6 +157,113 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Cache compartida (árbol de categorías, etc.). Con varios procesos conviene un
+# backend común (p.ej. django.core.cache.backends.redis.RedisCache).
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default='prince'),
+    }
+}
+# Cachear el árbol de categorías. Se invalida con signals borrando la clave: con
+# LocMem (por proceso) los demás workers no se enteran, así que solo se activa
+# por defecto con un backend compartido
+ARBOL_CATEGORIAS_CACHE = config(
+    'ARBOL_CATEGORIAS_CACHE', default=not CACHE_BACKEND.endswith('LocMemCache'), cast=bool
+)
+
+# Cache de respuestas GraphQL del catálogo público para anónimos (segundos). Se
+# invalida con signals subiendo una versión en la cache: con LocMem (por proceso)
+# los demás workers no se enteran, así que solo se activa por defecto con un
+# backend compartido (p.ej. django.core.cache.backends.redis.RedisCache).
+RESPUESTAS_CACHE_BACKEND = config('RESPUESTAS_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+RESPUESTAS_CACHE_ACTIVA = config(
+    'RESPUESTAS_CACHE_ACTIVA', default=not RESPUESTAS_CACHE_BACKEND.endswith('LocMemCache'), cast=bool
+)
+RESPUESTAS_CACHE_TTL = config('RESPUESTAS_CACHE_TTL', default=300, cast=int)
+CACHES['respuestas'] = {
+    'BACKEND': RESPUESTAS_CACHE_BACKEND,
+    'LOCATION': config('RESPUESTAS_CACHE_LOCATION', default='prince-respuestas'),
+}
+
+# Consultas persistidas (APQ): archivos de ejemplo de cada API que se registran
+# como consultas conocidas, tamaño del LRU de documentos ya validados por
+# proceso y modo lista blanca (producción: solo se ejecutan las registradas)
+CONSULTAS_PERSISTIDAS_ARCHIVOS = {
+    'user': [os.path.join(BASE_DIR, 'Mutaciones-QueriesUser'), os.path.join(BASE_DIR, 'mutation_user.txt')],
+    'admin': [os.path.join(BASE_DIR, 'Mutaciones-QueriesAdmins'), os.path.join(BASE_DIR, 'mutations.txt')],
+    'superadmin': [],
+}
+CONSULTAS_PERSISTIDAS_SOLO_REGISTRADAS = config('CONSULTAS_PERSISTIDAS_SOLO_REGISTRADAS', default=False, cast=bool)
+CONSULTAS_PERSISTIDAS_CACHE = config('CONSULTAS_PERSISTIDAS_CACHE', default=1000, cast=int)
+
+# Cache local de usuarios autenticados por JWT (segundos / cantidad de usuarios)
+AUTH_CACHE_TTL = config('AUTH_CACHE_TTL', default=60, cast=int)
+AUTH_CACHE_TAMANO = config('AUTH_CACHE_TAMANO', default=1024, cast=int)
+
+# Escritura de UserLog en segundo plano (False = INSERT síncrono en el request)
+AUDITORIA_ASINCRONA = config('AUDITORIA_ASINCRONA', default=not TESTING, cast=bool)
+AUDITORIA_TAMANO_COLA = config('AUDITORIA_TAMANO_COLA', default=10000, cast=int)
+AUDITORIA_TAMANO_LOTE = config('AUDITORIA_TAMANO_LOTE', default=200, cast=int)
+AUDITORIA_INTERVALO = config('AUDITORIA_INTERVALO', default=1.0, cast=float)
+
+# Retención de UserLog: meses que quedan en la base y carpeta de archivos .jsonl.gz
+LOGS_RETENCION_MESES = config('LOGS_RETENCION_MESES', default=12, cast=int)
+LOGS_ARCHIVO_DIR = config('LOGS_ARCHIVO_DIR', default=os.path.join(BASE_DIR, 'archivo_logs'))
+
+# Notificaciones a seguidores en segundo plano (False = fan-out síncrono al confirmar)
+NOTIFICACIONES_ASINCRONAS = config('NOTIFICACIONES_ASINCRONAS', default=not TESTING, cast=bool)
+NOTIFICACIONES_TAMANO_LOTE = config('NOTIFICACIONES_TAMANO_LOTE', default=1000, cast=int)
+# Desde cuántos seguidores un evento de tienda se lee del log de la tienda en vez de copiarse a cada uno
+NOTIFICACIONES_UMBRAL_PULL = config('NOTIFICACIONES_UMBRAL_PULL', default=5000, cast=int)
+# Días tras los que las notificaciones leídas se agrupan en resúmenes y tras los que se borran
+NOTIFICACIONES_DIAS_RESUMEN = config('NOTIFICACIONES_DIAS_RESUMEN', default=30, cast=int)
+NOTIFICACIONES_RETENCION_DIAS = config('NOTIFICACIONES_RETENCION_DIAS', default=180, cast=int)
+
+# Push de notificaciones por SSE (/eventos/notificaciones/, requiere ASGI; bajo WSGI responde 501).
+# Backend de pub/sub: PubSubMemoria (un proceso, dev / tests) o PubSubPostgres (LISTEN/NOTIFY,
+# entre procesos: configurarlo en producción con varios workers)
+TIEMPO_REAL_BACKEND = config('TIEMPO_REAL_BACKEND', default='apps.common.tiempo_real.PubSubMemoria')
+TIEMPO_REAL_PING = config('TIEMPO_REAL_PING', default=15, cast=int)
+# Segundos de validez del token de stream que va en ?token= (queda en los logs de acceso)
+TIEMPO_REAL_TOKEN_SEGUNDOS = config('TIEMPO_REAL_TOKEN_SEGUNDOS', default=60, cast=int)
+
+# Versiones de imágenes (thumb/medium/large en WebP y JPEG) generadas en un pool de hilos
+IMAGENES_ASINCRONAS = config('IMAGENES_ASINCRONAS', default=not TESTING, cast=bool)
+IMAGENES_TRABAJADORES = config('IMAGENES_TRABAJADORES', default=2, cast=int)
+# Tamaño máximo de una imagen subida (bytes). El body JSON de una subida en base64
+# ocupa ~4/3 de la imagen: el límite del body se ajusta para que el corte sea este.
+# Con multipart (Upload) el archivo va a disco a partir de FILE_UPLOAD_MAX_MEMORY_SIZE.
+IMAGENES_TAMANO_MAXIMO = config('IMAGENES_TAMANO_MAXIMO', default=10 * 1024 * 1024, cast=int)
+DATA_UPLOAD_MAX_MEMORY_SIZE = IMAGENES_TAMANO_MAXIMO * 4 // 3 + 64 * 1024
+
+# Productos por transacción (un bulk_create por tabla) en importarCatalogo / importar_catalogo
+IMPORTACION_TAMANO_LOTE = config('IMPORTACION_TAMANO_LOTE', default=500, cast=int)
+
+# Filas por FETCH del cursor del servidor y por bloque enviado en /admin/exportar/
+EXPORTACION_FILAS_POR_BLOQUE = config('EXPORTACION_FILAS_POR_BLOQUE', default=2000, cast=int)
+
+# Minutos que dura una reserva de stock sin confirmar (liberar_reservas_vencidas la devuelve)
+INVENTARIO_RESERVA_MINUTOS = config('INVENTARIO_RESERVA_MINUTOS', default=15, cast=int)
+
+# Media: carpeta solo de archivos subidos; /media/... se sirve con apps.user_api.views.servir_media
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+MEDIA_URL = '/media/'
+# max-age de los archivos que no son blobs (los blobs se cachean como inmutables)
+MEDIA_CACHE_SEGUNDOS = config('MEDIA_CACHE_SEGUNDOS', default=86400, cast=int)
+# Delegar el envío al proxy: '' (gunicorn + sendfile), 'x-accel-redirect' (nginx, con una
+# location internal en MEDIA_SENDFILE_PREFIJO que apunte a MEDIA_ROOT) o 'x-sendfile'
+MEDIA_SENDFILE = config('MEDIA_SENDFILE', default='')
+MEDIA_SENDFILE_PREFIJO = config('MEDIA_SENDFILE_PREFIJO', default='/_media/')
+
+# Media deduplicada: cada contenido se guarda una vez en MEDIA_ROOT/blobs/ (ruta según su SHA-256)
+# con conteo de referencias. Los estáticos siguen con el almacenamiento por defecto.
+STORAGES = {
+    'default': {'BACKEND': config('ALMACENAMIENTO_MEDIA', default='apps.common.almacenamiento.AlmacenamientoDeduplicado')},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 AUTH_USER_MODEL = 'common.CustomUser'
 
 
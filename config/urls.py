@@ -17,18 +17,21 @@ Including another URLconf
 from django.contrib import admin
 from django.contrib.auth.middleware import AuthenticationMiddleware
 from django.urls import path
-from apps.user_api.views import UserFileUploadGraphQLView
-from graphene_django.views import GraphQLView
+from apps.user_api.views import UserFileUploadGraphQLView, eventos_notificaciones, servir_media
 from apps.admin_api.schema import schema as admin_schema
-from apps.admin_api.views import PrivateGraphQLView
+from apps.admin_api.views import PrivateGraphQLView, exportar
 from apps.user_api.schema_user import user_schema as user_schema
 from django.views.decorators.csrf import csrf_exempt
 from apps.superadmin_api.schema_superadmin import superadmin_schema
+from apps.superadmin_api.views import SuperadminGraphQLView
 
 urlpatterns = [
     path('adminPy/', admin.site.urls),
     path('graphql/admin/', csrf_exempt(PrivateGraphQLView.as_view(graphiql=True, schema=admin_schema))),
     path('graphql/user/', csrf_exempt(UserFileUploadGraphQLView.as_view(graphiql=True, schema=user_schema))),
-    path('graphql/superadmin/', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=superadmin_schema)))
+    path('graphql/superadmin/', csrf_exempt(SuperadminGraphQLView.as_view(graphiql=True, schema=superadmin_schema))),
+    path('eventos/notificaciones/', eventos_notificaciones),
+    path('media/<path:ruta>', servir_media),
+    path('admin/exportar/<str:recurso>.<str:formato>', exportar),
 ]
 